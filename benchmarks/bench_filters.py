@@ -0,0 +1,80 @@
+"""
+Cost of turning DevExtreme filters into querysets, with and without the
+compiled filter plan cache. Only the queryset is built, no query is executed.
+
+    python -m benchmarks.bench_filters
+"""
+import argparse
+
+from benchmarks.common import make_request, measure
+from benchmarks.views import OrderViewSet
+from benchmarks.models import Order
+from htec_drf_dx_datagrid.filters import DxFilterBackend, get_filter_plan_cache
+from rest_framework.request import Request
+
+
+def deep_filter(depth: int, value: int):
+    dx_filter = ["quantity", ">", value]
+    for level in range(depth):
+        dx_filter = [
+            dx_filter,
+            "and" if level % 2 else "or",
+            [["status", "=", "paid"], "and", ["amount", "<", value + level]],
+        ]
+    return dx_filter
+
+
+def wide_filter(width: int, value: int):
+    dx_filter = []
+    for index in range(width):
+        if dx_filter:
+            dx_filter.append("or")
+        dx_filter.append(["customer", "=", "customer %d" % (value + index)])
+    return dx_filter
+
+
+def build_queryset(dx_filter):
+    request = Request(make_request(filter=dx_filter))
+    view = OrderViewSet(request=request, format_kwarg=None, action="list")
+    return DxFilterBackend().filter_queryset(request, Order.objects.all(), view)
+
+
+def run(repeat: int, iterations: int):
+    scenarios = [
+        ("deep (depth 12)", lambda value: deep_filter(12, value)),
+        ("wide (200 nodes)", lambda value: wide_filter(200, value)),
+    ]
+    cache = get_filter_plan_cache()
+    print("%-18s %14s %14s %8s" % ("filter", "no cache ms", "cached ms", "speedup"))
+    for name, make_filter in scenarios:
+        filters = [make_filter(value) for value in range(iterations)]
+
+        def uncached():
+            for dx_filter in filters:
+                cache.clear()
+                build_queryset(dx_filter)
+
+        def cached():
+            for dx_filter in filters:
+                build_queryset(dx_filter)
+
+        uncached_timing = measure(uncached, repeat)
+        cached_timing = measure(cached, repeat)
+        print(
+            "%-18s %14.3f %14.3f %7.1fx"
+            % (
+                name,
+                uncached_timing["p50"] / iterations,
+                cached_timing["p50"] / iterations,
+                uncached_timing["p50"] / cached_timing["p50"],
+            )
+        )
+    print(cache.cache_info())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+    run(args.repeat, args.iterations)
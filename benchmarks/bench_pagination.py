@@ -0,0 +1,39 @@
+"""
+Deep page latency of OFFSET pagination against keyset pagination.
+
+    python -m benchmarks.bench_pagination --rows 1000000
+"""
+import argparse
+
+from benchmarks.common import create_data, make_request, measure
+from benchmarks.views import KeysetOrderViewSet, OrderViewSet
+
+TAKE = 50
+
+
+def run(rows: int, repeat: int):
+    create_data(rows)
+    offset_view = OrderViewSet.as_view({"get": "list"})
+    keyset_view = KeysetOrderViewSet.as_view({"get": "list"})
+    sort = [{"selector": "created", "desc": False}]
+
+    print("%10s %14s %14s" % ("skip", "offset p50 ms", "keyset p50 ms"))
+    for skip in [0, rows // 10, rows // 2, rows - 2 * TAKE]:
+        previous = keyset_view(make_request(skip=max(skip - TAKE, 0), take=TAKE, sort=sort))
+        cursor = previous.data.get("cursor")
+        offset_timing = measure(
+            lambda: offset_view(make_request(skip=skip, take=TAKE, sort=sort)), repeat
+        )
+        keyset_timing = measure(
+            lambda: keyset_view(make_request(skip=skip, take=TAKE, sort=sort, cursor=cursor)),
+            repeat,
+        )
+        print("%10d %14.2f %14.2f" % (skip, offset_timing["p50"], keyset_timing["p50"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
@@ -0,0 +1,82 @@
+"""
+Size and encoding time of the list responses rendered by the stock JSONRenderer
+against the compact columnar renderer (?format=dxcompact), with the standard
+json module and with orjson when it is installed.
+
+    python -m benchmarks.bench_render --take 1000 --columns 50
+"""
+import argparse
+import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+from benchmarks.common import measure
+from rest_framework.renderers import JSONRenderer
+
+from htec_drf_dx_datagrid.renderers import DxCompactJSONRenderer, orjson
+
+
+def flat_response(take: int, columns: int):
+    start = datetime.date(2015, 1, 1)
+    rows = []
+    for index in range(take):
+        row = {"id": index, "created": start + datetime.timedelta(days=index % 3650)}
+        for column in range(columns - 2):
+            if column % 3 == 0:
+                row["text_%d" % column] = "value %d" % (index * column)
+            elif column % 3 == 1:
+                row["amount_%d" % column] = str(Decimal(index * column) / 100)
+            else:
+                row["quantity_%d" % column] = index * column % 100
+        rows.append(row)
+    return {"data": rows, "totalCount": take * 10}
+
+
+def group_response(groups: int, children: int):
+    items = [
+        {
+            "key": "status %d" % index,
+            "count": children * 10,
+            "summary": [index * 100, str(Decimal(index) / 3)],
+            "items": [
+                {"key": "category %d" % child, "count": 10, "summary": [child, "1.50"], "items": None}
+                for child in range(children)
+            ],
+        }
+        for index in range(groups)
+    ]
+    return {"data": items, "totalCount": groups * children * 10, "groupCount": groups}
+
+
+def render_context(group: list):
+    view = SimpleNamespace(get_load_options=lambda request: SimpleNamespace(group=group))
+    return {"view": view, "request": SimpleNamespace()}
+
+
+def run(take: int, columns: int, repeat: int):
+    std_compact = DxCompactJSONRenderer()
+    std_compact.use_orjson = False
+    renderers = [("stock json", JSONRenderer()), ("compact json", std_compact)]
+    if orjson is not None:
+        renderers.append(("compact orjson", DxCompactJSONRenderer()))
+
+    scenarios = [
+        ("flat %dx%d" % (take, columns), flat_response(take, columns), []),
+        ("groups 200x25", group_response(200, 25), [{"selector": "status"}, {"selector": "category"}]),
+    ]
+    print("%-16s %-16s %12s %10s" % ("response", "renderer", "bytes", "p50 ms"))
+    for name, data, group in scenarios:
+        context = render_context(group)
+        for renderer_name, renderer in renderers:
+            content = renderer.render(data, "application/json", context)
+            timing = measure(lambda: renderer.render(data, "application/json", context), repeat)
+            print("%-16s %-16s %12d %10.2f" % (name, renderer_name, len(content), timing["p50"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--take", type=int, default=1000)
+    parser.add_argument("--columns", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.take, args.columns, args.repeat)
@@ -0,0 +1,42 @@
+"""
+Rows per second of the flat loads serialized from model instances against
+the values() fast path (use_values = True).
+
+    python -m benchmarks.bench_values --rows 100000
+"""
+import argparse
+
+from benchmarks.common import create_data, make_request, measure
+from benchmarks.views import OrderViewSet, ValuesOrderViewSet
+
+
+def run(rows: int, repeat: int):
+    create_data(rows)
+    serializer_view = OrderViewSet.as_view({"get": "list"})
+    values_view = ValuesOrderViewSet.as_view({"get": "list"})
+
+    print("%8s %16s %16s %8s" % ("take", "serializer rows/s", "values rows/s", "speedup"))
+    for take in [100, 1000, 10000]:
+        take = min(take, rows)
+        # Skip the count, only the page is measured
+        params = dict(skip=0, take=take, requireTotalCount="false")
+        assert serializer_view(make_request(**params)).data == values_view(make_request(**params)).data
+        serializer_timing = measure(lambda: serializer_view(make_request(**params)), repeat)
+        values_timing = measure(lambda: values_view(make_request(**params)), repeat)
+        print(
+            "%8d %16.0f %16.0f %7.1fx"
+            % (
+                take,
+                take / serializer_timing["p50"] * 1000,
+                take / values_timing["p50"] * 1000,
+                serializer_timing["p50"] / values_timing["p50"],
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
@@ -0,0 +1,121 @@
+"""
+Shared helpers of the benchmarks: django setup, synthetic data and timing.
+The database is a sqlite file that is only regenerated when the requested
+number of rows changes.
+"""
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from benchmarks.models import Category, Order  # noqa: E402
+
+STATUSES = ["new", "paid", "sent", "closed", "void"]
+BATCH_SIZE = 10000
+
+
+def create_data(rows: int, seed: int = 1):
+    """
+    Create (or reuse) the synthetic tables with the given number of orders
+    """
+    tables = connection.introspection.table_names()
+    if Order._meta.db_table in tables and Order.objects.count() == rows:
+        return
+    with connection.schema_editor() as schema_editor:
+        for model in (Order, Category):
+            if model._meta.db_table in tables:
+                schema_editor.delete_model(model)
+        for model in (Category, Order):
+            schema_editor.create_model(model)
+
+    rnd = random.Random(seed)
+    categories = Category.objects.bulk_create(
+        [Category(name="category %d" % i) for i in range(20)]
+    )
+    start = datetime.date(2015, 1, 1)
+    now = timezone.now()
+    created = 0
+    while created < rows:
+        batch = []
+        for _ in range(min(BATCH_SIZE, rows - created)):
+            batch.append(
+                Order(
+                    customer="customer %d" % rnd.randint(0, 5000),
+                    status=rnd.choice(STATUSES),
+                    amount=Decimal(rnd.randint(0, 1000000)) / 100,
+                    quantity=rnd.randint(1, 100),
+                    created=start + datetime.timedelta(days=rnd.randint(0, 3650)),
+                    created_at=now - datetime.timedelta(minutes=rnd.randint(0, 5000000)),
+                    category_id=categories[rnd.randint(0, len(categories) - 1)].pk,
+                )
+            )
+        Order.objects.bulk_create(batch)
+        created += len(batch)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def make_request(path: str = "/orders/", **params):
+    """
+    GET request with the load options encoded like the DevExtreme CustomStore does
+    """
+    query = {
+        key: json.dumps(value) if isinstance(value, (list, dict)) else value
+        for key, value in params.items()
+    }
+    return APIRequestFactory().get(path, query)
+
+
+def measure(func, repeat: int = 5):
+    """
+    :return: Dict with the latency percentiles in milliseconds
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "p50": statistics.median(timings),
+        "p95": timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))],
+        "max": timings[-1],
+    }
+
+
+def count_queries(func):
+    """
+    :return: Number of SQL queries executed by func
+    """
+    with CaptureQueriesContext(connection) as context:
+        func()
+    return len(context.captured_queries)
+
+
+def peak_memory(func):
+    """
+    :return: Peak of the memory allocated by func, in bytes
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,138 @@
+"""
+Latency, SQL queries and peak memory of the main datagrid loads, comparable
+against a saved baseline.
+
+    python -m benchmarks.suite --rows 10000 --save baseline.json
+    python -m benchmarks.suite --rows 10000 --compare baseline.json
+
+The sizes used to compare changes are 10000, 1000000 and 5000000 rows. The
+comparison fails (exit status 1) when a scenario is slower than the baseline
+by more than --threshold or runs more queries.
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.bench_filters import deep_filter, wide_filter
+from benchmarks.common import count_queries, create_data, make_request, measure, peak_memory
+from benchmarks.views import OrderViewSet
+
+TAKE = 50
+
+
+def get_scenarios(rows: int):
+    """
+    :return: Dict {scenario name: query parameters}
+    """
+    sort = [{"selector": "created", "desc": False}]
+    return {
+        "first page": dict(skip=0, take=TAKE, sort=sort, requireTotalCount="true"),
+        "deep skip": dict(skip=max(rows - 2 * TAKE, 0), take=TAKE, sort=sort, requireTotalCount="true"),
+        "deep filter": dict(skip=0, take=TAKE, filter=deep_filter(12, 10), requireTotalCount="true"),
+        "wide or filter": dict(skip=0, take=TAKE, filter=wide_filter(200, 0), requireTotalCount="true"),
+        "group 2 levels + summary": dict(
+            skip=0,
+            take=TAKE,
+            group=[
+                {"selector": "status", "isExpanded": True},
+                {"selector": "category", "isExpanded": False},
+            ],
+            groupSummary=[
+                {"selector": "amount", "summaryType": "sum"},
+                {"selector": "quantity", "summaryType": "avg"},
+            ],
+            requireGroupCount="true",
+            requireTotalCount="true",
+        ),
+        "total summaries": dict(
+            skip=0,
+            take=TAKE,
+            totalSummary=[
+                {"selector": "amount", "summaryType": "sum"},
+                {"selector": "amount", "summaryType": "max"},
+                {"selector": "quantity", "summaryType": "avg"},
+                {"selector": "id", "summaryType": "count"},
+            ],
+            requireTotalCount="true",
+        ),
+        "list types": dict(list_types="true"),
+    }
+
+
+def run(rows: int, repeat: int):
+    create_data(rows)
+    view = OrderViewSet.as_view({"get": "list"})
+    results = {}
+    for name, params in get_scenarios(rows).items():
+
+        def load():
+            response = view(make_request(**params))
+            assert response.status_code == 200, response.data
+
+        load()  # Warm up the caches of the process
+        result = measure(load, repeat)
+        result["queries"] = count_queries(load)
+        result["peak_kb"] = peak_memory(load) / 1024
+        results[name] = result
+    return results
+
+
+def print_results(results, baseline=None):
+    header = "%-26s %9s %9s %9s %8s %10s" % ("scenario", "p50 ms", "p95 ms", "max ms", "queries", "peak KB")
+    if baseline:
+        header += " %10s" % "p50 ratio"
+    print(header)
+    for name, result in results.items():
+        line = "%-26s %9.2f %9.2f %9.2f %8d %10.0f" % (
+            name,
+            result["p50"],
+            result["p95"],
+            result["max"],
+            result["queries"],
+            result["peak_kb"],
+        )
+        if baseline and name in baseline:
+            line += " %9.2fx" % (result["p50"] / baseline[name]["p50"])
+        print(line)
+
+
+def get_regressions(results, baseline, threshold: float):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        previous = baseline[name]
+        if result["p50"] > previous["p50"] * threshold:
+            regressions.append("%s: p50 %.2fms, baseline %.2fms" % (name, result["p50"], previous["p50"]))
+        if result["queries"] > previous["queries"]:
+            regressions.append("%s: %d queries, baseline %d" % (name, result["queries"], previous["queries"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--save", help="Save the results as a baseline")
+    parser.add_argument("--compare", help="Compare the results with a saved baseline")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Allowed p50 ratio against the baseline")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            saved = json.load(baseline_file)
+        if saved["rows"] != args.rows:
+            parser.error("The baseline was measured with %d rows" % saved["rows"])
+        baseline = saved["scenarios"]
+
+    results = run(args.rows, args.repeat)
+    print_results(results, baseline)
+    if args.save:
+        with open(args.save, "w") as baseline_file:
+            json.dump({"rows": args.rows, "scenarios": results}, baseline_file, indent=2)
+    if baseline:
+        regressions = get_regressions(results, baseline, args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,29 @@
+from rest_framework import serializers
+
+from htec_drf_dx_datagrid.pagination import TakeSkipPagination
+from htec_drf_dx_datagrid.viewsets import DxReadOnlyModelViewSet
+
+from .models import Order
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ["id", "customer", "status", "amount", "quantity", "created", "created_at", "category"]
+
+
+class OrderViewSet(DxReadOnlyModelViewSet):
+    serializer_class = OrderSerializer
+    queryset = Order.objects.all()
+
+
+class KeysetPagination(TakeSkipPagination):
+    use_keyset = True
+
+
+class KeysetOrderViewSet(OrderViewSet):
+    pagination_class = KeysetPagination
+
+
+class ValuesOrderViewSet(OrderViewSet):
+    use_values = True
@@ -0,0 +1,6 @@
+from django.apps import AppConfig
+
+
+class HtecDrfDxDatagridConfig(AppConfig):
+    name = "htec_drf_dx_datagrid"
+    verbose_name = "DevExtreme Data Grid"
@@ -0,0 +1,141 @@
+import json
+import threading
+from collections import Counter
+
+from django.db import connections
+from django.dispatch import Signal
+from rest_framework.exceptions import ValidationError
+
+# Sent when a load is rejected, with the view, the request and the reason
+query_rejected = Signal()
+
+_rejections = Counter()
+_rejections_lock = threading.Lock()
+
+
+def count_rejection(reason: str):
+    with _rejections_lock:
+        _rejections[reason] += 1
+
+
+def get_rejection_counts():
+    """
+    Loads rejected by the query budget since the process started
+    :return: Dict {reason: count}
+    """
+    with _rejections_lock:
+        return dict(_rejections)
+
+
+def measure_filter(dx_filter):
+    """
+    Size of a DevExtreme filter, measured before it is parsed
+    :return: (number of nodes, depth, length of the largest list of values)
+    """
+    nodes = depth = values = 0
+    stack = [(dx_filter, 1)]
+    while stack:
+        elem, level = stack.pop()
+        if not isinstance(elem, list) or not elem:
+            continue
+        depth = max(depth, level)
+        if isinstance(elem[0], str) and elem[0] != "!":
+            nodes += 1
+            if len(elem) == 3 and isinstance(elem[2], list):
+                values = max(values, len(elem[2]))
+        else:
+            stack.extend((child, level + 1) for child in elem if isinstance(child, list))
+    return nodes, depth, values
+
+
+class QueryBudgetExceeded(ValidationError):
+    def __init__(self, reason: str, detail: str):
+        super().__init__(detail=detail)
+        self.reason = reason
+
+
+class QueryBudget(object):
+    """
+    Limits of the cost of a load, checked before its queries run. Every limit is
+    optional (None disables it):
+    MAX_FILTER_NODES, MAX_FILTER_DEPTH, MAX_IN_VALUES (values of anyof/noneof),
+    MAX_GROUPS, MAX_SUMMARIES (group and total summaries), MAX_TAKE (the loads
+    without take are rejected), MAX_SKIP, MAX_ESTIMATED_ROWS, the rows the
+    planner estimates for the filtered queryset (EXPLAIN, only on PostgreSQL) and
+    MAX_EXPORT_ROWS, the rows of the exports
+    """
+
+    def __init__(self, limits: dict):
+        self.limits = limits
+
+    def check(self, name: str, value, reason: str, description: str):
+        limit = self.limits.get(name)
+        if limit is not None and value is not None and value > limit:
+            raise QueryBudgetExceeded(
+                reason, f"The load exceeds the query budget: {description} {value} > {limit}"
+            )
+
+    @staticmethod
+    def to_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def check_load_options(self, load_options, export: bool = False):
+        """
+        :param export: Whether the rows are exported, the exports have no take and
+                       are limited by MAX_EXPORT_ROWS
+        :raise QueryBudgetExceeded: When a load option exceeds its limit, or the load
+                                    reads rows without take when MAX_TAKE is set
+        """
+        nodes, depth, values = measure_filter(load_options.filter)
+        self.check("MAX_FILTER_NODES", nodes, "filter_nodes", "filter conditions")
+        self.check("MAX_FILTER_DEPTH", depth, "filter_depth", "filter depth")
+        self.check("MAX_IN_VALUES", values, "in_values", "values of a filter condition")
+        self.check("MAX_GROUPS", len(load_options.group), "groups", "group levels")
+        summaries = len(load_options.group_summary) + len(load_options.total_summary)
+        self.check("MAX_SUMMARIES", summaries, "summaries", "summaries")
+        self.check("MAX_TAKE", self.to_int(load_options.get("take")), "take", "take")
+        self.check("MAX_SKIP", self.to_int(load_options.get("skip")), "skip", "skip")
+        max_take = self.limits.get("MAX_TAKE")
+        if (
+            max_take is not None
+            and not export
+            and not load_options.is_count_query
+            and self.to_int(load_options.get("take")) is None
+        ):
+            raise QueryBudgetExceeded(
+                "take", f"The load exceeds the query budget: a load without take can't read more than {max_take} rows"
+            )
+
+    def check_export(self, count_rows):
+        """
+        :param count_rows: Function that counts the rows of the export
+        :raise QueryBudgetExceeded: When the export has more rows than MAX_EXPORT_ROWS
+        """
+        if self.limits.get("MAX_EXPORT_ROWS") is None:
+            return
+        self.check("MAX_EXPORT_ROWS", count_rows(), "export_rows", "exported rows")
+
+    def get_estimated_rows(self, queryset):
+        """
+        Rows the planner of the database estimates for the queryset
+        :return: Number of rows, None when the database can't tell
+        """
+        if connections[queryset.db].vendor != "postgresql":
+            return None
+        plan = json.loads(queryset.explain(format="json"))
+        if isinstance(plan, list):  # Django < 4.0 keeps the list of the statements
+            plan = plan[0]
+        return plan["Plan"]["Plan Rows"]
+
+    def check_queryset(self, queryset):
+        """
+        :raise QueryBudgetExceeded: When the filtered queryset is estimated to read
+                                    more rows than MAX_ESTIMATED_ROWS
+        """
+        if self.limits.get("MAX_ESTIMATED_ROWS") is None:
+            return
+        rows = self.get_estimated_rows(queryset)
+        self.check("MAX_ESTIMATED_ROWS", rows, "estimated_rows", "estimated rows")
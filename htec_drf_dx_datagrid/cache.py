@@ -0,0 +1,403 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from django.apps import apps
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .mixins import DxMixin
+
+_local_cache = None
+_connected_models = set()
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+def get_cache(cache_alias=None):
+    """
+    Django cache used by the datagrid, a private local-memory cache by default
+    """
+    global _local_cache
+    if cache_alias:
+        return caches[cache_alias]
+    if _local_cache is None:
+        _local_cache = LocMemCache(
+            "htec-drf-dx-datagrid", {"TIMEOUT": None, "OPTIONS": {"MAX_ENTRIES": 1000}}
+        )
+    return _local_cache
+
+
+class ModelVersion(object):
+    """
+    Per model version number stored in the cache. Saving or deleting an instance
+    of the model (or changing a many to many relation, for through models)
+    increments the version, so every key built with the previous version stops
+    being used.
+    """
+
+    KEY_PREFIX = "dx:version:"
+
+    def __init__(self, cache_alias: str = None):
+        self.cache_alias = cache_alias
+        self.cache = get_cache(cache_alias)
+
+    def get_key(self, model):
+        return self.KEY_PREFIX + model._meta.label_lower
+
+    def get(self, model):
+        self.connect(model)
+        key = self.get_key(model)
+        version = self.cache.get(key)
+        if version is None:
+            # Start from the clock, an evicted version never repeats an old value
+            self.cache.add(key, int(time.time() * 1000000), timeout=None)
+            version = self.cache.get(key)
+        return version
+
+    def increment(self, model):
+        key = self.get_key(model)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, int(time.time() * 1000000), timeout=None)
+
+    @staticmethod
+    def get_through_models(model):
+        """
+        Through models of the many to many relations of the model (in both
+        directions), and the model itself when it is an automatic through model.
+        Django sends m2m_changed with the through model as sender
+        """
+        through_models = {model} if model._meta.auto_created else set()
+        for model_field in model._meta.get_fields():
+            if model_field.many_to_many:
+                through = getattr(model_field.remote_field, "through", None)
+                if through is None:  # Reverse many to many relation
+                    through = model_field.through
+                through_models.add(through)
+        return through_models
+
+    def connect(self, model):
+        dispatch_uid = "htec_drf_dx_datagrid:%s:%s" % (self.cache_alias, model._meta.label_lower)
+        if dispatch_uid in _connected_models:
+            return
+        cache_alias = self.cache_alias
+
+        def invalidate(sender, **kwargs):
+            ModelVersion(cache_alias).increment(sender)
+
+        post_save.connect(invalidate, sender=model, weak=False, dispatch_uid=dispatch_uid)
+        post_delete.connect(invalidate, sender=model, weak=False, dispatch_uid=dispatch_uid)
+        for through in self.get_through_models(model):
+            # The added or removed links are rows of the through model
+            m2m_uid = "htec_drf_dx_datagrid:m2m:%s:%s" % (cache_alias, through._meta.label_lower)
+            m2m_changed.connect(invalidate, sender=through, weak=False, dispatch_uid=m2m_uid)
+        _connected_models.add(dispatch_uid)
+
+
+class CountCache(DxMixin):
+    """
+    Cache of queryset counts for the repeated loads of the virtual scrolling,
+    where only skip/take change between requests.
+    Keys contain the model, the normalized filter/group load options, the SQL of
+    the queryset (so querysets restricted per user never share a count) and the
+    versions of the models the query joins. Saves, deletes and many to many changes
+    invalidate the counts, the timeout bounds the staleness of changes made without signals (update, bulk_create...).
+    """
+
+    KEY_PREFIX = "dx:count:"
+
+    def __init__(self, timeout: int, cache_alias: str = None):
+        self.timeout = timeout
+        self.cache = get_cache(cache_alias)
+        self.version = ModelVersion(cache_alias)
+
+    def get_options(self, request):
+        load_options = self.get_load_options(request)
+        return {
+            self.FILTER: load_options.filter,
+            self.GROUP: load_options.group,
+        }
+
+    @staticmethod
+    def get_count_queryset(queryset):
+        """
+        The columns read don't change the count, the querysets of the same rows
+        share the key
+        """
+        query = queryset.query
+        if query.group_by is None and not query.distinct and not query.combinator and not query.is_sliced:
+            return queryset.values("pk")
+        return queryset
+
+    @staticmethod
+    def get_count_models(model, query):
+        """
+        Models of the tables the query joins (filters across relations, through
+        models...), the model of the queryset first
+        """
+        tables = {alias.table_name for alias in query.alias_map.values()} - {model._meta.db_table}
+        related_models = [
+            related for related in apps.get_models(include_auto_created=True) if related._meta.db_table in tables
+        ]
+        return [model] + sorted(related_models, key=lambda related: related._meta.label_lower)
+
+    def get_key(self, queryset, request):
+        """
+        :return: Cache key, or None when the queryset can't be compiled to SQL
+        """
+        count_queryset = self.get_count_queryset(queryset).order_by()
+        try:
+            sql, params = count_queryset.query.sql_with_params()
+        except Exception:
+            return None
+        content = json.dumps(
+            [self.get_options(request), sql, [str(param) for param in params]],
+            sort_keys=True,
+            default=str,
+        )
+        versions = [str(self.version.get(model)) for model in self.get_count_models(queryset.model, count_queryset.query)]
+        return "%s%s:%s:%s" % (
+            self.KEY_PREFIX,
+            queryset.model._meta.label_lower,
+            ".".join(versions),
+            hashlib.md5(content.encode()).hexdigest(),
+        )
+
+    def get_cached_count(self, queryset, request):
+        """
+        :return: Count in the cache, None when it is not there
+        """
+        key = self.get_key(queryset, request)
+        return None if key is None else self.cache.get(key)
+
+    def get_count(self, queryset, request):
+        key = self.get_key(queryset, request)
+        if key is None:
+            return queryset.count()
+        count = self.cache.get(key)
+        if count is None:
+            count = queryset.count()
+            self.cache.set(key, count, timeout=self.timeout)
+        return count
+
+
+class ResponseCache(DxMixin):
+    """
+    Cache of the list responses for the loads repeated by the users that open the
+    same dashboards.
+    Keys contain the view, the canonical load options and the other query
+    parameters, the scope of the view (the user by default) and the versions of
+    the models the view reads. Entries expire with the timeout, or before when the
+    cache evicts them (the private local-memory cache drops the least recently used).
+    The ETag of a response is the hash of its content, a request whose
+    If-None-Match matches it gets a 304 without running the queries.
+    """
+
+    KEY_PREFIX = "dx:response:"
+    LOAD_OPTIONS = [
+        DxMixin.FILTER,
+        DxMixin.SORT,
+        DxMixin.GROUP,
+        DxMixin.SELECT,
+        DxMixin.GROUP_SUMMARY,
+        DxMixin.TOTAL_SUMMARY,
+        DxMixin.REQUIRE_TOTAL_COUNT,
+        DxMixin.REQUIRE_GROUP_COUNT,
+        DxMixin.IS_COUNT_QUERY,
+        "skip",
+        "take",
+        "cursor",
+    ]
+    LIST_OPTIONS = [
+        DxMixin.SORT,
+        DxMixin.GROUP,
+        DxMixin.SELECT,
+        DxMixin.GROUP_SUMMARY,
+        DxMixin.TOTAL_SUMMARY,
+    ]
+
+    def __init__(self, timeout: int, cache_alias: str = None):
+        self.timeout = timeout
+        self.cache = get_cache(cache_alias)
+        self.version = ModelVersion(cache_alias)
+
+    def get_options(self, request):
+        """
+        Load options decoded like get_param_from_request does (JSON or plain values,
+        "name" or "name[]") and the rest of the parameters, read from the same places:
+        the query parameters, then the body of the request
+        """
+        load_options = self.get_load_options(request)
+        options = {}
+        for name in self.LOAD_OPTIONS:
+            if name in self.LIST_OPTIONS:
+                options[name] = load_options.get_list(name)
+            else:
+                value = load_options.get(name)
+                # "True" is not JSON but it means the same as true
+                options[name] = True if value == "True" else value
+        known_params = set(self.LOAD_OPTIONS) | {name + "[]" for name in self.LOAD_OPTIONS}
+        params = {name: request.GET.getlist(name) for name in request.GET if name not in known_params}
+        data = request.data
+        if isinstance(data, dict):
+            for name in data:
+                if name not in known_params and name not in params:
+                    params[name] = data.get(name)
+        return [options, sorted(params.items())]
+
+    def get_key(self, view, request):
+        versions = [
+            [model._meta.label_lower, self.version.get(model)]
+            for model in view.get_response_cache_models()
+        ]
+        content = json.dumps(
+            [
+                "%s.%s" % (type(view).__module__, type(view).__qualname__),
+                request.path,
+                view.get_response_cache_scope(),
+                self.get_options(request),
+                versions,
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        return self.KEY_PREFIX + hashlib.md5(content.encode()).hexdigest()
+
+    @staticmethod
+    def get_etag(data):
+        content = json.dumps(data, cls=JSONEncoder, sort_keys=True)
+        return quote_etag(hashlib.md5(content.encode()).hexdigest())
+
+    def get_response(self, view, request, get_response):
+        """
+        :param get_response: Function that builds the response when it is not cached
+        """
+        key = self.get_key(view, request)
+        entry = self.cache.get(key)
+        if entry is None:
+            response = get_response()
+            if not isinstance(response, Response) or response.status_code != 200:
+                return response
+            etag = self.get_etag(response.data)
+            self.cache.set(key, (etag, response.data), timeout=self.timeout)
+        else:
+            etag, data = entry
+            response = Response(data)
+
+        if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+            response = Response(status=304)
+        response["ETag"] = etag
+        return response
+
+
+class DeltaCache(DxMixin):
+    """
+    Windows of the delta loads: the primary key and the version (delta_field) of
+    every row of the page a version token was returned with. A load that sends the
+    token back is compared with its window. The key of a window contains the view,
+    the load options that select the rows and the versions of the related models,
+    a change of the related rows invalidates the windows
+    """
+
+    KEY_PREFIX = "dx:delta:"
+    WINDOW_OPTIONS = [DxMixin.FILTER, DxMixin.SORT, DxMixin.SELECT, "skip", "take", "cursor"]
+
+    def __init__(self, timeout: int, cache_alias: str = None):
+        self.timeout = timeout
+        self.cache = get_cache(cache_alias)
+        self.version = ModelVersion(cache_alias)
+
+    def get_digest(self, view, request):
+        load_options = self.get_load_options(request)
+        model = view.get_queryset().model
+        versions = [
+            [related._meta.label_lower, self.version.get(related)]
+            for related in view.get_response_cache_models()
+            if related is not model
+        ]
+        content = json.dumps(
+            [
+                "%s.%s" % (type(view).__module__, type(view).__qualname__),
+                request.path,
+                view.get_response_cache_scope(),
+                {name: load_options.get(name) for name in self.WINDOW_OPTIONS},
+                versions,
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.md5(content.encode()).hexdigest()
+
+    def get_window(self, token, digest: str):
+        """
+        :return: List of (pk, version) of the window of the token, None when the
+                 token is unknown, expired or was returned for other rows
+        """
+        if not isinstance(token, str) or not token.isalnum():
+            return None
+        entry = self.cache.get(self.KEY_PREFIX + token)
+        if entry is None or entry[0] != digest:
+            return None
+        return entry[1]
+
+    def save_window(self, digest: str, window: list):
+        """
+        :return: Version token of the window
+        """
+        token = uuid.uuid4().hex
+        self.cache.set(self.KEY_PREFIX + token, (digest, window), timeout=self.timeout)
+        return token
+
+    def touch(self, token: str):
+        self.cache.touch(self.KEY_PREFIX + token, timeout=self.timeout)
+
+
+class LRUCache(object):
+    """
+    Bounded, thread safe in-process cache for objects that can't be pickled
+    (compiled plans), with hit/miss statistics like functools.lru_cache
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key, create):
+        """
+        :param create: Function that builds the value when key is not cached
+        """
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return self._data[key]
+            self.misses += 1
+        value = create()
+        if self.maxsize:
+            with self._lock:
+                self._data[key] = value
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return value
+
+    def cache_info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,101 @@
+import json
+from abc import ABCMeta, abstractmethod
+
+from django.db import connections
+from django.db.models import IntegerField, Q
+
+from .mixins import DxMixin
+
+
+def get_count_estimator(using: str):
+    """
+    Count estimator of the database vendor
+    """
+    estimator_class = COUNT_ESTIMATORS.get(connections[using].vendor, SampledCountEstimator)
+    return estimator_class(using)
+
+
+class CountEstimator(DxMixin, metaclass=ABCMeta):
+    """
+    Estimate of the rows of a queryset, without counting all of them. Subclasses
+    implement get_estimate
+    """
+
+    def __init__(self, using: str):
+        self.using = using
+
+    def can_estimate(self, queryset):
+        query = queryset.query
+        # The rows of a GROUP BY are groups, they can't be estimated from the table
+        return query.group_by is None and not query.combinator and not query.is_sliced
+
+    def estimate(self, queryset):
+        """
+        :return: Estimated number of rows, None when it can't be estimated
+        """
+        if not self.can_estimate(queryset):
+            return None
+        return self.get_estimate(queryset)
+
+    @abstractmethod
+    def get_estimate(self, queryset):
+        """
+        :return: Estimated number of rows of a queryset that can be estimated, None
+                 to count them exactly
+        """
+
+
+class PlannerCountEstimator(CountEstimator):
+    """
+    Rows the PostgreSQL planner estimates from the statistics of the tables (EXPLAIN),
+    close for unfiltered and lightly filtered querysets
+    """
+
+    def get_estimate(self, queryset):
+        plan = json.loads(queryset.order_by().explain(format="json"))
+        if isinstance(plan, list):  # Django < 4.0 keeps the list of the statements
+            plan = plan[0]
+        return int(plan["Plan"]["Plan Rows"])
+
+
+class SampledCountEstimator(CountEstimator):
+    """
+    Rows of the queryset in a few ranges of the primary key spread over the table,
+    scaled to the whole range. ESTIMATED_COUNT_SAMPLE_SIZE is the number of keys of
+    the ranges, the tables with less than two samples of keys are not estimated.
+    Only models with an integer primary key
+    """
+
+    SAMPLE_RANGES = 4
+
+    def get_estimate(self, queryset):
+        model = queryset.model
+        if not isinstance(model._meta.pk, IntegerField):
+            return None
+        sample_size = self.get_setting("ESTIMATED_COUNT_SAMPLE_SIZE", 10000)
+        # Two queries that read an end of the index of the primary key, some databases
+        # scan the table for MIN() and MAX() in the same query
+        pks = model._base_manager.using(queryset.db).order_by("pk").values_list("pk", flat=True)
+        low = pks.first()
+        if low is None:
+            return None
+        high = pks.last()
+        span = high - low + 1
+        if span < 2 * sample_size:
+            return None
+        range_size = sample_size // self.SAMPLE_RANGES
+        step = span // self.SAMPLE_RANGES
+        sample_q = Q(
+            *[
+                Q(pk__gte=start, pk__lt=start + range_size)
+                for start in range(low, high + 1, step)[:self.SAMPLE_RANGES]
+            ],
+            _connector=Q.OR,
+        )
+        sampled = queryset.filter(sample_q).order_by().count()
+        return sampled * span // (range_size * self.SAMPLE_RANGES)
+
+
+COUNT_ESTIMATORS = {
+    "postgresql": PlannerCountEstimator,
+}
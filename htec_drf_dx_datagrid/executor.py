@@ -0,0 +1,60 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.db import close_old_connections
+
+from .mixins import DxMixin
+
+_thread_pool = None
+_thread_pool_lock = threading.Lock()
+
+
+def get_thread_pool():
+    """
+    Threads shared by all the requests, sized with the CONCURRENT_QUERIES_POOL_SIZE
+    setting. Each thread uses its own database connections
+    """
+    global _thread_pool
+    with _thread_pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(
+                max_workers=DxMixin.get_setting("CONCURRENT_QUERIES_POOL_SIZE", 10),
+                thread_name_prefix="htec-drf-dx-datagrid",
+            )
+    return _thread_pool
+
+
+def run_in_thread(task):
+    # The connections of the thread follow CONN_MAX_AGE like the ones of a request
+    close_old_connections()
+    try:
+        return task()
+    finally:
+        close_old_connections()
+
+
+class ThreadExecutor(object):
+    """
+    Run independent queries of a request at the same time, at most max_concurrency
+    of them. The first task of each batch runs in the thread of the request
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+
+    def run(self, tasks: list):
+        """
+        :param tasks: Functions without arguments
+        :return: List with the result of each task
+        """
+        results = []
+        for start in range(0, len(tasks), self.max_concurrency):
+            batch = tasks[start:start + self.max_concurrency]
+            futures = [get_thread_pool().submit(run_in_thread, task) for task in batch[1:]]
+            try:
+                results.append(batch[0]())
+            finally:
+                # Don't leave queries running when the first task fails
+                wait(futures)
+            results.extend(future.result() for future in futures)
+        return results
@@ -0,0 +1,64 @@
+import csv
+
+from rest_framework.utils.encoders import JSONEncoder
+
+# Content type of each export format
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+# Compact, like the JSON responses of rest framework
+json_encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+class Echo(object):
+    """
+    File-like object for csv.writer that returns the line instead of storing it
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_ndjson(batches, get_summary=None):
+    """
+    One JSON object per line, the total summary is the last line: {"summary": [...]}
+    :param batches: Iterable of lists of serialized rows
+    :param get_summary: Function that returns the total summary, called after the rows
+    """
+    for batch in batches:
+        yield "".join(json_encoder.encode(row) + "\n" for row in batch)
+    if get_summary is not None:
+        yield json_encoder.encode({"summary": get_summary()}) + "\n"
+
+
+def to_csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json_encoder.encode(value)
+    return value
+
+
+def iter_csv(field_names: list, batches, summary_items=(), get_summary=None):
+    """
+    Header and one line per row. After an empty line each total summary has its own
+    line, with the value in the column of its selector
+    :param summary_items: totalSummary load option
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(field_names)
+    for batch in batches:
+        yield "".join(
+            writer.writerow([to_csv_value(row.get(field_name)) for field_name in field_names])
+            for row in batch
+        )
+    if get_summary is not None:
+        lines = [writer.writerow([])]
+        for item, value in zip(summary_items, get_summary()):
+            lines.append(
+                writer.writerow(
+                    [to_csv_value(value) if field_name == item["selector"] else None for field_name in field_names]
+                )
+            )
+        yield "".join(lines)
@@ -1,29 +1,63 @@
 import ast
+from datetime import date, datetime, timedelta
 
+from django.conf import settings
 from django.db.models import Q
+from django.utils import timezone
 from rest_framework import filters, fields
+from rest_framework.exceptions import ValidationError
 
+from .cache import LRUCache
 from .exceptions import HtecDrfDxDatagridException
+from .metadata import get_field_operators, get_field_type
 from .mixins import DxMixin
+from .search import get_search_backend
+
+_filter_plan_cache = None
+
+
+def get_filter_plan_cache():
+    """
+    Compiled filter plans shared by all the requests, sized with the
+    FILTER_PLAN_CACHE_SIZE setting (0 disables the cache)
+    """
+    global _filter_plan_cache
+    if _filter_plan_cache is None:
+        _filter_plan_cache = LRUCache(DxMixin.get_setting("FILTER_PLAN_CACHE_SIZE", 256))
+    return _filter_plan_cache
 
 
 class DxFilterBackend(filters.BaseFilterBackend, DxMixin):
+    NODE = "node"
+    NOT = "!"
+    AND = "and"
+    OR = "or"
+    ANYOF = "anyof"
+    NONEOF = "noneof"
+    BETWEEN = "between"
+    # Internal operator of the date part filters merged into a range
+    DATE_RANGE = "daterange"
+    DATE_PARTS = ("year", "quarter", "month", "day")
+    # Internal operator of the "contains" conditions of the search panel
+    SEARCH = "search"
 
     def __init__(self):
         self.is_case_sensitive = self.get_case_sensitive()
+        self.search_index = self.get_setting("SEARCH_INDEX", False)
         self.serializer = None
+        self.metadata = None
+        self.model = None
+        self.using = None
 
     @staticmethod
     def _is_node(dx_filter: list):
         """
-        Dev extreme datagrid the filter node is [field_name, operator, value]
+        Dev extreme datagrid the filter node is [field_name, operator, value],
+        the value is a list for the anyof, noneof and between operators
         :param dx_filter: List with dev extreme datagrid filter
         :return: True when dx_filter is a node
         """
-        for elem in dx_filter:
-            if isinstance(elem, list):
-                return False
-        return True
+        return isinstance(dx_filter[0], str) and dx_filter[0] != "!"
 
     def _to_django_operator(self, operator: str, value, field):
         if value is None:
@@ -62,72 +96,451 @@ class DxFilterBackend(filters.BaseFilterBackend, DxMixin):
         if type(value) is str:
             if isinstance(field, fields.BooleanField):
                 return value.lower() == "true"
-            try:
-                # Creo que esto ya no haría falta
-                aux_value = ast.literal_eval(value)
-                if type(aux_value) is list:
-                    return aux_value
-            except (ValueError, SyntaxError):
-                pass
+            # Only a list literal is converted, don't parse anything else
+            if value.lstrip(" \t").startswith("["):
+                try:
+                    aux_value = ast.literal_eval(value)
+                    if type(aux_value) is list:
+                        return aux_value
+                except (ValueError, SyntaxError):
+                    pass
         return value
 
-    def __node_to_q(self, node: list):
+    def _parse_filter(self, dx_filter: list):
+        """
+        Convert a dev extreme filter into a tree of tuples:
+        (NODE, field_name, operator, value), (NOT, tree) and (AND|OR, [tree, ...]).
+        Operators are applied from left to right, nested groups with the same
+        operator are merged and [[...], [...]] is an implicit "and"
+        """
+        if self._is_node(dx_filter):
+            if len(dx_filter) != 3:
+                raise HtecDrfDxDatagridException("Could not implement this search")
+            return self.NODE, dx_filter[0], dx_filter[1], dx_filter[2]
+
+        elems = []
+        for elem in dx_filter:
+            if isinstance(elem, list):
+                if elems and not isinstance(elems[-1], str):
+                    elems.append(self.AND)
+                elems.append(self._parse_filter(elem))
+            elif elem in [self.AND, self.OR, self.NOT]:
+                elems.append(elem)
+            else:
+                raise HtecDrfDxDatagridException("Could not implement this search")
+        if elems[0] == self.NOT:
+            if elems[1][0] == self.NOT:
+                return elems[1][1]
+            return self.NOT, elems[1]
+
+        connector = None
+        children = []
+        for index, elem in enumerate(elems):
+            if index % 2:
+                oper = self.AND if elem == self.AND else self.OR
+                if connector is None and children[0][0] == oper:
+                    children = list(children[0][1])
+                elif connector is not None and oper != connector:
+                    children = [(connector, children)]
+                connector = oper
+            elif connector is not None and elem[0] == connector:
+                children.extend(elem[1])
+            else:
+                children.append(elem)
+        if connector is None:
+            return children[0]
+        return connector, children
+
+    def _split_date_part(self, selector):
+        """
+        Date part selectors (created.year) of the date groups
+        :return: (serializer field of the date, part), or None
+        """
+        if not isinstance(selector, str) or "." not in selector:
+            return None
+        if selector in self.serializer.fields:
+            return None
+        base, _, part = selector.rpartition(".")
+        part = part.lower()
+        field = self.serializer.fields.get(base)
+        if part in self.DATE_PARTS and isinstance(field, (fields.DateField, fields.DateTimeField)):
+            return field, part
+        return None
+
+    def _merge_date_parts(self, children: list):
         """
-        Generate Query for Node filter
-        :param node: Node with dev extreme datagrid filter
-                    [field_name, operator, value]
-        :return: Query
+        Replace the equality nodes over the parts of a date ("created.year" = 2020,
+        "created.month" = 3) of an "and" group by a date range node over the field,
+        so the database can use its indexes instead of extracting the parts
+        """
+        part_indexes = {}
+        for index, child in enumerate(children):
+            if child[0] != self.NODE or child[2] != "=" or child[3] is None or isinstance(child[3], list):
+                continue
+            date_part = self._split_date_part(child[1])
+            if date_part is not None:
+                base = child[1].rpartition(".")[0]
+                part_indexes.setdefault(base, {}).setdefault(date_part[1], index)
+        replaced = {}
+        removed = set()
+        for base, indexes in part_indexes.items():
+            if "year" not in indexes:
+                # The range of a month of every year can't be expressed
+                continue
+            parts = ["year"]
+            if "month" in indexes:
+                parts.append("month")
+                if "day" in indexes:
+                    parts.append("day")
+            elif "quarter" in indexes:
+                parts.append("quarter")
+            value = {part: children[indexes[part]][3] for part in parts}
+            replaced[indexes["year"]] = (self.NODE, base, self.DATE_RANGE, value)
+            removed.update(indexes[part] for part in parts)
+        if not replaced:
+            return children
+        return [
+            replaced.get(index, child)
+            for index, child in enumerate(children)
+            if index in replaced or index not in removed
+        ]
+
+    def _merge_search_nodes(self, children: list):
+        """
+        Replace the "contains" nodes with the same value over several string fields
+        of an "or" group (the search panel) by a search node over all of them
+        """
+        indexes = {}
+        for index, child in enumerate(children):
+            if (
+                child[0] == self.NODE
+                and child[2] == "contains"
+                and isinstance(child[3], str)
+                and child[3]
+                and isinstance(self.serializer.fields.get(child[1]), fields.CharField)
+            ):
+                indexes.setdefault(child[3], []).append(index)
+        replaced = {}
+        removed = set()
+        for value, value_indexes in indexes.items():
+            selectors = tuple(dict.fromkeys(children[index][1] for index in value_indexes))
+            if len(selectors) < 2:
+                continue
+            replaced[value_indexes[0]] = (self.NODE, selectors, self.SEARCH, value)
+            removed.update(value_indexes)
+        if not replaced:
+            return children
+        return [
+            replaced.get(index, child)
+            for index, child in enumerate(children)
+            if index in replaced or index not in removed
+        ]
+
+    def _optimize_filter(self, tree):
+        """
+        Rewrite the equality nodes of an "or" group over the same field as a single
+        anyof node (IN) and the "<>" nodes of an "and" group as a noneof node (NOT IN).
+        The "<>" nodes are only merged when the fields compare the exact values, noneof
+        negates the "=" lookup (iexact for case insensitive filters...).
+        The equality nodes over the parts of a date become a range over the date
+        """
+        if tree[0] == self.NODE:
+            return self._merge_date_parts([tree])[0]
+        if tree[0] == self.NOT:
+            return self.NOT, self._optimize_filter(tree[1])
+
+        merge_operator, set_operator = ("=", self.ANYOF) if tree[0] == self.OR else ("<>", self.NONEOF)
+        children = []
+        set_nodes = {}
+        for child in tree[1]:
+            if tree[0] == self.OR or child[0] != self.NODE:
+                # The date parts of an "and" group are merged together below
+                child = self._optimize_filter(child)
+            if (
+                child[0] == self.NODE
+                and child[2] == merge_operator
+                and child[3] is not None
+                and not isinstance(child[3], list)
+                and (merge_operator == "=" or self._is_exact_equality(self._get_field(child[1])))
+            ):
+                field_name = child[1]
+                if field_name in set_nodes:
+                    index = set_nodes[field_name]
+                    previous = children[index]
+                    if previous[2] == merge_operator:
+                        children[index] = (self.NODE, field_name, set_operator, [previous[3]])
+                    children[index][3].append(child[3])
+                    continue
+                set_nodes[field_name] = len(children)
+            children.append(child)
+        if tree[0] == self.AND:
+            children = self._merge_date_parts(children)
+        elif self.search_index and self.serializer is not None:
+            children = self._merge_search_nodes(children)
+        if len(children) == 1:
+            return children[0]
+        return tree[0], children
+
+    def _get_filter_shape(self, tree, values: list):
+        """
+        Split a filter tree into its structure, which is the same for every
+        request of a dashboard, and its values
+        :param values: List where the values of the nodes are appended in order
+        :return: Hashable shape of the filter:
+                 (NODE, field_name, operator, value is None) for nodes,
+                 (NOT, shape) and (AND|OR, (shape, ...)) for groups
+        """
+        if tree[0] == self.NODE:
+            values.append(tree[3])
+            return self.NODE, tree[1], tree[2], tree[3] is None
+        if tree[0] == self.NOT:
+            return self.NOT, self._get_filter_shape(tree[1], values)
+        return tree[0], tuple(self._get_filter_shape(child, values) for child in tree[1])
+
+    def _compile_plan(self, shape):
+        """
+        Resolve the query fields and lookups of a filter shape. The plans are shared
+        by the requests, they keep the names of the serializer fields, not the fields
+        bound to the serializer of a request
+        :return: Plan with the same structure than the shape, the nodes are
+                 (NODE, field_name, selector, operator, lookup, is_negative) where
+                 lookup is None when it depends on the value
+        """
+        if shape[0] == self.NODE:
+            _, selector, operator, is_null = shape
+            if operator == self.SEARCH:
+                search_fields = tuple(self.serializer.fields[name] for name in selector)
+                field_names = tuple(
+                    self.get_field_name_from_source(self.serializer, field) for field in search_fields
+                )
+                lookups = tuple(self._to_django_operator("contains", "", field) for field in search_fields)
+                return self.NODE, field_names, selector, operator, lookups, False
+            field = self.serializer.fields.get(selector)
+            date_part = self._split_date_part(selector) if field is None else None
+            if date_part is not None:
+                # Compared with the part extracted by the database
+                date_field, part = date_part
+                field_name = self.get_field_name_from_source(self.serializer, date_field)
+                field_name += "__" + part
+            else:
+                field_metadata = self._get_field_metadata(selector)
+                if operator != self.DATE_RANGE:  # Built from the date parts of the filter
+                    self._check_operator(selector, field, operator, field_metadata)
+                if field_metadata is not None and field_metadata.path is not None:
+                    field_name = field_metadata.path
+                else:
+                    field_name = self.get_field_name_from_source(self.serializer, field)
+            is_negative = operator in ("<>", "notcontains", self.NONEOF)
+            if operator in (self.ANYOF, self.NONEOF):
+                lookup = "__in" if self._is_exact_equality(field) else None
+            elif operator in (self.BETWEEN, self.DATE_RANGE):
+                lookup = "__range"
+            elif is_null:
+                lookup = self._to_django_operator(operator, None, field)
+            elif isinstance(field, fields.ListField):
+                lookup = None
+            else:
+                lookup = self._to_django_operator(operator, "", field)
+            return self.NODE, field_name, selector, operator, lookup, is_negative
+        if shape[0] == self.NOT:
+            return self.NOT, self._compile_plan(shape[1])
+        return shape[0], tuple(self._compile_plan(child) for child in shape[1])
+
+    def _get_field(self, selector):
+        return None if self.serializer is None else self.serializer.fields.get(selector)
+
+    def _is_exact_equality(self, field):
         """
-        # NOTA: Obtener el tipo y si el tipo es isinstance(self.serializer.fields.get("tipo"), ListField) entonces hacer contains en lugar de =
-        field = self.serializer.fields.get(node[0])
-        field_name = self.get_field_name_from_source(self.serializer, field)
-        value = self._check_value(node[2], field)
-        is_negative = node[1] == "<>" or node[1] == "notcontains"
-        operator = self._to_django_operator(node[1], value, field)
+        Whether the "=" lookup of the field compares the exact value, so the values
+        can be compared with a single IN (which is case sensitive and can't look
+        inside list fields)
+        """
+        if isinstance(field, fields.ListField):
+            return False
+        return self._to_django_operator("=", "", field) in ("", "__exact")
+
+    def _get_field_metadata(self, selector):
+        """
+        :return: FieldMetadata of the grid, None when the filter isn't applied by a
+                 viewset or the selector isn't a field of its serializer
+        """
+        return None if self.metadata is None else self.metadata.fields.get(selector)
+
+    @staticmethod
+    def _check_operator(selector: str, field, operator: str, field_metadata=None):
+        """
+        Reject the operators the type of the field can't be compared with ("contains"
+        over a number...) before the queryset is built
+        :param field_metadata: FieldMetadata of the field, its operators are computed
+                               from the field when there is none
+        :raise ValidationError:
+        """
+        if field_metadata is not None:
+            operators, field_type = field_metadata.operators, field_metadata.type
+        elif field is not None:
+            operators, field_type = get_field_operators(field), get_field_type(field)
+        else:
+            return
+        if operators is not None and operator not in operators:
+            raise ValidationError(
+                detail=f"The '{operator}' operator can't be used with the {field_type} field '{selector}'"
+            )
+
+    def _equal_to_q(self, field_name: str, field, value):
+        lookup = self._to_django_operator("=", value, field)
         if value is None:  # Because we will use __isnull=True
             value = True
-        if value is "" and isinstance(field, fields.ListField):
+        if value == "" and isinstance(field, fields.ListField):
             value = []
-        q_expr = Q(**{field_name + operator: value})
+        return Q(**{field_name + lookup: value})
+
+    def _any_of_to_q(self, field_name: str, field, lookup, values):
+        """
+        Query for the anyof operator, a single IN when the field allows it
+        """
+        if not isinstance(values, list):
+            values = [values]
+        values = [self._check_value(value, field) for value in values]
+        if lookup is None:
+            q_list = [self._equal_to_q(field_name, field, value) for value in values]
+        else:
+            not_null_values = [value for value in values if value is not None]
+            q_list = [Q(**{field_name + lookup: not_null_values})] if not_null_values else []
+            if len(not_null_values) < len(values):
+                q_list.append(Q(**{field_name + "__isnull": True}))
+        if not q_list:
+            # Nothing is selected, no row matches
+            return Q(pk__in=[])
+        return Q(*q_list, _connector=Q.OR)
+
+    def _between_to_q(self, field_name: str, field, values):
+        """
+        Query for the between operator, both ends are included and an empty
+        end doesn't limit the range
+        """
+        start, end = [self._check_value(value, field) for value in values]
+        if start in (None, "") and end in (None, ""):
+            return Q()
+        if start in (None, ""):
+            return Q(**{field_name + "__lte": end})
+        if end in (None, ""):
+            return Q(**{field_name + "__gte": start})
+        return Q(**{field_name + "__range": (start, end)})
+
+    @staticmethod
+    def _date_range_to_q(field_name: str, field, parts: dict):
+        """
+        Query for the date range of a year, quarter, month or day, the end is excluded
+        :param parts: Dict {part: value} with the year and the finer parts
+        """
+        try:
+            parts = {part: int(value) for part, value in parts.items()}
+            year = parts["year"]
+            if "day" in parts:
+                start = date(year, parts["month"], parts["day"])
+                end = start + timedelta(days=1)
+            else:
+                if "month" in parts:
+                    month, months = parts["month"], 1
+                elif "quarter" in parts:
+                    month, months = (parts["quarter"] - 1) * 3 + 1, 3
+                else:
+                    month, months = 1, 12
+                start = date(year, month, 1)
+                end_month = month - 1 + months
+                end = date(year + end_month // 12, end_month % 12 + 1, 1)
+        except (TypeError, ValueError, OverflowError):
+            raise HtecDrfDxDatagridException("Could not implement this search")
+        if isinstance(field, fields.DateTimeField):
+            start = datetime.combine(start, datetime.min.time())
+            end = datetime.combine(end, datetime.min.time())
+            if settings.USE_TZ:
+                # The same days the __year, __month... lookups extract
+                start, end = timezone.make_aware(start), timezone.make_aware(end)
+        return Q(**{field_name + "__gte": start, field_name + "__lt": end})
 
-        return ~q_expr if is_negative else q_expr
+    def _search_to_q(self, field_names: tuple, lookups: tuple, value: str):
+        """
+        Query of a search node, answered by the search index of the database when
+        it has one for the fields, with LIKE conditions otherwise
+        """
+        like_q = Q(
+            *[Q(**{field_name + lookup: value}) for field_name, lookup in zip(field_names, lookups)],
+            _connector=Q.OR,
+        )
+        if self.model is None or self.using is None:
+            return like_q
+        backend = get_search_backend(self.using)
+        search_q = None if backend is None else backend.get_search_q(self.model, field_names, value, like_q)
+        return like_q if search_q is None else search_q
+
+    def _bind_plan(self, plan, values):
+        """
+        Build the query of a plan
+        :param values: Iterator over the values of the filter nodes
+        """
+        if plan[0] == self.NODE:
+            _, field_name, selector, operator, lookup, is_negative = plan
+            if operator == self.SEARCH:
+                return self._search_to_q(field_name, lookup, next(values))
+            field = self.serializer.fields.get(selector)
+            if operator in (self.ANYOF, self.NONEOF):
+                q_expr = self._any_of_to_q(field_name, field, lookup, next(values))
+                return ~q_expr if is_negative else q_expr
+            if operator == self.BETWEEN:
+                return self._between_to_q(field_name, field, next(values))
+            if operator == self.DATE_RANGE:
+                return self._date_range_to_q(field_name, field, next(values))
+            value = self._check_value(next(values), field)
+            if lookup is None:
+                lookup = self._to_django_operator(operator, value, field)
+            if value is None:  # Because we will use __isnull=True
+                value = True
+            if value == "" and isinstance(field, fields.ListField):
+                value = []
+            q_expr = Q(**{field_name + lookup: value})
+            return ~q_expr if is_negative else q_expr
+        if plan[0] == self.NOT:
+            return ~self._bind_plan(plan[1], values)
+        connector = Q.AND if plan[0] == self.AND else Q.OR
+        return Q(*[self._bind_plan(child, values) for child in plan[1]], _connector=connector)
 
     def __generate_q_expr(self, dx_filter):
         if dx_filter is None or not dx_filter:
             return None
-        if self._is_node(dx_filter):
-            return self.__node_to_q(dx_filter)
-        else:
-            q_elems = []
+        tree = self._optimize_filter(self._parse_filter(dx_filter))
+        values = []
+        shape = self._get_filter_shape(tree, values)
+        key = (type(self), type(self.serializer), self.metadata, self.is_case_sensitive, shape)
+        plan = get_filter_plan_cache().get_or_create(key, lambda: self._compile_plan(shape))
+        return self._bind_plan(plan, iter(values))
 
-            for elem in dx_filter:
-                if isinstance(elem, list):
-                    q_elems.append(self.__generate_q_expr(elem))
-                elif elem in ["and", "or", "!"]:
-                    q_elems.append(elem)
-                else:
-                    raise HtecDrfDxDatagridException("Could not implement this search")
-            if q_elems[0] == "!":
-                q_expr = ~q_elems[1]
-            else:
-                q_expr = q_elems[0]
-                for num_pair in range(0, len(q_elems) // 2):
-                    oper = q_elems[num_pair * 2 + 1]
-                    if oper == "and":
-                        q_expr = q_expr & q_elems[(num_pair + 1) * 2]
-                    else:
-                        q_expr = q_expr | q_elems[(num_pair + 1) * 2]
-            return q_expr
+    def get_filter_q(self, serializer, dx_filter):
+        """
+        Query of a filter over the fields of a serializer
+        :return: Q object, or None when there is no filter
+        """
+        self.serializer = serializer
+        self.metadata = None
+        return self.__generate_q_expr(dx_filter)
 
     def filter_queryset(self, request, queryset, view):
-        self.serializer = view.get_serializer()
+        if hasattr(view, "get_field_serializer"):
+            self.serializer = view.get_field_serializer()
+        else:
+            self.serializer = view.get_serializer()
+        # The query paths and the operators of the fields are computed once per viewset
+        self.metadata = view.get_grid_metadata() if hasattr(view, "get_grid_metadata") else None
+        self.model = queryset.model
+        self.using = queryset.db
+        load_options = self.get_load_options(request)
         res_queryset = queryset
-        dx_filter = self.get_param_from_request(request, self.FILTER)
+        dx_filter = load_options.filter
         if dx_filter:
             q_expr = self.__generate_q_expr(dx_filter)
             if q_expr is not None:
                 res_queryset = res_queryset.filter(q_expr)
-        sort = self.get_param_from_request(request, self.SORT)
+        sort = load_options.sort
         if sort:
             ordering = self.get_ordering(self.serializer, sort)
             if ordering:
@@ -135,9 +548,4 @@ class DxFilterBackend(filters.BaseFilterBackend, DxMixin):
         return res_queryset
 
     def get_case_sensitive(self):
-        from django.conf import settings
-
-        try:
-            return settings.REST_FRAMEWORK["DRF_DX_DATAGRID"]["FILTER_CASE_SENSITIVE"]
-        except (AttributeError, KeyError):
-            return True
+        return self.get_setting("FILTER_CASE_SENSITIVE", True)
@@ -0,0 +1,149 @@
+from django.db.models.functions import TruncDay, TruncMonth, TruncQuarter, TruncYear
+
+# Date intervals that can be read from the truncation to a finer interval
+DATE_TRUNCS = {"year": TruncYear, "quarter": TruncQuarter, "month": TruncMonth, "day": TruncDay}
+DATE_TRUNC_PREFIX = "_dx_trunc_"
+
+
+def get_date_truncs(groups: list, field_names: list):
+    """
+    Date fields grouped by several intervals down from the year. They are grouped by
+    the truncation to the finest interval, which an expression index can serve,
+    instead of extracting every part
+    :param field_names: Query field of the selector of each group
+    :return: Dict {field name: (alias, Trunc expression)}
+    """
+    intervals = {}
+    for group, field_name in zip(groups, field_names):
+        if "groupInterval" in group:
+            intervals.setdefault(field_name, set()).add(group["groupInterval"])
+    truncs = {}
+    order = list(DATE_TRUNCS)
+    for field_name, field_intervals in intervals.items():
+        if "year" in field_intervals and field_intervals <= set(DATE_TRUNCS):
+            finest = max(field_intervals, key=order.index)
+            alias = DATE_TRUNC_PREFIX + field_name.replace("__", "_")
+            truncs[field_name] = (alias, DATE_TRUNCS[finest](field_name))
+    return truncs
+
+
+def get_date_part(value, interval: str):
+    """
+    Part of a truncated date, the same value the __year, __month... lookups extract
+    """
+    if value is None:
+        return None
+    if interval == "quarter":
+        return (value.month - 1) // 3 + 1
+    return getattr(value, interval)
+
+
+def iter_date_part_rows(rows, date_parts: list):
+    """
+    Set the interval of the groups read from a truncated date in the rows
+    :param date_parts: List of (group field name, truncation alias, interval)
+    """
+    for row in rows:
+        for group_field_name, alias, interval in date_parts:
+            row[group_field_name] = get_date_part(row[alias], interval)
+        yield row
+
+
+class GroupTreeBuilder(object):
+    """
+    Build the DevExtreme group items in a single pass over the rows of the group
+    query, without intermediate structures: expanded groups are {"key", "items"}
+    and collapsed groups {"key", "count", "summary", "items": None}.
+    The rows are sorted by the group fields, so a row that belongs to an existing
+    group continues the last item of its level. Levels where that doesn't hold
+    (interval groups, list keys) look the items up by key.
+    """
+
+    SUMMARY_PREFIX = "gs__"
+
+    def __init__(self, groups: list, group_field_names: list):
+        """
+        :param group_field_names: Field of the group query of each group
+        """
+        self.levels = [
+            (group_field_name, bool(group["isExpanded"]))
+            for group, group_field_name in zip(groups, group_field_names)
+        ]
+        # Interval groups (created__month) are sorted by the field, not by the interval
+        has_interval = any("groupInterval" in group for group in groups)
+        self.indexed_level = 0 if has_interval else len(self.levels)
+        self.summary_names = None
+        self.row_count = 0
+        self.total_count = 0
+        self._indexes = {}
+
+    def get_summary_names(self, row):
+        """
+        Summary columns of the rows, in the order of the groupSummary load option
+        """
+        names = [name for name in row if name.startswith(self.SUMMARY_PREFIX)]
+        names.sort(key=lambda name: int(name[len(self.SUMMARY_PREFIX):]))
+        return names
+
+    def build(self, rows):
+        """
+        :param rows: Iterable of the group query rows, it is consumed once
+        :return: List of group items
+        """
+        items = []
+        for row in rows:
+            if self.summary_names is None:
+                self.summary_names = self.get_summary_names(row)
+            self.row_count += 1
+            self.total_count += row["count"]
+            self._add_row(items, 0, row)
+        return items
+
+    def _add_row(self, items, level, row):
+        key = row[self.levels[level][0]]
+
+        # TMP: Lo tenemos que poner por ahora porque a veces tenemos incongruencias de datos
+        if type(key) is list:
+            # The row belongs to a group per element, they aren't sorted
+            self.indexed_level = min(self.indexed_level, level)
+            if not key:
+                self._add_to_group(items, level, "", row)
+            for subkey in key:
+                self._add_to_group(items, level, subkey, row)
+        else:
+            self._add_to_group(items, level, key, row)
+
+    def _add_to_group(self, items, level, key, row):
+        item = self._find_item(items, level, key)
+        if self.levels[level][1]:
+            if item is None:
+                item = self._append_item(items, {"key": key, "items": []})
+            if level + 1 < len(self.levels):
+                self._add_row(item["items"], level + 1, row)
+        elif item is None:
+            item = {"key": key, "count": row["count"]}
+            if self.summary_names:
+                item["summary"] = [row[name] for name in self.summary_names]
+            item["items"] = None
+            self._append_item(items, item)
+        else:
+            item["count"] += row["count"]
+            if self.summary_names:
+                item["summary"] = [row[name] for name in self.summary_names]
+
+    def _find_item(self, items, level, key):
+        if level < self.indexed_level:
+            if items and items[-1]["key"] == key:
+                return items[-1]
+            return None
+        index = self._indexes.get(id(items))
+        if index is None:
+            index = self._indexes[id(items)] = {item["key"]: item for item in items}
+        return index.get(key)
+
+    def _append_item(self, items, item):
+        items.append(item)
+        index = self._indexes.get(id(items))
+        if index is not None:
+            index[item["key"]] = item
+        return item
@@ -0,0 +1,115 @@
+import logging
+import time
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+from django.dispatch import Signal
+
+logger = logging.getLogger("htec_drf_dx_datagrid")
+
+# Sent after every instrumented load, with the view, the request and the instrumentation
+load_instrumented = Signal()
+
+
+class Phase(object):
+    """
+    Time (seconds), SQL queries and rows of a phase of the load
+    """
+
+    __slots__ = ("name", "duration", "queries", "rows")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.duration = 0.0
+        self.queries = 0
+        self.rows = 0
+
+    def as_dict(self):
+        return {
+            "duration_ms": round(self.duration * 1000, 3),
+            "queries": self.queries,
+            "rows": self.rows,
+        }
+
+
+# Phase of the disabled instrumentation, what is recorded in it is discarded
+NULL_PHASE = Phase("null")
+
+
+@contextmanager
+def null_phase(name: str = None):
+    yield NULL_PHASE
+
+
+class Instrumentation(object):
+    """
+    Time, SQL queries and rows of each phase of a load. Phases don't overlap: the time
+    and queries of a nested phase are not counted in the enclosing one, and a phase
+    entered several times accumulates.
+    Use it as a context manager around the load, the queries are counted with
+    execute_wrapper on every database connection
+    """
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.duration = 0.0
+        self.queries = 0
+        self._stack = []
+        self._started = None
+        self._start_time = None
+        self._exit_stack = None
+
+    def __enter__(self):
+        self._exit_stack = ExitStack()
+        for connection in connections.all():
+            self._exit_stack.enter_context(connection.execute_wrapper(self._execute_wrapper))
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = time.perf_counter() - self._start_time
+        self._exit_stack.close()
+
+    def _execute_wrapper(self, execute, sql, params, many, context):
+        self.queries += 1
+        if self._stack:
+            self._stack[-1].queries += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def phase(self, name: str):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase(name)
+        now = time.perf_counter()
+        if self._stack:
+            self._stack[-1].duration += now - self._started
+        self._stack.append(phase)
+        self._started = now
+        try:
+            yield phase
+        finally:
+            now = time.perf_counter()
+            phase.duration += now - self._started
+            self._stack.pop()
+            self._started = now
+
+    def as_dict(self):
+        return {
+            "duration_ms": round(self.duration * 1000, 3),
+            "queries": self.queries,
+            "phases": OrderedDict((name, phase.as_dict()) for name, phase in self.phases.items()),
+        }
+
+    def get_server_timing(self):
+        """
+        Value of the Server-Timing header, the total is the last metric
+        """
+        metrics = [
+            '%s;desc="%d queries, %d rows";dur=%.3f'
+            % (name, phase.queries, phase.rows, phase.duration * 1000)
+            for name, phase in self.phases.items()
+        ]
+        metrics.append('total;desc="%d queries";dur=%.3f' % (self.queries, self.duration * 1000))
+        return ", ".join(metrics)
@@ -0,0 +1,59 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+
+from htec_drf_dx_datagrid.search import get_search_backend, get_search_paths, get_search_views
+
+
+class Command(BaseCommand):
+    help = (
+        "Build or refresh the search indexes of the string fields of the viewsets with "
+        "search_index = True (FTS5 on SQLite, pg_trgm on PostgreSQL)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            help="Models to index (app_label.ModelName), all of them by default",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--refresh",
+            action="store_true",
+            help="Only index again the rows changed since the last build or refresh",
+        )
+
+    def handle(self, *args, **options):
+        # The viewsets are imported by the URLconf
+        import_module(settings.ROOT_URLCONF)
+        # Paths of every model, the viewsets over the same model share its index
+        model_paths = {}
+        for view_class in get_search_views():
+            view = view_class(request=None, format_kwarg=None, args=(), kwargs={})
+            model = view.get_queryset().model
+            paths = model_paths.setdefault(model, [])
+            paths.extend(path for path in get_search_paths(view) if path not in paths)
+
+        if options["models"]:
+            labels = {label.lower() for label in options["models"]}
+            model_paths = {
+                model: paths for model, paths in model_paths.items() if model._meta.label_lower in labels
+            }
+            missing = labels - {model._meta.label_lower for model in model_paths}
+            if missing:
+                raise CommandError("No search index declared for %s" % ", ".join(sorted(missing)))
+
+        for model, paths in model_paths.items():
+            using = router.db_for_read(model)
+            backend = get_search_backend(using)
+            if backend is None or not paths:
+                self.stdout.write("%s: no search index" % model._meta.label)
+                continue
+            if options["refresh"]:
+                index = backend.refresh_index(model, batch_size=options["batch_size"])
+            else:
+                index = backend.build_index(model, paths, batch_size=options["batch_size"])
+            self.stdout.write("%s: %s" % (model._meta.label, index))
@@ -0,0 +1,34 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from htec_drf_dx_datagrid.rollup import get_rollups
+
+
+class Command(BaseCommand):
+    help = "Refresh the rollup models declared by the viewsets, only the changed groups are written"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            help="Rollup models to refresh (app_label.ModelName), all of them by default",
+        )
+
+    def handle(self, *args, **options):
+        # The viewsets declare the rollups, they are imported by the URLconf
+        import_module(settings.ROOT_URLCONF)
+        rollups = get_rollups()
+        if options["models"]:
+            labels = {label.lower() for label in options["models"]}
+            rollups = [rollup for rollup in rollups if rollup.model._meta.label_lower in labels]
+            missing = labels - {rollup.model._meta.label_lower for rollup in rollups}
+            if missing:
+                raise CommandError("No rollup declared for %s" % ", ".join(sorted(missing)))
+
+        for rollup in rollups:
+            created, updated, deleted = rollup.refresh()
+            self.stdout.write(
+                "%s: %d created, %d updated, %d deleted" % (rollup, created, updated, deleted)
+            )
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import threading
+from collections import namedtuple
+
+from django.utils.http import quote_etag
+from rest_framework import serializers
+
+from .projection import get_model_field
+
+# Operators of the filters over each field type, None allows every operator
+COMPARISON_OPERATORS = frozenset(["=", "<>", "<", ">", "<=", ">=", "anyof", "noneof", "between"])
+FIELD_TYPE_OPERATORS = {
+    "number": COMPARISON_OPERATORS,
+    "date": COMPARISON_OPERATORS,
+}
+
+# path is the ORM lookup of the field, None when it can't be resolved from the source.
+# indexed isn't used by the queries of the grid: the seek predicate of the keyset
+# pagination reads fewer rows than OFFSET with or without an index, and the search
+# checks its own trigram indexes. Viewsets can use it to limit the sorted, grouped
+# or filtered columns of large tables
+FieldMetadata = namedtuple("FieldMetadata", ["name", "type", "path", "operators", "indexed"])
+
+_grid_metadata = {}
+_grid_metadata_lock = threading.Lock()
+
+
+def get_field_type(field):
+    """
+    :return: DevExtreme data type of a serializer field: 'object', 'number', 'date' or 'string'
+    """
+    if (
+        isinstance(field, (serializers.Serializer, serializers.JSONField))
+        or hasattr(field, "many")
+        and field.many
+    ):
+        return "object"
+    elif isinstance(
+        field,
+        (
+            serializers.IntegerField,
+            serializers.DecimalField,
+            serializers.FloatField,
+        ),
+    ):
+        return "number"
+    elif isinstance(field, (serializers.DateField, serializers.DateTimeField)):
+        return "date"
+    return "string"
+
+
+def get_field_operators(field):
+    """
+    :return: Set of the filter operators the field can be compared with, None for all of them
+    """
+    return FIELD_TYPE_OPERATORS.get(get_field_type(field))
+
+
+def is_indexed(model, path: str):
+    """
+    Whether the column of a query path is the first column of an index of its table
+    """
+    model_field = get_model_field(model, path, relations=True) if path else None
+    if model_field is None:
+        return False
+    field_model, field = model_field
+    if field.primary_key or field.unique or field.db_index:
+        return True
+    opts = field_model._meta
+    first_fields = [index.fields[0].lstrip("-") for index in opts.indexes if index.fields]
+    first_fields += [fields[0] for fields in opts.unique_together if fields]
+    return field.name in first_fields
+
+
+class GridMetadata(object):
+    """
+    Fields of the serializer of a viewset: DevExtreme type, ORM lookup path, filter
+    operators and whether the column is indexed, plus the list_types response and
+    its ETag. Built once per viewset and serializer class (get_grid_metadata)
+    """
+
+    def __init__(self, view):
+        serializer = view.get_field_serializer()
+        model = view.get_queryset().model
+        self.fields = {}
+        for name, field in serializer.fields.items():
+            try:
+                path = view.get_field_name_from_source(serializer, field)
+            except Exception:
+                path = None
+            self.fields[name] = FieldMetadata(
+                name,
+                view.get_field_type(field),
+                path,
+                get_field_operators(field),
+                is_indexed(model, path),
+            )
+        self.types = {name: field.type for name, field in self.fields.items()}
+        content = json.dumps(self.types, sort_keys=True)
+        self.etag = quote_etag(hashlib.md5(content.encode()).hexdigest())
+
+
+def get_grid_metadata(view):
+    """
+    Metadata of the viewset, built the first time it is asked for
+    """
+    key = (type(view), view.get_serializer_class())
+    metadata = _grid_metadata.get(key)
+    if metadata is None:
+        with _grid_metadata_lock:
+            metadata = _grid_metadata.get(key)
+            if metadata is None:
+                metadata = GridMetadata(view)
+                _grid_metadata[key] = metadata
+    return metadata
@@ -2,6 +2,9 @@ import json
 
 from rest_framework import serializers
 
+# Query field name of each serializer field: {(serializer class, field name): field name}
+_field_name_cache = {}
+
 
 class DxMixin(object):
     FILTER = "filter"
@@ -9,17 +12,35 @@ class DxMixin(object):
     GROUP_SUMMARY = "groupSummary"
     TOTAL_SUMMARY = "totalSummary"
     GROUP = "group"
+    SELECT = "select"
+    REQUIRE_TOTAL_COUNT = "requireTotalCount"
+    REQUIRE_GROUP_COUNT = "requireGroupCount"
+    IS_COUNT_QUERY = "isCountQuery"
     DX_PARAMS = [FILTER, SORT, GROUP_SUMMARY, TOTAL_SUMMARY, GROUP]
 
     @staticmethod
-    def get_param_from_request(request, param_name):
-        def json_loads(value, default):
-            try:
-                json_object = json.loads(value)
-            except json.JSONDecodeError:
-                return default
-            return json_object
+    def get_setting(name: str, default=None):
+        """
+        Read a setting from REST_FRAMEWORK["DRF_DX_DATAGRID"]
+        """
+        from django.conf import settings
+
+        try:
+            return settings.REST_FRAMEWORK["DRF_DX_DATAGRID"][name]
+        except (AttributeError, KeyError):
+            return default
 
+    @staticmethod
+    def json_loads(value, default):
+        try:
+            json_object = json.loads(value)
+        except json.JSONDecodeError:
+            return default
+        return json_object
+
+    @staticmethod
+    def get_param_from_request(request, param_name):
+        json_loads = DxMixin.json_loads
         param_list = []
         # Read from GET because sometimes you could be need modify something in query_params
         if param_name in request.GET:
@@ -35,6 +56,18 @@ class DxMixin(object):
 
         return request.data.get(param_name)
 
+    @staticmethod
+    def get_load_options(request):
+        """
+        Load options of the request, shared by the filter backend, the paginator
+        and the view so each parameter is parsed only once
+        """
+        load_options = getattr(request, "_dx_load_options", None)
+        if load_options is None:
+            load_options = LoadOptions(request)
+            request._dx_load_options = load_options
+        return load_options
+
     def get_ordering(self, serializer, dx_sort_list):
         result = []
         if dx_sort_list is None:
@@ -49,8 +82,17 @@ class DxMixin(object):
 
     def get_field_name_from_source(self, serializer, field):
         """
-        Get the field name needed in query from source of serializer
+        Get the field name needed in query from source of serializer.
+        The result is cached per serializer class and field name
         """
+        field_name = field if type(field) is str else field.field_name
+        cache_key = (type(serializer), field_name)
+        if cache_key not in _field_name_cache:
+            _field_name_cache[cache_key] = self._get_field_name_from_source(serializer, field)
+        return _field_name_cache[cache_key]
+
+    @staticmethod
+    def _get_field_name_from_source(serializer, field):
         if type(field) is str:
             field = serializer.fields.get(field)
         f_name = field.field_name
@@ -63,3 +105,76 @@ class DxMixin(object):
             elif hasattr(field, "source"):
                 f_name = field.source
         return f_name.replace(".", "__")
+
+
+class LoadOptions(DxMixin):
+    """
+    DevExtreme load options of a request. Every parameter is parsed from the
+    request the first time it is read
+    """
+
+    def __init__(self, request, params: dict = None):
+        """
+        :param params: Load options to read instead of the parameters of the request
+                       (the loads of a batch), the values can be JSON strings
+        """
+        self.request = request
+        self.source = params
+        self._params = {}
+
+    def get(self, param_name: str):
+        if param_name not in self._params:
+            if self.source is None:
+                value = self.get_param_from_request(self.request, param_name)
+            else:
+                value = self.source.get(param_name, self.source.get(param_name + "[]"))
+                if isinstance(value, str):
+                    value = self.json_loads(value, value)
+            self._params[param_name] = value
+        return self._params[param_name]
+
+    def get_list(self, param_name: str):
+        """
+        Parameters that can hold a list or a single dict
+        :return: List, empty when the parameter is missing
+        """
+        value = self.get(param_name)
+        if not value:
+            return []
+        return value if isinstance(value, list) else [value]
+
+    @property
+    def filter(self):
+        return self.get(self.FILTER)
+
+    @property
+    def sort(self):
+        return self.get_list(self.SORT)
+
+    @property
+    def group(self):
+        return self.get_list(self.GROUP)
+
+    @property
+    def select(self):
+        return self.get_list(self.SELECT)
+
+    @property
+    def group_summary(self):
+        return self.get_list(self.GROUP_SUMMARY)
+
+    @property
+    def total_summary(self):
+        return self.get_list(self.TOTAL_SUMMARY)
+
+    @property
+    def require_total_count(self):
+        return self.get(self.REQUIRE_TOTAL_COUNT)
+
+    @property
+    def require_group_count(self):
+        return self.get(self.REQUIRE_GROUP_COUNT)
+
+    @property
+    def is_count_query(self):
+        return self.get(self.IS_COUNT_QUERY) in (True, "true", "True")
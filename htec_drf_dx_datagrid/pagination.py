@@ -1,22 +1,58 @@
+import base64
+import datetime
+import hashlib
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Count, Q, Window
 from rest_framework.pagination import LimitOffsetPagination, _positive_int
 from rest_framework.response import Response
 from collections import OrderedDict
 
+from .mixins import DxMixin
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """
+    Keep the microseconds of times, DjangoJSONEncoder truncates them to milliseconds
+    and the seek predicate would return the last row of the previous page again
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
 
 class TakeSkipPagination(LimitOffsetPagination):
     limit_query_param = 'take'
     offset_query_param = 'skip'
+    cursor_query_param = 'cursor'
+    require_count_param = 'requireTotalCount'
+    # Opt-in keyset (seek) pagination for virtual scrolling. When the client sends
+    # back the cursor of the previous page, the next page is read with a WHERE
+    # predicate over the sort fields instead of an OFFSET
+    use_keyset = False
+    # Opt-in: read the count with COUNT(*) OVER () in the page query instead of a
+    # separate COUNT query, on databases with window functions
+    use_window_count = False
+    window_count_alias = '_dx_total_count'
+    # Opt-in for very large tables: when the page is not the last one, the count is
+    # estimated (see the count estimators) and flagged with totalCountApproximate,
+    # the exact count is read with a separate isCountQuery load
+    use_estimated_count = False
 
     def get_limit(self, request):
         if self.limit_query_param:
             try:
                 return _positive_int(
-                    request.query_params[self.limit_query_param] if self.limit_query_param in request.query_params
-                    else request.data[self.limit_query_param],
+                    DxMixin.get_load_options(request).get(self.limit_query_param),
                     strict=True,
                     cutoff=self.max_limit
                 )
-            except (KeyError, ValueError):
+            except (TypeError, ValueError):
                 pass
 
         return self.default_limit
@@ -24,32 +60,272 @@ class TakeSkipPagination(LimitOffsetPagination):
     def get_offset(self, request):
         try:
             return _positive_int(
-                request.query_params[self.offset_query_param] if self.offset_query_param in request.query_params
-                else request.data[self.offset_query_param],
+                DxMixin.get_load_options(request).get(self.offset_query_param),
             )
-        except (KeyError, ValueError):
+        except (TypeError, ValueError):
             return 0
 
-    def paginate_queryset(self, queryset, request, view=None):
-        self.count = self.get_count(queryset)
+    def get_cursor(self, request):
+        cursor = DxMixin.get_load_options(request).get(self.cursor_query_param)
+        return cursor if isinstance(cursor, str) else None
+
+    def get_count(self, queryset):
+        """
+        Count through the view, which may cache it
+        """
+        if hasattr(self.view, "get_queryset_count"):
+            return self.view.get_queryset_count(queryset)
+        return super().get_count(queryset)
+
+    def get_estimated_count(self, queryset):
+        """
+        Count estimated by the view, which may have the exact count cached
+        :return: (count, whether it is an estimate), or None to count the rows
+        """
+        if hasattr(self.view, "get_estimated_count"):
+            return self.view.get_estimated_count(queryset)
+        return None
+
+    def get_require_count(self, request):
+        """
+        The count is skipped only when the client explicitly sent requireTotalCount=false
+        """
+        value = DxMixin.get_load_options(request).get(self.require_count_param)
+        return value not in (False, "false", "False")
+
+    def can_use_window_count(self, queryset):
+        if not self.use_window_count or self.use_estimated_count:
+            return False
+        if getattr(self.view, "get_count_cache", None) and self.view.get_count_cache() is not None:
+            # The counts are read from the cache
+            return False
+        query = queryset.query
+        # DISTINCT is applied after the window, rows of a GROUP BY are already distinct
+        if query.combinator or (query.distinct and query.group_by is None):
+            return False
+        return connections[queryset.db].features.supports_over_clause
+
+    def slice_queryset(self, queryset, limit, window_count=False):
+        """
+        :param window_count: Read the count of the queryset with the page, see self.window_count
+        :return: List with the rows of the page
+        """
+        if window_count:
+            queryset = queryset.annotate(**{self.window_count_alias: Window(Count('*'))})
+        page = list(queryset[self.offset:self.offset + limit])
+        if window_count and page:
+            for row in page:
+                values = row if isinstance(row, dict) else row.__dict__
+                count = values.pop(self.window_count_alias)
+            self.window_count = count
+        return page
+
+    def paginate_queryset(self, queryset, request, view=None, require_count=None):
+        """
+        :param require_count: Whether the count must be known, by default it is taken
+                              from the requireTotalCount load option
+        """
+        self.view = view
+        self.count = None
+        self.count_is_estimate = False
+        self.window_count = None
         self.limit = self.get_limit(request)
         self.offset = self.get_offset(request)
+        self.cursor = None
         if self.limit is None and self.offset is None:
             return None
         self.request = request
+        if require_count is None:
+            require_count = self.get_require_count(request)
+
+        if self.limit is None:
+            page = list(queryset[self.offset:])
+            has_next = False
+        else:
+            window_count = require_count and self.can_use_window_count(queryset)
+            # One row more than requested tells whether this is the last page
+            if self.use_keyset:
+                page = self.paginate_keyset(queryset, request, self.limit + 1, window_count)
+            else:
+                page = self.slice_queryset(queryset, self.limit + 1, window_count)
+            has_next = len(page) > self.limit
+            if has_next:
+                page = page[:self.limit]
+                self.display_page_controls = self.template is not None
 
-        if self.limit is not None and self.count > self.limit and self.template is not None:
-            self.display_page_controls = True
+        if not has_next and (page or self.offset == 0):
+            self.count = self.offset + len(page)
+        elif require_count:
+            if self.window_count is not None:
+                self.count = self.window_count
+            elif self.use_estimated_count and has_next:
+                estimated = self.get_estimated_count(queryset)
+                if estimated is None:
+                    self.count = self.get_count(queryset)
+                else:
+                    # The rows read so far are certain
+                    self.count = max(estimated[0], self.offset + len(page) + 1)
+                    self.count_is_estimate = estimated[1]
+            else:
+                # Empty page, or the page query couldn't count
+                self.count = self.get_count(queryset)
+        return page
 
-        if self.count == 0 or self.offset > self.count:
-            return []
+    def paginate_keyset(self, queryset, request, limit, window_count=False):
+        """
+        Read the page with a seek predicate when the client sent the cursor returned
+        for the previous page. Any other position (first load, a jump of the
+        scrollbar, a changed sort or filter) falls back to OFFSET.
+        :param window_count: Read the count with the OFFSET page, the seek predicate
+                             filters the rows before the window is computed
+        """
+        queryset, ordering = self.get_keyset_ordering(queryset)
+        if ordering is None:
+            return self.slice_queryset(queryset, limit, window_count)
 
-        if self.limit is None:
-            return list(queryset[self.offset:])
-        return list(queryset[self.offset:self.offset + self.limit])
+        digest = self.get_keyset_digest(queryset, ordering)
+        seek_values = self.decode_cursor(self.get_cursor(request), digest)
+        if seek_values is None:
+            page = self.slice_queryset(queryset, limit, window_count)
+        else:
+            seek_q = self.get_seek_q(ordering, seek_values)
+            page = list(queryset.filter(seek_q)[:limit])
+
+        # The extra row asked to detect the last page is not part of the page
+        page_length = min(len(page), self.limit)
+        if page_length:
+            self.cursor = self.encode_cursor(
+                digest, self.offset + page_length, ordering, page[page_length - 1]
+            )
+        return page
+
+    @staticmethod
+    def is_keyset_field(model, field_path: str):
+        """
+        Only non nullable concrete fields (optionally through non nullable
+        forward relations) can be compared consistently with the sort order
+        """
+        opts = model._meta
+        parts = field_path.split("__")
+        for index, part in enumerate(parts):
+            try:
+                field = opts.pk if part == "pk" else opts.get_field(part)
+            except FieldDoesNotExist:
+                return False
+            if getattr(field, "null", False):
+                return False
+            is_last = index == len(parts) - 1
+            if field.is_relation:
+                if is_last or not (field.many_to_one or field.one_to_one) or field.auto_created:
+                    return False
+                opts = field.related_model._meta
+            elif not is_last:
+                return False
+        return True
+
+    def get_keyset_ordering(self, queryset):
+        """
+        :return: (queryset, [(field_path, descending)]) with the primary key as the
+                 last tiebreaker, or (queryset, None) when the ordering can't be seeked
+        """
+        query = queryset.query
+        if query.group_by is not None or query.combinator:
+            return queryset, None
+        ordering = list(query.order_by)
+        if not ordering and query.default_ordering:
+            ordering = list(queryset.model._meta.ordering)
+        if any(not isinstance(field, str) or field == "?" for field in ordering):
+            return queryset, None
+
+        pk_name = queryset.model._meta.pk.name
+        result = []
+        for field in ordering:
+            field_path = field.lstrip("-")
+            if field_path == pk_name:
+                field_path = "pk"
+            if not self.is_keyset_field(queryset.model, field_path):
+                return queryset, None
+            result.append((field_path, field.startswith("-")))
+            if field_path == "pk":
+                break
+        if not result or result[-1][0] != "pk":
+            result.append(("pk", False))
+            queryset = queryset.order_by(
+                *[("-" if desc else "") + field_path for field_path, desc in result]
+            )
+        return queryset, result
+
+    @staticmethod
+    def get_keyset_digest(queryset, ordering):
+        """
+        Identify the filter and ordering a cursor was created for
+        """
+        content = repr((str(queryset.query.where), ordering))
+        return hashlib.md5(content.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def get_row_value(row, field_path: str):
+        if isinstance(row, dict):
+            return row.get(field_path)
+        value = row
+        for part in field_path.split("__"):
+            if value is None:
+                return None
+            value = getattr(value, part)
+        return value
+
+    def encode_cursor(self, digest, offset, ordering, row):
+        values = [self.get_row_value(row, field_path) for field_path, _ in ordering]
+        cursor = json.dumps({"d": digest, "o": offset, "v": values}, cls=CursorJSONEncoder)
+        return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+    def decode_cursor(self, cursor, digest):
+        """
+        :return: Values of the last row of the previous page, or None when the cursor
+                 doesn't point to the requested position
+        """
+        if not cursor:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(cursor, dict) or cursor.get("d") != digest or cursor.get("o") != self.offset:
+            return None
+        values = cursor.get("v")
+        if not isinstance(values, list) or None in values:
+            return None
+        return values
+
+    @staticmethod
+    def get_seek_q(ordering, values):
+        """
+        (a, b, pk) > (va, vb, vpk) expanded as
+        a >= va AND (a > va OR (a = va AND b > vb) OR (a = va AND b = vb AND pk > vpk))
+        The leading range on the first field lets the database seek an index on it
+        """
+        clauses = []
+        for index, (field_path, desc) in enumerate(ordering):
+            lookups = {
+                prev_path: prev_value
+                for (prev_path, _), prev_value in zip(ordering[:index], values[:index])
+            }
+            lookups[field_path + ("__lt" if desc else "__gt")] = values[index]
+            clauses.append(Q(**lookups))
+        if len(clauses) == 1:
+            return clauses[0]
+        field_path, desc = ordering[0]
+        return Q(**{field_path + ("__lte" if desc else "__gte"): values[0]}) & Q(
+            *clauses, _connector=Q.OR
+        )
 
     def get_paginated_response(self, data):
-        return Response(OrderedDict([
+        response = OrderedDict([
             ('totalCount', self.count),
             ('data', data)
-        ]))
+        ])
+        if self.count_is_estimate:
+            response['totalCountApproximate'] = True
+        if self.cursor is not None:
+            response['cursor'] = self.cursor
+        return Response(response)
@@ -0,0 +1,232 @@
+from collections import namedtuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+
+# Serializer field read from the rows of a values() queryset, null_path is the
+# nullable relation the source traverses (None when there is none)
+ValuesColumn = namedtuple("ValuesColumn", ["field_name", "path", "field", "null_path"])
+
+
+def get_source_model_fields(model, source_attrs: list):
+    """
+    Model fields traversed by the source of a serializer field
+    :return: List of model fields, or None when some attribute is not a model field
+             (properties, methods...) or a to-many relation is traversed
+    """
+    opts = model._meta
+    model_fields = []
+    for index, attr in enumerate(source_attrs):
+        try:
+            model_field = opts.pk if attr == "pk" else opts.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if model_field.is_relation and (
+            model_field.auto_created or model_field.related_model is None
+        ):
+            # Reverse relations and generic foreign keys can't be deferred
+            if index == len(source_attrs) - 1 and (model_field.one_to_many or model_field.many_to_many):
+                return model_fields + [model_field]
+            return None
+        model_fields.append(model_field)
+        if index == len(source_attrs) - 1:
+            break
+        if not model_field.is_relation or model_field.many_to_many:
+            return None
+        opts = model_field.related_model._meta
+    return model_fields
+
+
+def is_to_many_path(model, path: str):
+    """
+    Whether a query path traverses a to-many relation (many to many or reverse
+    foreign key), its join repeats the rows of the model
+    """
+    opts = model._meta
+    for attr in path.split("__"):
+        try:
+            model_field = opts.pk if attr == "pk" else opts.get_field(attr)
+        except FieldDoesNotExist:  # A transform or a lookup
+            return False
+        if not model_field.is_relation or model_field.related_model is None:
+            return False
+        if model_field.many_to_many or model_field.one_to_many:
+            return True
+        opts = model_field.related_model._meta
+    return False
+
+
+def get_model_field(model, path: str, relations: bool = False):
+    """
+    :param relations: Whether the last field can be a relation (its column)
+    :return: (model, field) of the last field of a query path, None when the path
+             is not a chain of model fields
+    """
+    names = path.split("__")
+    for index, name in enumerate(names):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if index < len(names) - 1:
+            if field.related_model is None:
+                return None
+            model = field.related_model
+    if field.is_relation and not (relations and field.concrete):
+        return None
+    return model, field
+
+
+def get_related_lookups(model, fields, prefix: str = "", in_prefetch: bool = False):
+    """
+    Relations the serializer fields traverse
+    :param fields: Serializer fields
+    :return: (select_related lookups, prefetch_related lookups)
+    """
+    select_related = set()
+    prefetch_related = set()
+    for field in fields:
+        source_attrs = getattr(field, "source_attrs", None)
+        if isinstance(field, serializers.SerializerMethodField) or not source_attrs:
+            continue
+        opts = model._meta
+        path = []
+        for index, attr in enumerate(source_attrs):
+            try:
+                model_field = opts.get_field(attr)
+            except FieldDoesNotExist:
+                break
+            if not model_field.is_relation or model_field.related_model is None:
+                break
+            is_last = index == len(source_attrs) - 1
+            if (
+                is_last
+                and isinstance(field, serializers.RelatedField)
+                and field.use_pk_only_optimization()
+            ):
+                # The value of the foreign key column is enough
+                break
+            path.append(attr)
+            lookup = prefix + "__".join(path)
+            is_many = model_field.many_to_many or model_field.one_to_many
+            if in_prefetch or is_many:
+                prefetch_related.add(lookup)
+            else:
+                select_related.add(lookup)
+            if is_last:
+                nested = field.child if isinstance(field, serializers.ListSerializer) else field
+                if isinstance(nested, serializers.Serializer):
+                    nested_select, nested_prefetch = get_related_lookups(
+                        model_field.related_model,
+                        nested.fields.values(),
+                        lookup + "__",
+                        in_prefetch or is_many,
+                    )
+                    select_related |= nested_select
+                    prefetch_related |= nested_prefetch
+            if is_many:
+                break
+            opts = model_field.related_model._meta
+    return select_related, prefetch_related
+
+
+def get_only_fields(model, fields, extra_paths=()):
+    """
+    Model fields to load for the serializer fields with QuerySet.only()
+    :param extra_paths: Other query paths that must be loaded (ordering...)
+    :return: (only() field paths, select_related lookups the paths need), or
+             (None, None) when some field doesn't map to model fields
+    """
+    only_fields = {model._meta.pk.name}
+    select_related = set()
+    paths = [
+        getattr(field, "source_attrs", None)
+        if not isinstance(field, serializers.SerializerMethodField)
+        else None
+        for field in fields
+    ]
+    paths += [path.split("__") for path in extra_paths]
+    for source_attrs in paths:
+        if not source_attrs:
+            return None, None
+        model_fields = get_source_model_fields(model, source_attrs)
+        if model_fields is None:
+            return None, None
+        if model_fields[-1].many_to_many or model_fields[-1].one_to_many:
+            # Loaded with prefetch_related, they only need the primary key
+            continue
+        only_fields.add("__".join(source_attrs))
+        for index in range(1, len(source_attrs)):
+            select_related.add("__".join(source_attrs[:index]))
+    return sorted(only_fields), select_related
+
+
+def is_values_field(model, field, annotations=()):
+    """
+    Whether QuerySet.values() returns the value the serializer field reads from
+    the model instance
+    :param annotations: Names of the annotations of the queryset
+    """
+    if (
+        isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField))
+        or isinstance(field, (serializers.ManyRelatedField, serializers.FileField))
+        or field.source == "*"
+    ):
+        return False
+    source_attrs = field.source_attrs
+    if len(source_attrs) == 1 and source_attrs[0] in annotations:
+        return True
+    model_fields = get_source_model_fields(model, source_attrs)
+    if model_fields is None:
+        return False
+    model_field = model_fields[-1]
+    if isinstance(field, serializers.RelatedField):
+        # Only the primary key of a forward relation is in the row
+        return (
+            isinstance(field, serializers.PrimaryKeyRelatedField)
+            and field.pk_field is None
+            and model_field.is_relation
+            and (model_field.many_to_one or model_field.one_to_one)
+            and not model_field.auto_created
+        )
+    return not model_field.is_relation and not isinstance(model_field, models.FileField)
+
+
+def get_null_relation_path(model, source_attrs: list):
+    """
+    Last nullable relation traversed by the source, its value is None in the
+    row when the serializer field can't follow the relation
+    :return: Query path of the relation, or None
+    """
+    model_fields = get_source_model_fields(model, source_attrs) or []
+    null_path = None
+    for index, model_field in enumerate(model_fields[:-1]):
+        if model_field.null:
+            null_path = "__".join(source_attrs[: index + 1])
+    return null_path
+
+
+def get_lookup_models(model, lookups):
+    """
+    Models read through select_related/prefetch_related lookups, with the through
+    models of the many to many relations
+    """
+    models_set = set()
+    for lookup in lookups:
+        opts = model._meta
+        for attr in lookup.split("__"):
+            try:
+                model_field = opts.get_field(attr)
+            except FieldDoesNotExist:
+                break
+            if model_field.related_model is None:
+                break
+            models_set.add(model_field.related_model)
+            if model_field.many_to_many:
+                through = getattr(model_field.remote_field, "through", None)
+                if through is None:  # Reverse many to many relation
+                    through = model_field.through
+                models_set.add(through)
+            opts = model_field.related_model._meta
+    return models_set
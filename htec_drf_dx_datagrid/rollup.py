@@ -0,0 +1,214 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db import router, transaction
+from django.db.models import Count, Max, Min, Sum
+from rest_framework import serializers
+
+from .cache import ModelVersion, ResponseCache
+from .mixins import DxMixin
+
+# Aggregate of the source rows of each summary type and the aggregate that merges
+# the rollup rows of a group
+ROLLUP_AGGREGATES = {
+    "count": (Count, Sum),
+    "sum": (Sum, Sum),
+    "min": (Min, Min),
+    "max": (Max, Max),
+}
+
+_rollups = []
+
+
+def get_rollups():
+    """
+    Rollups declared by the viewsets imported so far
+    """
+    return list(_rollups)
+
+
+def get_filter_selectors(dx_filter):
+    """
+    Selectors of the nodes of a DevExtreme filter
+    :return: Set of selectors, {None} when the filter is malformed
+    """
+    if not dx_filter:
+        return set()
+    if not isinstance(dx_filter, list):
+        return {None}
+    if isinstance(dx_filter[0], str) and dx_filter[0] != "!":
+        return {dx_filter[0]}
+    selectors = set()
+    for elem in dx_filter:
+        if isinstance(elem, list):
+            selectors |= get_filter_selectors(elem)
+    return selectors
+
+
+class Rollup(DxMixin):
+    """
+    Group counts and group summaries of the queryset of a viewset materialized in a
+    model. The model has a field per group selector, named as the selector, the
+    count field and a field per summary, named "<selector>_<summaryType>".
+    Group loads over the rollup selectors (and filters over them) are answered from
+    the model, it is filled with refresh()
+    """
+
+    def __init__(self, model, group: list, summary: list = (), count_field: str = "row_count"):
+        """
+        :param model: Rollup model
+        :param group: Selectors of the groups it answers
+        :param summary: List of (selector, summaryType) of the group summaries it
+                        answers, summaryType is count, sum, min or max
+        :param count_field: Field of the model with the row count of the group
+        """
+        self.model = model
+        self.group = list(group)
+        self.summary = [tuple(item) for item in summary]
+        for selector, summary_type in self.summary:
+            if summary_type not in ROLLUP_AGGREGATES:
+                raise ImproperlyConfigured(
+                    f"Rollups can't merge the summary type '{summary_type}' of '{selector}'"
+                )
+        self.count_field = count_field
+        self.view_class = None
+        self._filter_serializer = None
+
+    def __str__(self):
+        view_name = self.view_class.__name__ if self.view_class else None
+        return "%s (%s)" % (self.model._meta.label, view_name)
+
+    def contribute_to_view(self, view_class):
+        self.view_class = view_class
+        if self not in _rollups:
+            _rollups.append(self)
+
+    @staticmethod
+    def get_summary_field(selector: str, summary_type: str):
+        return "%s_%s" % (selector, summary_type)
+
+    def can_answer(self, request):
+        """
+        Whether the group load of the request only reads the dimensions and the
+        summaries of the rollup
+        """
+        load_options = self.get_load_options(request)
+        known_params = set(ResponseCache.LOAD_OPTIONS)
+        known_params |= {name + "[]" for name in known_params}
+        known_params.update(["loads", "format"])  # The loads of a batch, the renderer
+        if any(name not in known_params for name in request.GET):
+            # Other filter backends could read them
+            return False
+        for group in load_options.group:
+            if group["selector"] not in self.group or "groupInterval" in group:
+                return False
+        for summary in load_options.group_summary:
+            if (summary["selector"], summary["summaryType"]) not in self.summary:
+                return False
+        return get_filter_selectors(load_options.filter) <= set(self.group)
+
+    def get_filter_serializer(self):
+        """
+        Serializer over the group fields of the rollup model, the filters of the
+        load are resolved with it
+        """
+        if self._filter_serializer is None:
+            meta = type("Meta", (), {"model": self.model, "fields": self.group})
+            serializer_class = type(
+                self.model.__name__ + "Serializer", (serializers.ModelSerializer,), {"Meta": meta}
+            )
+            self._filter_serializer = serializer_class()
+        return self._filter_serializer
+
+    def get_queryset(self, q_expr=None):
+        queryset = self.model._default_manager.all()
+        if q_expr is not None:
+            queryset = queryset.filter(q_expr)
+        return queryset
+
+    def get_group_queryset(self, queryset, groups: list, group_summary: list):
+        """
+        Rows of the group query of the load, with the same fields as the live query
+        (selectors, count and gs__<index> summaries)
+        """
+        annotations = {"count": Sum(self.count_field)}
+        for index, summary in enumerate(group_summary):
+            merge = ROLLUP_AGGREGATES[summary["summaryType"]][1]
+            annotations["gs__" + str(index)] = merge(
+                self.get_summary_field(summary["selector"], summary["summaryType"])
+            )
+        selectors = list(dict.fromkeys(group["selector"] for group in groups))
+        ordering = [("-" if group.get("desc") else "") + group["selector"] for group in groups]
+        return (
+            queryset.values(*selectors)
+            .annotate(**annotations)
+            .order_by(*dict.fromkeys(ordering))
+        )
+
+    def get_total_count(self, queryset):
+        return queryset.aggregate(total=Sum(self.count_field))["total"] or 0
+
+    def get_source_rows(self):
+        """
+        Groups of the queryset of the viewset, computed with the live query
+        :return: Iterator of dicts with the values of the rollup fields
+        """
+        view = self.view_class(request=None, format_kwarg=None, args=(), kwargs={})
+        serializer = view.get_serializer()
+        paths = {
+            selector: view.get_field_name_from_source(serializer, selector) for selector in self.group
+        }
+        aggregates = {"_dx_count": Count("pk")}
+        for index, (selector, summary_type) in enumerate(self.summary):
+            aggregate = ROLLUP_AGGREGATES[summary_type][0]
+            aggregates["_dx_summary_%d" % index] = aggregate(
+                view.get_field_name_from_source(serializer, selector)
+            )
+        queryset = view.get_queryset().values(*dict.fromkeys(paths.values()))
+        for row in queryset.annotate(**aggregates).order_by().iterator():
+            values = {selector: row[path] for selector, path in paths.items()}
+            values[self.count_field] = row["_dx_count"]
+            for index, (selector, summary_type) in enumerate(self.summary):
+                values[self.get_summary_field(selector, summary_type)] = row["_dx_summary_%d" % index]
+            yield values
+
+    def refresh(self, batch_size: int = 500):
+        """
+        Compute the groups of the source rows and write the differences with the
+        rollup model: new groups are created, changed groups updated and groups
+        without rows deleted
+        :return: (created, updated, deleted) number of rollup rows
+        """
+        value_fields = [self.count_field] + [
+            self.get_summary_field(selector, summary_type) for selector, summary_type in self.summary
+        ]
+        manager = self.model._default_manager
+        existing = {
+            tuple(getattr(instance, selector) for selector in self.group): instance
+            for instance in manager.all()
+        }
+        to_create = []
+        to_update = []
+        for values in self.get_source_rows():
+            instance = existing.pop(tuple(values[selector] for selector in self.group), None)
+            if instance is None:
+                to_create.append(self.model(**values))
+            elif any(getattr(instance, field) != values[field] for field in value_fields):
+                for field in value_fields:
+                    setattr(instance, field, values[field])
+                to_update.append(instance)
+        to_delete = [instance.pk for instance in existing.values()]
+
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            manager.bulk_create(to_create, batch_size=batch_size)
+            manager.bulk_update(to_update, value_fields, batch_size=batch_size)
+            for start in range(0, len(to_delete), batch_size):
+                manager.filter(pk__in=to_delete[start:start + batch_size]).delete()
+
+        if to_create or to_update or to_delete:
+            # The bulk operations don't send the signals that invalidate the caches
+            cache_aliases = {
+                self.get_setting("COUNT_CACHE_ALIAS"),
+                self.get_setting("RESPONSE_CACHE_ALIAS"),
+            }
+            for cache_alias in cache_aliases:
+                ModelVersion(cache_alias).increment(self.model)
+        return len(to_create), len(to_update), len(to_delete)
@@ -0,0 +1,351 @@
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.db.backends.utils import truncate_name
+from django.db.models import IntegerField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework import fields
+
+from .mixins import DxMixin
+from .projection import get_model_field
+
+_search_views = []
+# Columns of the search indexes: {(database alias, table): (checked at, list of columns)}
+_index_columns = {}
+_index_columns_lock = threading.Lock()
+
+
+def register_search_view(view_class):
+    if view_class not in _search_views:
+        _search_views.append(view_class)
+
+
+def get_search_views():
+    """
+    Viewsets with search_index = True imported so far
+    """
+    return list(_search_views)
+
+
+def clear_index_columns():
+    with _index_columns_lock:
+        _index_columns.clear()
+
+
+def get_search_paths(view):
+    """
+    Query paths of the string fields of the serializer of a viewset
+    """
+    serializer = view.get_serializer()
+    model = view.get_queryset().model
+    paths = []
+    for field in serializer.fields.values():
+        if not isinstance(field, fields.CharField) or field.write_only or field.source == "*":
+            continue
+        path = view.get_field_name_from_source(serializer, field)
+        if get_model_field(model, path) is not None and path not in paths:
+            paths.append(path)
+    return paths
+
+
+def get_search_backend(using: str):
+    """
+    Search backend of the database vendor, None when it has none
+    """
+    backend_class = SEARCH_BACKENDS.get(connections[using].vendor)
+    return None if backend_class is None else backend_class(using)
+
+
+class SearchBackend(DxMixin, metaclass=ABCMeta):
+    """
+    Indexed search of the "contains" conditions that the search panel sends
+    over several columns. Subclasses build the index (build_index) and may answer
+    the searches with it (get_search_q), the searches never write to the database
+    """
+
+    def __init__(self, using: str):
+        self.using = using
+        self.connection = connections[using]
+
+    def get_search_q(self, model, paths: tuple, value: str, like_q):
+        """
+        :param like_q: Query of the LIKE conditions of the search
+        :return: Query answered by the index, None to use like_q
+        """
+        return None
+
+    @abstractmethod
+    def build_index(self, model, paths: list, batch_size: int = 1000):
+        """
+        Create or rebuild the index of the paths of the model
+        :return: Description of the index
+        """
+
+    def refresh_index(self, model, batch_size: int = 500):
+        """
+        Maintenance of the index between builds, the database keeps it up to date by default
+        :return: Description of the refresh
+        """
+        return "up to date"
+
+
+class Fts5SearchBackend(SearchBackend):
+    """
+    SQLite FTS5 table with the trigram tokenizer (SQLite >= 3.34), a column per
+    path and the primary key of the model as rowid. The values of the paths can
+    come from other tables, so the table is a copy kept in sync by triggers: a write
+    to any table the paths read queues the primary keys of the rows it changes. The
+    searches read the queued rows along with the rows found by the index, so they
+    see every change without writing, and refresh_index (build_dx_search_index
+    --refresh) indexes the queued rows again to keep the queue short
+    """
+
+    TABLE_PREFIX = "dx_search_"
+    MIN_LENGTH = 3  # Length of a trigram
+
+    def get_table_name(self, model):
+        return truncate_name(self.TABLE_PREFIX + model._meta.db_table, self.connection.ops.max_name_length())
+
+    def get_queue_table_name(self, model):
+        return truncate_name(
+            self.TABLE_PREFIX + model._meta.db_table + "_queue", self.connection.ops.max_name_length()
+        )
+
+    def get_index_columns(self, model):
+        """
+        Columns of the index of the model, read again after SEARCH_INDEX_CHECK_INTERVAL
+        seconds so an index built by another process is found
+        :return: List of paths, empty when there is no index (or it was built without
+                 the queue of its triggers)
+        """
+        table = self.get_table_name(model)
+        key = (self.using, table)
+        interval = self.get_setting("SEARCH_INDEX_CHECK_INTERVAL", 60)
+        with _index_columns_lock:
+            checked = _index_columns.get(key)
+        if checked is not None and time.monotonic() - checked[0] < interval:
+            return checked[1]
+        columns = []
+        with self.connection.cursor() as cursor:
+            table_names = self.connection.introspection.table_names(cursor)
+            if table in table_names and self.get_queue_table_name(model) in table_names:
+                cursor.execute("PRAGMA table_info(%s)" % self.connection.ops.quote_name(table))
+                columns = [row[1] for row in cursor.fetchall()]
+        with _index_columns_lock:
+            _index_columns[key] = (time.monotonic(), columns)
+        return columns
+
+    @staticmethod
+    def get_match_expression(paths, value: str):
+        """
+        FTS5 query of a phrase in some columns: {path path} : "value"
+        """
+        return "{%s} : \"%s\"" % (" ".join(paths), value.replace('"', '""'))
+
+    def get_search_q(self, model, paths: tuple, value: str, like_q):
+        if len(value) < self.MIN_LENGTH:
+            return None
+        if not set(paths) <= set(self.get_index_columns(model)):
+            return None
+        quote_name = self.connection.ops.quote_name
+        table = quote_name(self.get_table_name(model))
+        candidates = RawSQL(
+            "SELECT rowid FROM %s WHERE %s MATCH %%s UNION ALL SELECT pk FROM %s"
+            % (table, table, quote_name(self.get_queue_table_name(model))),
+            [self.get_match_expression(paths, value)],
+        )
+        # The LIKE conditions only run over the rows found by the index and the rows
+        # changed since they were indexed, they keep the exact matching of the lookups
+        return Q(pk__in=candidates) & like_q
+
+    def get_rows(self, model, paths: list, pks=None):
+        """
+        :param pks: Primary keys of the rows, all the rows by default
+        :return: Iterator of (pk, values of the paths), the values of a to many
+                 relation are joined by new lines
+        """
+        pk = None
+        values = None
+        queryset = model._default_manager.using(self.using).order_by("pk")
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        for row in queryset.values_list("pk", *paths).iterator():
+            if row[0] != pk:
+                if values is not None:
+                    yield pk, ["\n".join(value) for value in values]
+                pk = row[0]
+                values = [[] for _ in paths]
+            for index, value in enumerate(row[1:]):
+                if value is not None and str(value) not in values[index]:
+                    values[index].append(str(value))
+        if values is not None:
+            yield pk, ["\n".join(value) for value in values]
+
+    def get_insert_sql(self, model, paths: list):
+        quote_name = self.connection.ops.quote_name
+        return "INSERT INTO %s (rowid, %s) VALUES (%s)" % (
+            quote_name(self.get_table_name(model)),
+            ", ".join(quote_name(path) for path in paths),
+            ", ".join(["%s"] * (len(paths) + 1)),
+        )
+
+    def get_changed_pks_queries(self, model, paths: list):
+        """
+        Queries of the primary keys of the model whose indexed values a row of each
+        table the paths read changes
+        :return: List of (table, column of the row, SQL with a %s placeholder for the
+                 value of the column, None when the value is the primary key itself)
+        """
+        manager = model._base_manager.using(self.using)
+
+        def get_sql(lookup):
+            sql, params = manager.filter(**{lookup: 0}).values("pk").query.sql_with_params()
+            return sql
+
+        queries = [(model._meta.db_table, model._meta.pk.column, None)]
+        for path in paths:
+            field_model = model
+            prefix = []
+            for name in path.split("__")[:-1]:
+                field = field_model._meta.get_field(name)
+                related_model = field.related_model
+                owner_lookup = "__".join(prefix + ["pk"])
+                if field.many_to_many:
+                    # The links are rows of the through model
+                    if field.auto_created:  # Reverse many to many relation
+                        through = field.through
+                        column = field.field.m2m_reverse_name()
+                    else:
+                        through = field.remote_field.through
+                        column = field.m2m_column_name()
+                    queries.append((through._meta.db_table, column, get_sql(owner_lookup)))
+                elif field.auto_created:  # Reverse foreign key, the related rows point to the owner
+                    queries.append((related_model._meta.db_table, field.field.column, get_sql(owner_lookup)))
+                prefix.append(name)
+                queries.append(
+                    (related_model._meta.db_table, related_model._meta.pk.column, get_sql("__".join(prefix + ["pk"])))
+                )
+                field_model = related_model
+        return list(dict.fromkeys(queries))
+
+    def create_triggers(self, cursor, model, paths: list):
+        """
+        Triggers that queue the primary keys of the rows changed by the writes to the
+        tables the paths read, the previous triggers of the index are dropped
+        """
+        quote_name = self.connection.ops.quote_name
+        prefix = self.get_table_name(model) + "_t"
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        for (name,) in cursor.fetchall():
+            if name.startswith(prefix):
+                cursor.execute("DROP TRIGGER %s" % quote_name(name))
+        queue = quote_name(self.get_queue_table_name(model))
+        for index, (table, column, sql) in enumerate(self.get_changed_pks_queries(model, paths)):
+            for event, rows in (("INSERT", ["NEW"]), ("UPDATE", ["OLD", "NEW"]), ("DELETE", ["OLD"])):
+                statements = []
+                for row in rows:
+                    value = "%s.%s" % (row, quote_name(column))
+                    select = "SELECT %s" % value if sql is None else sql % value
+                    statements.append("INSERT OR IGNORE INTO %s (pk) %s;" % (queue, select))
+                cursor.execute(
+                    "CREATE TRIGGER %s AFTER %s ON %s BEGIN %s END"
+                    % (
+                        quote_name("%s%d_%s" % (prefix, index, event.lower())),
+                        event,
+                        quote_name(table),
+                        " ".join(statements),
+                    )
+                )
+
+    def refresh_index(self, model, batch_size: int = 500):
+        """
+        Index again the rows queued by the triggers since the last refresh
+        """
+        paths = self.get_index_columns(model)
+        if not paths:
+            return "no index"
+        quote_name = self.connection.ops.quote_name
+        table = quote_name(self.get_table_name(model))
+        queue = quote_name(self.get_queue_table_name(model))
+        with transaction.atomic(using=self.using), self.connection.cursor() as cursor:
+            # The first write locks the database, no row is queued until the commit
+            cursor.execute("DELETE FROM %s WHERE rowid IN (SELECT pk FROM %s)" % (table, queue))
+            cursor.execute("SELECT pk FROM %s" % queue)
+            pks = [row[0] for row in cursor.fetchall()]
+            insert = self.get_insert_sql(model, paths)
+            for start in range(0, len(pks), batch_size):
+                rows = self.get_rows(model, paths, pks[start:start + batch_size])
+                cursor.executemany(insert, [[pk] + values for pk, values in rows])
+            cursor.execute("DELETE FROM %s" % queue)
+        return "%s: %d rows" % (self.get_table_name(model), len(pks))
+
+    def build_index(self, model, paths: list, batch_size: int = 1000):
+        if not isinstance(model._meta.pk, IntegerField):
+            raise ImproperlyConfigured(
+                "The FTS5 index of %s needs an integer primary key" % model._meta.label
+            )
+        quote_name = self.connection.ops.quote_name
+        table = quote_name(self.get_table_name(model))
+        queue = quote_name(self.get_queue_table_name(model))
+        columns = ", ".join(quote_name(path) for path in paths)
+        insert = self.get_insert_sql(model, paths)
+        rows = 0
+        # Readers keep using the previous table until the new one is complete
+        with transaction.atomic(using=self.using), self.connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS %s" % table)
+            cursor.execute("CREATE VIRTUAL TABLE %s USING fts5(%s, tokenize = 'trigram')" % (table, columns))
+            cursor.execute("CREATE TABLE IF NOT EXISTS %s (pk INTEGER PRIMARY KEY)" % queue)
+            cursor.execute("DELETE FROM %s" % queue)
+            self.create_triggers(cursor, model, paths)
+            batch = []
+            for pk, values in self.get_rows(model, paths):
+                batch.append([pk] + values)
+                if len(batch) >= batch_size:
+                    cursor.executemany(insert, batch)
+                    rows += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(insert, batch)
+                rows += len(batch)
+        clear_index_columns()
+        return "%s: %d rows" % (self.get_table_name(model), rows)
+
+
+class TrigramSearchBackend(SearchBackend):
+    """
+    PostgreSQL pg_trgm GIN indexes over the columns of the paths. The planner uses
+    them for the LIKE conditions themselves, so the query is not changed
+    """
+
+    def get_index_name(self, table: str, column: str):
+        return truncate_name("%s_%s_dx_trgm" % (table, column), self.connection.ops.max_name_length())
+
+    def build_index(self, model, paths: list, batch_size: int = 1000):
+        quote_name = self.connection.ops.quote_name
+        # icontains compares UPPER(column::text)
+        is_case_sensitive = self.get_setting("FILTER_CASE_SENSITIVE", True)
+        names = []
+        with self.connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for path in paths:
+                field_model, field = get_model_field(model, path)
+                table = field_model._meta.db_table
+                column = quote_name(field.column)
+                expression = column if is_case_sensitive else "UPPER(%s::text)" % column
+                name = self.get_index_name(table, field.column)
+                # CONCURRENTLY doesn't lock the writes of the table
+                cursor.execute(
+                    "CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON %s USING gin (%s gin_trgm_ops)"
+                    % (quote_name(name), quote_name(table), expression)
+                )
+                names.append(name)
+        return ", ".join(names)
+
+
+SEARCH_BACKENDS = {
+    "sqlite": Fts5SearchBackend,
+    "postgresql": TrigramSearchBackend,
+}
@@ -3,10 +3,20 @@ from django.db.models import Count, Avg, Max, Min, Sum, QuerySet
 from rest_framework.exceptions import ValidationError
 
 from htec_drf_dx_datagrid.mixins import DxMixin
+from htec_drf_dx_datagrid.projection import is_to_many_path
 
 
 class SummaryMixin(DxMixin):
 
+    def get_field_serializer(self):
+        """
+        Serializer used to resolve the fields of the load options.
+        It is built once per request
+        """
+        if getattr(self, "_field_serializer", None) is None:
+            self._field_serializer = self.get_serializer()
+        return self._field_serializer
+
     @staticmethod
     def get_aggregate_function(function_name: str, field_name: str):
         if function_name == "count":
@@ -24,36 +34,55 @@ class SummaryMixin(DxMixin):
 
     def calc_total_summary(self, queryset: QuerySet, summary_list: list):
         """
-        Calculate summary
-        :return: List with summaries
+        Calculate all the total summaries with a single aggregate query.
+        Repeated selector/summaryType pairs are only aggregated once, the summaries
+        over a to-many relation get their own query because their join repeats the
+        rows the other summaries read.
+        :return: List with summaries, in the same order as summary_list
         """
-        result = []
+        serializer = self.get_field_serializer()
+        aggregates = {}
+        to_many_aliases = set()
+        aliases = []
         for summary in summary_list:
-            if not queryset.exists():
-                result.append(0)
-                continue
-            field_name = self.get_field_name_from_source(
-                self.get_serializer(), summary["selector"]
-            )
-            aggr_function = self.get_aggregate_function(
-                summary["summaryType"], field_name
-            )
-            if aggr_function is None:
-                result.append(None)
-            else:
-                summary_qset = queryset.aggregate(aggr_function)
-                result.append(list(summary_qset.values())[0])
-        return result
+            key = (summary["selector"], summary["summaryType"])
+            if key not in aggregates:
+                field_name = self.get_field_name_from_source(
+                    serializer, summary["selector"]
+                )
+                aggregates[key] = (
+                    "ts__" + str(len(aggregates)),
+                    self.get_aggregate_function(summary["summaryType"], field_name),
+                )
+                if is_to_many_path(queryset.model, field_name):
+                    to_many_aliases.add(aggregates[key][0])
+            aliases.append(aggregates[key][0])
+        if not aggregates:
+            return []
+
+        # The row count replaces the exists() query: an empty queryset
+        # returns 0 for every summary
+        summary_values = queryset.aggregate(
+            ts__count=Count("pk"),
+            **{alias: aggr for alias, aggr in aggregates.values() if alias not in to_many_aliases},
+        )
+        if not summary_values["ts__count"]:
+            return [0] * len(aliases)
+        for alias, aggr_function in aggregates.values():
+            if alias in to_many_aliases:
+                summary_values.update(queryset.aggregate(**{alias: aggr_function}))
+        return [summary_values[alias] for alias in aliases]
 
     def add_summary_annotate(self, queryset: QuerySet, summary_list: list):
         """
         Add summary to queryset
         :return: QuerySet
         """
+        serializer = self.get_field_serializer()
         summary_param_dict = {}
         for summary in summary_list:
             field_name = self.get_field_name_from_source(
-                self.get_serializer(), summary["selector"]
+                serializer, summary["selector"]
             )
             aggr_function = self.get_aggregate_function(
                 summary["summaryType"], field_name
@@ -1,78 +1,360 @@
 import logging
 from collections import OrderedDict
+from functools import partial
+from itertools import islice
 
 import rest_framework.viewsets
+from django.db import connections
 from django.db.models import Count
+from django.http import StreamingHttpResponse
+from django.utils.http import parse_etags
 from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import empty
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 
+from .budget import QueryBudget, QueryBudgetExceeded, count_rejection, query_rejected
+from .cache import CountCache, DeltaCache, ResponseCache
+from .estimate import get_count_estimator
+from .executor import ThreadExecutor
+from .export import EXPORT_FORMATS, iter_csv, iter_ndjson
+from .grouping import GroupTreeBuilder, get_date_truncs, iter_date_part_rows
+from .instrumentation import Instrumentation, load_instrumented, logger, null_phase
+from .metadata import get_field_type, get_grid_metadata
 from .filters import DxFilterBackend
+from .mixins import LoadOptions
 from .pagination import TakeSkipPagination
+from .renderers import DxCompactJSONRenderer
+from .search import register_search_view
+from .projection import (
+    ValuesColumn,
+    get_lookup_models,
+    get_null_relation_path,
+    get_only_fields,
+    get_related_lookups,
+    is_to_many_path,
+    is_values_field,
+)
 from .summary import SummaryMixin
 
 
-def format_items(lvl_dict, lvl_items):
-    if lvl_dict is None:
-        return
-    for key in lvl_dict:
-        key_dict = lvl_dict[key]
-        item = {"key": key}
-        lvl_items.append(item)
-
-        if "count" in key_dict:
-            item["count"] = key_dict["count"]
-        if "summary" in key_dict:
-            item["summary"] = key_dict["summary"]
-
-        if key_dict["items"] is None:
-            item["items"] = None
-        else:
-            item["items"] = []
-            format_items(key_dict["items"], item["items"])
-
-
 class DxListModelMixin(rest_framework.mixins.ListModelMixin, SummaryMixin):
     pagination_class = TakeSkipPagination
     filter_backends = [
         DxFilterBackend,
         *rest_framework.viewsets.ModelViewSet.filter_backends,
     ]
+    count_cache_class = CountCache
+    response_cache_class = ResponseCache
+    delta_cache_class = DeltaCache
+    group_tree_builder_class = GroupTreeBuilder
+    instrumentation_class = Instrumentation
+    query_budget_class = QueryBudget
+    # Instrumentation of the load being answered, None when it is disabled
+    instrumentation = None
+    # Add the select_related/prefetch_related the serializer fields need
+    auto_related = True
+    # Opt-in for read-only grids: read the flat fields of the rows of the flat loads
+    # with values() instead of serializing model instances, only the other fields
+    # (method fields, nested serializers...) are serialized from the instances
+    use_values = False
+    # ?export=ndjson|csv streams all the filtered rows instead of a page
+    export_query_param = "export"
+    # Rollup instances that answer the group loads over their dimensions
+    rollups = ()
+    # Renderer added to the renderers of the view for ?format=dxcompact, None disables it
+    compact_renderer_class = DxCompactJSONRenderer
+    # The string fields of the serializer are indexed by the build_dx_search_index command
+    search_index = False
+    # Model field changed by every update of a row (auto_now datetime, sequence...).
+    # The flat loads return a version token, a load that sends it back with
+    # delta_query_param only returns the rows of the page changed since then
+    delta_field = None
+    delta_query_param = "since"
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for rollup in cls.__dict__.get("rollups", ()):
+            rollup.contribute_to_view(cls)
+        if cls.search_index:
+            register_search_view(cls)
+
+    def get_count_cache(self):
+        """
+        Count cache enabled with the COUNT_CACHE_TIMEOUT setting (seconds)
+        :return: count_cache_class instance or None
+        """
+        timeout = self.get_setting("COUNT_CACHE_TIMEOUT")
+        if not timeout or self.count_cache_class is None:
+            return None
+        return self.count_cache_class(
+            timeout=timeout, cache_alias=self.get_setting("COUNT_CACHE_ALIAS")
+        )
+
+    def get_exact_count_cache(self):
+        """
+        Cache of the exact counts read by the count queries (isCountQuery), so the
+        loads with an estimated count use them: the count cache, or one kept
+        EXACT_COUNT_CACHE_TIMEOUT seconds when the count cache is disabled
+        :return: count_cache_class instance or None
+        """
+        count_cache = self.get_count_cache()
+        if count_cache is None and self.count_cache_class is not None:
+            count_cache = self.count_cache_class(
+                timeout=self.get_setting("EXACT_COUNT_CACHE_TIMEOUT", 300),
+                cache_alias=self.get_setting("COUNT_CACHE_ALIAS"),
+            )
+        return count_cache
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        compact_renderer_class = self.compact_renderer_class
+        if compact_renderer_class is not None and not any(
+            isinstance(renderer, compact_renderer_class) for renderer in renderers
+        ):
+            renderers.append(compact_renderer_class())
+        return renderers
+
+    def get_query_budget(self):
+        """
+        Query budget enabled with the QUERY_BUDGET setting, a dict with the limits
+        :return: query_budget_class instance or None
+        """
+        limits = self.get_setting("QUERY_BUDGET")
+        if not limits or self.query_budget_class is None:
+            return None
+        return self.query_budget_class(limits)
+
+    def check_query_budget(self, request, queryset=None, export: bool = False):
+        """
+        Reject the load before its queries run when the load options exceed the
+        query budget, or with the filtered queryset, when the database estimates
+        more rows than the budget allows
+        :param export: Whether the load is an export, limited by check_export_budget
+        :raise QueryBudgetExceeded: ValidationError with the reason of the rejection
+        """
+        query_budget = self.get_query_budget()
+        if query_budget is None:
+            return
+        try:
+            if queryset is None:
+                query_budget.check_load_options(self.get_load_options(request), export)
+            else:
+                query_budget.check_queryset(queryset)
+        except QueryBudgetExceeded as exc:
+            self.report_query_rejection(request, exc)
+            raise
+
+    def check_export_budget(self, request, queryset):
+        """
+        Reject the export before its rows are streamed when the filtered queryset has
+        more rows than the MAX_EXPORT_ROWS limit of the query budget
+        :raise QueryBudgetExceeded: ValidationError with the reason of the rejection
+        """
+        query_budget = self.get_query_budget()
+        if query_budget is None:
+            return
+        try:
+            query_budget.check_export(lambda: self.get_queryset_count(queryset))
+        except QueryBudgetExceeded as exc:
+            self.report_query_rejection(request, exc)
+            raise
+
+    def report_query_rejection(self, request, exc):
+        """
+        Publish a load rejected by the query budget: rejection counter, log record
+        and query_rejected signal
+        """
+        count_rejection(exc.reason)
+        logger.warning("%s %s rejected: %s", type(self).__name__, request.path, exc.reason)
+        query_rejected.send(sender=type(self), view=self, request=request, reason=exc.reason)
+
+    def get_instrumentation(self):
+        """
+        Instrumentation enabled with the INSTRUMENTATION setting
+        :return: instrumentation_class instance or None
+        """
+        if not self.get_setting("INSTRUMENTATION", False) or self.instrumentation_class is None:
+            return None
+        return self.instrumentation_class()
+
+    def instrument(self, name: str):
+        """
+        Context manager that records the time, queries and rows of a phase of the load
+        """
+        if self.instrumentation is None:
+            return null_phase()
+        return self.instrumentation.phase(name)
+
+    def report_instrumentation(self, response):
+        """
+        Publish the instrumentation of the load: Server-Timing header, log record
+        and load_instrumented signal
+        """
+        instrumentation = self.instrumentation
+        response["Server-Timing"] = instrumentation.get_server_timing()
+        logger.info(
+            "%s %s %.1fms %d queries",
+            type(self).__name__,
+            self.request.path,
+            instrumentation.duration * 1000,
+            instrumentation.queries,
+            extra={"dx_instrumentation": instrumentation.as_dict()},
+        )
+        load_instrumented.send(
+            sender=type(self), view=self, request=self.request, instrumentation=instrumentation
+        )
+
+    def get_query_executor(self, queryset):
+        """
+        Executor of the independent queries of the load (page, counts, summaries),
+        enabled with the CONCURRENT_QUERIES setting: the number of queries of a request
+        that can run at the same time.
+        The queries run one after another (None is returned) inside a transaction,
+        because other connections don't see its changes, with in-memory sqlite
+        databases and when the load is instrumented
+        :return: ThreadExecutor or None
+        """
+        max_concurrency = self.get_setting("CONCURRENT_QUERIES", 0)
+        if not max_concurrency or max_concurrency < 2 or self.instrumentation is not None:
+            return None
+        if self.paginator is not None and not hasattr(self.paginator, "get_require_count"):
+            return None
+        connection = connections[queryset.db]
+        if connection.in_atomic_block:
+            return None
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            return None
+        return ThreadExecutor(max_concurrency)
+
+    def get_response_cache(self):
+        """
+        Response cache enabled with the RESPONSE_CACHE_TIMEOUT setting (seconds)
+        :return: response_cache_class instance or None
+        """
+        timeout = self.get_setting("RESPONSE_CACHE_TIMEOUT")
+        if not timeout or self.response_cache_class is None:
+            return None
+        return self.response_cache_class(
+            timeout=timeout, cache_alias=self.get_setting("RESPONSE_CACHE_ALIAS")
+        )
+
+    def get_delta_cache(self):
+        """
+        Cache of the windows of the delta loads, kept DELTA_TIMEOUT seconds
+        :return: delta_cache_class instance, or None when the view has no delta_field
+        """
+        if self.delta_field is None or self.delta_cache_class is None:
+            return None
+        return self.delta_cache_class(
+            timeout=self.get_setting("DELTA_TIMEOUT", 600),
+            cache_alias=self.get_setting("DELTA_CACHE_ALIAS"),
+        )
+
+    def get_response_cache_scope(self):
+        """
+        Part of the response cache key that separates the rows each user can see.
+        Override it when get_queryset() depends on something else (tenant, groups...)
+        """
+        user = getattr(self.request, "user", None)
+        if user is None or not user.is_authenticated:
+            return None
+        return user.pk
+
+    def get_response_cache_models(self):
+        """
+        Models whose changes invalidate the cached responses: the model of the
+        queryset and the models the serializer fields read through relations
+        """
+        model = self.get_queryset().model
+        select_related, prefetch_related = get_related_lookups(
+            model, self.get_field_serializer().fields.values()
+        )
+        related_models = get_lookup_models(model, select_related | prefetch_related) - {model}
+        related_models |= {rollup.model for rollup in self.rollups}
+        return [model] + sorted(related_models, key=lambda related: related._meta.label_lower)
+
+    def paginate_queryset(self, queryset, require_count=None):
+        """
+        :param require_count: Whether the paginator must count the queryset, by default
+                              it follows the requireTotalCount load option
+        """
+        if self.paginator is None:
+            return None
+        if require_count is None:
+            return self.paginator.paginate_queryset(queryset, self.request, view=self)
+        return self.paginator.paginate_queryset(
+            queryset, self.request, view=self, require_count=require_count
+        )
+
+    def get_queryset_count(self, queryset):
+        with self.instrument("count") as phase:
+            count_cache = self.get_count_cache()
+            if count_cache is None:
+                count = queryset.count()
+            else:
+                count = count_cache.get_count(queryset, self.request)
+            phase.rows = count
+        return count
+
+    def get_count_estimator(self, queryset):
+        """
+        :return: Count estimator of the database of the queryset, None disables the estimates
+        """
+        return get_count_estimator(queryset.db)
+
+    def get_estimated_count(self, queryset):
+        """
+        Count of a large queryset without counting its rows: the exact count cached
+        by a count query, or the estimate of the count estimator when it reaches
+        ESTIMATED_COUNT_THRESHOLD rows (smaller counts are cheap enough to be exact)
+        :return: (count, whether it is an estimate), or None to count the rows
+        """
+        with self.instrument("count") as phase:
+            count_cache = self.get_exact_count_cache()
+            count = None if count_cache is None else count_cache.get_cached_count(queryset, self.request)
+            if count is not None:
+                phase.rows = count
+                return count, False
+            estimator = self.get_count_estimator(queryset)
+            count = None if estimator is None else estimator.estimate(queryset)
+            if count is None or count < self.get_setting("ESTIMATED_COUNT_THRESHOLD", 100000):
+                return None
+            phase.rows = count
+        return count, True
 
     @staticmethod
     def get_field_type(field):
-        if (
-            isinstance(field, (serializers.Serializer, serializers.JSONField))
-            or hasattr(field, "many")
-            and field.many
-        ):
-            return "object"
-        elif isinstance(
-            field,
-            (
-                serializers.IntegerField,
-                serializers.DecimalField,
-                serializers.FloatField,
-            ),
-        ):
-            return "number"
-        elif isinstance(field, (serializers.DateField, serializers.DateTimeField)):
-            return "date"
-        return "string"
+        return get_field_type(field)
+
+    def get_grid_metadata(self):
+        """
+        Metadata of the fields of the serializer, built once per viewset and
+        serializer class
+        """
+        return get_grid_metadata(self)
 
     def _field_type_list(self):
         """
         Get field types from serializer class
         :return: Dict {field_name: field_type as string}
                 Types: 'object', 'number', 'date', 'string'
+                The ETag only changes with the fields, a request with a matching
+                If-None-Match gets a 304
         """
-        result = {}
         try:
-            fields = self.get_serializer().fields
-            for field_name, field in fields.items():
-                result[field_name] = self.get_field_type(field)
+            metadata = self.get_grid_metadata()
         except Exception as e:
             logging.exception(e)
-        return Response(result)
+            return Response({})
+        if metadata.etag in parse_etags(self.request.META.get("HTTP_IF_NONE_MATCH", "")):
+            response = Response(status=304)
+        else:
+            response = Response(dict(metadata.types))
+        response["ETag"] = metadata.etag
+        return response
 
     def list(self, request, *args, **kwargs):
         """
@@ -85,114 +367,640 @@ class DxListModelMixin(rest_framework.mixins.ListModelMixin, SummaryMixin):
         if list_type == "true":
             return self._field_type_list()
 
-        queryset = self.filter_queryset(self.get_queryset())
-        group = self.get_param_from_request(request, self.GROUP)
+        group = self.get_load_options(request).group
+        export_format = None if group else self.get_export_format()
+        self.check_query_budget(request, export=export_format is not None)
+        if export_format:
+            # The rows are streamed after the view returns, there is nothing to measure or cache
+            return self._list(group, export_format, request)
+
+        self.instrumentation = self.get_instrumentation()
+        if self.instrumentation is None:
+            return self._cached_list(group, request)
+        with self.instrumentation:
+            response = self._cached_list(group, request)
+        self.report_instrumentation(response)
+        return response
+
+    def _cached_list(self, group, request):
+        response_cache = self.get_response_cache()
+        if response_cache is None:
+            return self._list(group, None, request)
+        with self.instrument("cache"):
+            return response_cache.get_response(
+                self, request, lambda: self._list(group, None, request)
+            )
+
+    @action(detail=False, methods=["get", "post"])
+    def batch(self, request, *args, **kwargs):
+        """
+        Run several loads of the grid with a single request: a list of load options
+        objects in the body, or JSON encoded in the loads query parameter.
+        The loads share the queryset, the serializer and the request, they run one
+        after another
+        :return: List with the response data of every load, in the same order
+        """
+        if isinstance(request.data, list):
+            loads = request.data
+        else:
+            loads = self.get_param_from_request(request, "loads")
+        if not isinstance(loads, list) or not all(isinstance(load, dict) for load in loads):
+            raise ValidationError(detail="loads must be a list of load options objects")
+        max_loads = self.get_setting("BATCH_MAX_LOADS", 20)
+        if len(loads) > max_loads:
+            raise ValidationError(detail=f"A batch can't have more than {max_loads} loads")
+
+        queryset = self.get_queryset()
+        self.instrumentation = self.get_instrumentation()
+        results = []
+        with self.instrumentation or null_phase():
+            for load in loads:
+                load_options = LoadOptions(request, load)
+                request._dx_load_options = load_options
+                self.check_query_budget(request)
+                response = self._list(load_options.group, None, request, queryset)
+                results.append(response.data)
+        request._dx_load_options = None
+        response = Response(results)
+        if self.instrumentation is not None:
+            self.report_instrumentation(response)
+        return response
+
+    def _list(self, group, export_format, request, queryset=None):
+        """
+        :param queryset: Queryset to filter, get_queryset() by default
+        """
+        with self.instrument("filter"):
+            if queryset is None:
+                queryset = self.get_queryset()
+            queryset = self.filter_queryset(queryset)
+        is_count_query = self.get_load_options(request).is_count_query
+        if is_count_query or not group or self.get_rollup(request) is None:
+            # The loads answered by a rollup don't read the queryset
+            self.check_query_budget(request, queryset)
+        if is_count_query:
+            return self._count_list(queryset)
         if group:
             return self._grouped_list(group, queryset, request)
+        elif export_format:
+            self.check_export_budget(request, queryset)
+            return self._export_list(export_format, queryset, request)
+        elif self.delta_field is not None:
+            return self._delta_list(queryset, request)
         else:
             return self._not_grouped_list(queryset, request)
 
+    def _count_list(self, queryset):
+        """
+        Exact count of the rows of a count query, kept in the exact count cache for
+        the loads with an estimated count
+        """
+        # The same queryset the flat loads count
+        columns = self.get_values_columns(queryset) if self.use_values else None
+        if columns is not None:
+            queryset = self.get_values_queryset(queryset, columns)
+        else:
+            queryset = self.optimize_queryset(queryset)
+        with self.instrument("count") as phase:
+            count_cache = self.get_exact_count_cache()
+            if count_cache is None:
+                count = queryset.count()
+            else:
+                count = count_cache.get_count(queryset, self.request)
+            phase.rows = count
+        return Response({"totalCount": count})
+
     def _grouped_list(self, groups, queryset, request):
-        require_group_count = self.get_param_from_request(request, "requireGroupCount")
-        require_total_count = self.get_param_from_request(request, "requireTotalCount")
+        load_options = self.get_load_options(request)
+        require_group_count = load_options.require_group_count
+        require_total_count = load_options.require_total_count
+        group_summary = load_options.group_summary
+
+        rollup = self.get_rollup(request)
+        if rollup is None:
+            group_queryset, group_field_names, date_parts = self.get_group_queryset(
+                groups, queryset, group_summary
+            )
+            count_total = partial(self.get_queryset_count, queryset)
+        else:
+            rollup_queryset = rollup.get_queryset(self.get_rollup_filter(rollup))
+            group_queryset = rollup.get_group_queryset(rollup_queryset, groups, group_summary)
+            group_field_names = [group["selector"] for group in groups]
+            date_parts = []
+            count_total = partial(rollup.get_total_count, rollup_queryset)
+
+        # The group count is the count of the paginator, it is only computed when the
+        # client asks for it or can be deduced from the last page
+        executor = self.get_query_executor(group_queryset)
+        counts = {}
+        with self.instrument("group") as phase:
+            if executor is None:
+                page, rows = self._load_groups(group_queryset, bool(require_group_count))
+            else:
+                # The counts run along with the groups, even if the page could tell them
+                tasks = [lambda: self._load_groups(group_queryset, False)]
+                if require_group_count:
+                    tasks.append(lambda: self.get_queryset_count(group_queryset))
+                if require_total_count:
+                    tasks.append(count_total)
+                results = executor.run(tasks)
+                page, rows = results[0]
+                if require_group_count:
+                    counts["group"] = results[1]
+                if require_total_count:
+                    counts["total"] = results[-1]
+            if page is not None:
+                phase.rows = len(page)
 
-        if not isinstance(groups, list):
-            groups = [groups]
+        with self.instrument("build") as phase:
+            if date_parts:
+                rows = iter_date_part_rows(rows, date_parts)
+            builder = self.group_tree_builder_class(groups, group_field_names)
+            data = builder.build(rows)
+            phase.rows = builder.row_count
 
-        group_field_names = {self.get_group_field_name(group) for group in groups}
-        ordering = self.get_ordering(self.get_serializer(), groups)
+        if page is None:
+            # Every group was read
+            group_count = builder.row_count
+        else:
+            group_count = getattr(self.paginator, "count", None)
+        res_dict = {}
+        if require_group_count:
+            if group_count is None:
+                group_count = counts.get("group")
+            if group_count is None:
+                group_count = self.get_queryset_count(group_queryset)
+            res_dict["groupCount"] = group_count
+
+        if require_total_count:
+            if "total" in counts:
+                res_dict["totalCount"] = counts["total"]
+            elif group_count == builder.row_count and (
+                rollup or self.groups_partition_rows(groups, queryset)
+            ):
+                # All the groups were fetched, their counts add up to the total
+                res_dict["totalCount"] = builder.total_count
+            else:
+                res_dict["totalCount"] = count_total()
+
+        res_dict["data"] = data
+        return Response(res_dict)
+
+    def groups_partition_rows(self, groups: list, queryset):
+        """
+        Whether every row of the queryset is in exactly one group, so the group
+        counts add up to the total. A group selector across a to-many relation
+        puts a row in a group per related row
+        """
+        if queryset.query.distinct:
+            return False
+        serializer = self.get_field_serializer()
+        return not any(
+            is_to_many_path(queryset.model, self.get_field_name_from_source(serializer, group["selector"]))
+            for group in groups
+        )
+
+    def get_group_queryset(self, groups: list, queryset, group_summary: list):
+        """
+        Query of the groups of the load over the filtered queryset
+        :return: (group queryset, field of each group in the rows, date parts of the
+                 groups read from a truncated date)
+        """
+        serializer = self.get_field_serializer()
+        group_field_names = [self.get_group_field_name(group) for group in groups]
+        ordering = self.get_ordering(serializer, groups)
+        selector_names = [
+            self.get_field_name_from_source(serializer, group["selector"]) for group in groups
+        ]
+        date_truncs = get_date_truncs(groups, selector_names)
+        values_fields = []
+        date_parts = []
+        for index, selector_name in enumerate(selector_names):
+            if selector_name in date_truncs:
+                alias = date_truncs[selector_name][0]
+                date_parts.append((group_field_names[index], alias, groups[index]["groupInterval"]))
+                ordering[index] = ordering[index][:-len(selector_name)] + alias
+            else:
+                alias = group_field_names[index]
+            if alias not in values_fields:
+                values_fields.append(alias)
+        if date_truncs:
+            queryset_values = queryset.annotate(**dict(date_truncs.values())).values(*values_fields)
+        else:
+            queryset_values = queryset.values(*values_fields)
         group_queryset = (
-            queryset.values(*group_field_names)
-            .annotate(count=Count("pk"))
-            .order_by(*ordering)
+            queryset_values.annotate(count=Count("pk"))
+            .order_by(*OrderedDict.fromkeys(ordering))
             .distinct()
         )
-        group_summary = self.get_param_from_request(request, self.GROUP_SUMMARY)
         if group_summary:
-            if not isinstance(group_summary, list):
-                group_summary = [group_summary]
             group_queryset = self.add_summary_annotate(group_queryset, group_summary)
+        return group_queryset, group_field_names, date_parts
 
-        page = self.paginate_queryset(group_queryset)
-        res_dict = {}
-        if require_group_count:
-            res_dict["groupCount"] = group_queryset.count()
-        if require_total_count:
-            res_dict["totalCount"] = queryset.count()
+    def get_rollup(self, request):
+        """
+        Rollup that answers the group load of the request
+        :return: Rollup, or None when the groups are read from the queryset
+        """
+        for rollup in self.rollups:
+            if rollup.can_answer(request):
+                return rollup
+        return None
+
+    def get_rollup_filter(self, rollup):
+        """
+        Filter of the load over the fields of the rollup model
+        :return: Q object or None
+        """
+        dx_filter = self.get_load_options(self.request).filter
+        filter_backend_class = next(
+            (backend for backend in self.filter_backends if issubclass(backend, DxFilterBackend)),
+            DxFilterBackend,
+        )
+        return filter_backend_class().get_filter_q(rollup.get_filter_serializer(), dx_filter)
+
+    def _load_groups(self, group_queryset, require_count: bool):
+        """
+        :return: (page or None, rows of the groups). When every group is read (no
+                 pagination, or no take and no skip) the rows are read with
+                 iterator(), the group items are built as they arrive
+        """
+        if self.paginator is None or self.reads_all_groups():
+            return None, group_queryset.iterator()
+        page = self.paginate_queryset(group_queryset, require_count=require_count)
+        return page, page if page is not None else group_queryset.iterator()
+
+    def reads_all_groups(self):
+        """
+        Whether the pagination of the load starts at the first group and has no limit
+        """
+        paginator = self.paginator
+        if not isinstance(paginator, LimitOffsetPagination):
+            return False
+        return paginator.get_limit(self.request) is None and not paginator.get_offset(self.request)
+
+    def get_select_fields(self):
+        """
+        Serializer fields of the columns in the select load option
+        :return: Dict {field_name: field}, all the fields when there is no select
+        """
+        fields = self.get_field_serializer().fields
+        select = self.get_load_options(self.request).select
+        if not select:
+            return dict(fields)
+        return {name: field for name, field in fields.items() if name in select}
 
-        result = page if page else group_queryset
-        data_dict = self.build_data_dict(groups, result)
+    def get_list_serializer(self, instance, field_names=None):
+        """
+        Serializer of the rows, restricted to the select load option
+        :param field_names: Fields to serialize, the selected fields by default
+        """
+        serializer = self.get_serializer(instance, many=True)
+        if field_names is None:
+            field_names = self.get_load_options(self.request).select
+        if field_names:
+            fields = serializer.child.fields
+            for field_name in list(fields):
+                if field_name not in field_names:
+                    fields.pop(field_name)
+        return serializer
+
+    def optimize_queryset(self, queryset, field_names=None):
+        """
+        Load only the model fields of the selected columns, and their relations
+        with select_related/prefetch_related
+        :param field_names: Fields the instances are read for, the selected fields by default
+        """
+        if queryset._fields is not None:  # values() queryset
+            return queryset
+        fields = self.get_select_fields()
+        if field_names is not None:
+            fields = {name: field for name, field in fields.items() if name in field_names}
+        fields = fields.values()
+        select_related, prefetch_related = set(), set()
+        if self.auto_related:
+            select_related, prefetch_related = get_related_lookups(queryset.model, fields)
+
+        is_restricted = field_names is not None or self.get_load_options(self.request).select
+        if is_restricted and queryset.query.deferred_loading == (
+            frozenset(),
+            True,
+        ):
+            ordering = [
+                field.lstrip("-")
+                for field in queryset.query.order_by
+                if isinstance(field, str) and field.lstrip("-") != "pk"
+            ]
+            only_fields, only_select_related = get_only_fields(queryset.model, fields, ordering)
+            if only_fields is not None:
+                queryset = queryset.only(*only_fields)
+                select_related |= only_select_related
+
+        if select_related:
+            queryset = queryset.select_related(*sorted(select_related))
+        prefetched = {
+            getattr(lookup, "prefetch_to", lookup)
+            for lookup in queryset._prefetch_related_lookups
+        }
+        prefetch_related -= prefetched
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*sorted(prefetch_related))
+        return queryset
 
-        res_dict["data"] = []
-        format_items(data_dict, res_dict["data"])
+    def get_values_columns(self, queryset):
+        """
+        Columns of the selected fields that can be read with values(), the other
+        fields are serialized from the model instances (get_instance_field_names)
+        :return: List of ValuesColumn, or None when no field can be read with values()
+        """
+        if queryset._fields is not None:
+            return None
+        serializer = self.get_field_serializer()
+        annotations = set(queryset.query.annotations)
+        columns = []
+        for field_name, field in self.get_select_fields().items():
+            if field.write_only or not is_values_field(queryset.model, field, annotations):
+                continue
+            columns.append(
+                ValuesColumn(
+                    field_name,
+                    self.get_field_name_from_source(serializer, field),
+                    field,
+                    get_null_relation_path(queryset.model, field.source_attrs),
+                )
+            )
+        return columns or None
 
+    def get_instance_field_names(self, columns):
+        """
+        Selected fields that aren't read with values()
+        :param columns: List of ValuesColumn
+        :return: List of field names, in the order of the serializer
+        """
+        column_names = {column.field_name for column in columns}
+        return [
+            field_name
+            for field_name, field in self.get_select_fields().items()
+            if not field.write_only and field_name not in column_names
+        ]
+
+    def get_values_data(self, queryset, rows, columns):
+        """
+        Representation of rows of a values() queryset: the columns are converted by
+        values_to_representation, the other fields are serialized from the model
+        instances of the rows, read with a single query
+        :param queryset: Queryset the rows were read from
+        """
+        rows = list(rows)
+        data = self.values_to_representation(rows, columns)
+        field_names = self.get_instance_field_names(columns)
+        if not field_names or not rows:
+            return data
+        pks = [row["pk"] for row in rows]
+        instances = {
+            instance.pk: instance
+            for instance in self.optimize_queryset(queryset, field_names).filter(pk__in=pks)
+        }
+        pks = [pk for pk in pks if pk in instances]  # Deleted after the page was read
+        instance_data = dict(
+            zip(pks, self.get_list_serializer([instances[pk] for pk in pks], field_names).data)
+        )
+        # Same order of the fields as the serializer
+        order = list(self.get_select_fields())
+        result = []
+        for row, item in zip(rows, data):
+            item.update(instance_data.get(row["pk"], ()))
+            result.append({name: item[name] for name in order if name in item})
+        return result
+
+    def get_values_queryset(self, queryset, columns, extra_paths=()):
+        """
+        values() queryset of the columns, with the primary key and the ordering
+        paths the keyset cursor reads from the rows
+        :param extra_paths: Other paths to read
+        """
+        ordering = list(queryset.query.order_by)
+        if not ordering and queryset.query.default_ordering:
+            ordering = list(queryset.model._meta.ordering)
+        paths = [column.path for column in columns]
+        paths += [column.null_path for column in columns if column.null_path]
+        paths += [field.lstrip("-") for field in ordering if isinstance(field, str) and field != "?"]
+        paths.append("pk")
+        paths += extra_paths
+        return queryset.values(*OrderedDict.fromkeys(paths))
+
+    @staticmethod
+    def values_to_representation(rows, columns):
+        """
+        Rows of a values() queryset as the serializer would return them, the
+        fields are converted column by column
+        """
+        rows = list(rows)
+        data = [{column.field_name: row[column.path] for column in columns} for row in rows]
+        for field_name, _, field, null_path in columns:
+            if null_path is not None:
+                for row, item in zip(rows, data):
+                    if row[null_path] is not None:
+                        continue
+                    # Same as the serializer when the relation doesn't exist
+                    if field.default is not empty:
+                        item[field_name] = field.get_default()
+                    elif not field.allow_null:
+                        del item[field_name]
+            if isinstance(field, (serializers.PrimaryKeyRelatedField, serializers.ReadOnlyField)):
+                continue
+            for item in data:
+                value = item.get(field_name)
+                if value is not None:
+                    item[field_name] = field.to_representation(value)
+        return data
+
+    def _not_grouped_list(self, queryset, request):
+        res_dict = OrderedDict()
+        columns = self.get_values_columns(queryset) if self.use_values else None
+        total_summary = self.get_load_options(request).total_summary
+        executor = self.get_query_executor(queryset)
+        summary = None
+        with self.instrument("paginate") as phase:
+            if columns is not None:
+                rows = self.get_values_queryset(queryset, columns)
+            else:
+                rows = self.optimize_queryset(queryset)
+            if executor is None:
+                page = self.paginate_queryset(rows)
+            else:
+                page, summary = self._paginate_concurrently(executor, rows, queryset, total_summary)
+            if page is not None:
+                rows = page
+                phase.rows = len(page)
+        if page is not None:
+            self.add_page_info(res_dict)
+        if total_summary:
+            if summary is None:
+                with self.instrument("summary"):
+                    summary = self.calc_total_summary(queryset, total_summary)
+            res_dict["summary"] = summary
+        with self.instrument("serialize") as phase:
+            if columns is not None:
+                res_dict["data"] = self.get_values_data(queryset, rows, columns)
+            else:
+                res_dict["data"] = self.get_list_serializer(rows).data
+            phase.rows = len(res_dict["data"])
         return Response(res_dict)
 
-    def build_data_dict(self, groups, result):
-        data_dict = {}
-        for row in result:
-            lvl_dict = data_dict
-            for group in groups:
-                group_field_name = self.get_group_field_name(group)
-                key = row[group_field_name]
-
-                # TMP: Lo tenemos que poner por ahora porque a veces tenemos incongruencias de datos
-                if type(key) is list:
-                    if not key:
-                        self.create_dict(group, "", lvl_dict, row)
-                    for subkey in key:
-                        self.create_dict(group, subkey, lvl_dict, row)
-                else:
-                    self.create_dict(group, key, lvl_dict, row)
-        return data_dict
-
-    def create_dict(self, group, key, lvl_dict, row):
-        # PTE: Lo habilitaremos cuando unifiquen None como valor para los valores vacíos
-        # if key == "":  # We unify the empty and null values
-        #     key = None
-
-        if key in lvl_dict:
-            key_dict = lvl_dict[key]
+    def add_page_info(self, res_dict):
+        """
+        Count and cursor of the page read by the paginator
+        """
+        if self.paginator.count is not None:
+            res_dict["totalCount"] = self.paginator.count
+            if getattr(self.paginator, "count_is_estimate", False):
+                res_dict["totalCountApproximate"] = True
+        cursor = getattr(self.paginator, "cursor", None)
+        if cursor is not None:
+            res_dict["cursor"] = cursor
+
+    def get_rows_data(self, queryset, pks: list):
+        """
+        Serialized rows of the queryset with the primary keys, in the same order
+        """
+        if not pks:
+            return []
+        position = {pk: index for index, pk in enumerate(pks)}
+        columns = self.get_values_columns(queryset) if self.use_values else None
+        if columns is not None:
+            rows = self.get_values_queryset(queryset, columns).filter(pk__in=pks)
+            rows = sorted(rows, key=lambda row: position[row["pk"]])
+            return self.get_values_data(queryset, rows, columns)
+        rows = sorted(self.optimize_queryset(queryset).filter(pk__in=pks), key=lambda row: position[row.pk])
+        return self.get_list_serializer(rows).data
+
+    def _delta_list(self, queryset, request):
+        """
+        Flat load of a view with a delta_field. The page is read as the primary keys
+        and the versions of its rows, then only the rows the client doesn't have are
+        read and serialized: all of them without a valid version token, the rows
+        inserted or updated since the token otherwise. The rows that left the page
+        are returned in "removed"
+        """
+        load_options = self.get_load_options(request)
+        delta_cache = self.get_delta_cache()
+        digest = delta_cache.get_digest(self, request)
+        token = load_options.get(self.delta_query_param)
+        previous = delta_cache.get_window(token, digest)
+
+        res_dict = OrderedDict()
+        with self.instrument("paginate") as phase:
+            rows = self.get_values_queryset(queryset, [], [self.delta_field])
+            page = self.paginate_queryset(rows)
+            rows = list(rows) if page is None else page
+            phase.rows = len(rows)
+        window = [(row["pk"], row[self.delta_field]) for row in rows]
+        if page is not None:
+            self.add_page_info(res_dict)
+        total_summary = load_options.total_summary
+        if total_summary:
+            with self.instrument("summary"):
+                res_dict["summary"] = self.calc_total_summary(queryset, total_summary)
+
+        if previous is None:
+            pks = [pk for pk, _ in window]
         else:
-            key_dict = {}
-            lvl_dict[key] = key_dict
+            versions = dict(previous)
+            pks = [pk for pk, version in window if pk not in versions or versions[pk] != version]
+        with self.instrument("serialize") as phase:
+            res_dict["data"] = self.get_rows_data(queryset, pks)
+            phase.rows = len(res_dict["data"])
 
-        if group["isExpanded"]:
-            if "items" not in key_dict:
-                key_dict["items"] = {}
-            lvl_dict = key_dict["items"]
+        if previous == window:
+            delta_cache.touch(token)
         else:
-            key_dict["items"] = None
-            if "count" in key_dict:
-                key_dict["count"] += row["count"]
+            token = delta_cache.save_window(digest, window)
+        res_dict["version"] = token
+        if previous is not None:
+            res_dict["delta"] = True
+            keys = [pk for pk, _ in window]
+            removed = set(versions) - set(keys)
+            res_dict["removed"] = [pk for pk, _ in previous if pk in removed]
+            if keys != [pk for pk, _ in previous]:
+                # Rows were added, removed or moved: the order of the page
+                res_dict["keys"] = keys
+        return Response(res_dict)
+
+    def _paginate_concurrently(self, executor, rows, queryset, total_summary):
+        """
+        Run the page, the count and the total summary queries at the same time
+        :return: (page or None, total summary or None)
+        """
+        estimate_count = getattr(self.paginator, "use_estimated_count", False)
+        require_count = (
+            self.paginator is not None
+            and self.paginator.get_require_count(self.request)
+            and not estimate_count
+        )
+        # The page tells whether the count has to be estimated, it can't run along
+        tasks = [lambda: self.paginate_queryset(rows, require_count=None if estimate_count else False)]
+        if require_count:
+            tasks.append(lambda: self.get_queryset_count(queryset))
+        if total_summary:
+            tasks.append(lambda: self.calc_total_summary(queryset, total_summary))
+        results = executor.run(tasks)
+        page = results[0]
+        if page is not None and require_count and self.paginator.count is None:
+            self.paginator.count = results[1]
+        return page, results[-1] if total_summary else None
+
+    def get_export_format(self):
+        """
+        :return: Export format requested with export_query_param, or None
+        """
+        export_format = self.request.query_params.get(self.export_query_param)
+        return export_format if export_format in EXPORT_FORMATS else None
+
+    def iter_export_batches(self, queryset):
+        """
+        Serialized rows of the queryset in batches of EXPORT_CHUNK_SIZE rows, the
+        queryset is read with iterator() so the rows are never all in memory
+        """
+        chunk_size = self.get_setting("EXPORT_CHUNK_SIZE", 2000)
+        columns = self.get_values_columns(queryset) if self.use_values else None
+        if columns is not None:
+            rows = self.get_values_queryset(queryset, columns).iterator(chunk_size=chunk_size)
+        else:
+            rows = self.optimize_queryset(queryset).iterator(chunk_size=chunk_size)
+        while True:
+            batch = list(islice(rows, chunk_size))
+            if not batch:
+                return
+            if columns is not None:
+                yield self.get_values_data(queryset, batch, columns)
             else:
-                key_dict["count"] = row["count"]
+                yield self.get_list_serializer(batch).data
 
-            summary_pairs = list(filter(lambda x: x[0].startswith("gs__"), row.items()))
-            if summary_pairs:
-                summary_pairs.sort(key=lambda x: x[0])
-                summary = [x[1] for x in summary_pairs]
-                key_dict["summary"] = summary
+    def _export_list(self, export_format, queryset, request):
+        total_summary = self.get_load_options(request).total_summary
+        get_summary = partial(self.calc_total_summary, queryset, total_summary) if total_summary else None
 
-    def _not_grouped_list(self, queryset, request):
-        res_dict = OrderedDict()
-        page = self.paginate_queryset(queryset)
-        if page is None:
-            serializer = self.get_serializer(queryset, many=True)
+        batches = self.iter_export_batches(queryset)
+        if export_format == "csv":
+            field_names = [
+                field_name
+                for field_name, field in self.get_select_fields().items()
+                if not field.write_only
+            ]
+            content = iter_csv(field_names, batches, total_summary, get_summary)
         else:
-            serializer = self.get_serializer(page, many=True)
-            res_dict["totalCount"] = self.paginator.count
-        total_summary = self.get_param_from_request(request, self.TOTAL_SUMMARY)
-        if total_summary is not None and total_summary:
-            if not isinstance(total_summary, list):
-                total_summary = [total_summary]
-            res_dict["summary"] = self.calc_total_summary(queryset, total_summary)
-        res_dict["data"] = serializer.data
-        return Response(res_dict)
+            content = iter_ndjson(batches, get_summary)
+        response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[export_format])
+        response["Content-Disposition"] = 'attachment; filename="%s.%s"' % (
+            queryset.model._meta.model_name,
+            export_format,
+        )
+        return response
 
     def get_group_field_name(self, group: dict):
         field_name = self.get_field_name_from_source(
-            self.get_serializer(), group["selector"]
+            self.get_field_serializer(), group["selector"]
         )
         if "groupInterval" in group:
             field_name += "__" + group["groupInterval"]
@@ -0,0 +1,36 @@
+from django.db import models
+
+
+class Category(models.Model):
+    name = models.CharField(max_length=50)
+
+    class Meta:
+        app_label = "tests"
+
+
+class Tag(models.Model):
+    label = models.CharField(max_length=20)
+    category = models.ForeignKey(Category, null=True, on_delete=models.CASCADE)
+
+    class Meta:
+        app_label = "tests"
+
+
+class Item(models.Model):
+    name = models.CharField(max_length=50)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created = models.DateField()
+    category = models.ForeignKey(Category, null=True, on_delete=models.CASCADE)
+    tags = models.ManyToManyField(Tag)
+
+    class Meta:
+        app_label = "tests"
+
+
+class ItemRollup(models.Model):
+    name = models.CharField(max_length=50)
+    row_count = models.IntegerField()
+    amount_sum = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+
+    class Meta:
+        app_label = "tests"
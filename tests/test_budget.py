@@ -0,0 +1,133 @@
+import datetime
+import json
+from types import SimpleNamespace
+
+import pytest
+from django.http import QueryDict
+from mock.mock import MagicMock, patch
+from rest_framework import serializers
+from rest_framework.test import APIRequestFactory
+
+from htec_drf_dx_datagrid.budget import QueryBudget, QueryBudgetExceeded, measure_filter
+from htec_drf_dx_datagrid.mixins import LoadOptions
+from htec_drf_dx_datagrid.viewsets import DxReadOnlyModelViewSet
+from .models import Item
+
+LIMITS = {
+    "MAX_FILTER_NODES": 4,
+    "MAX_FILTER_DEPTH": 3,
+    "MAX_IN_VALUES": 3,
+    "MAX_GROUPS": 2,
+    "MAX_SUMMARIES": 2,
+    "MAX_TAKE": 100,
+    "MAX_SKIP": 1000,
+}
+
+
+def make_load_options(**params):
+    return LoadOptions(SimpleNamespace(GET=QueryDict(), data={}), params)
+
+
+class TestQueryBudget:
+    def test_measure_filter(self):
+        dx_filter = [["a", "=", 1], "and", ["!", [["b", "anyof", [1, 2, 3]], "or", ["c", "<", 2]]]]
+
+        assert measure_filter(dx_filter) == (3, 4, 3)
+        assert measure_filter(["a", "=", 1]) == (1, 1, 0)
+        assert measure_filter(None) == (0, 0, 0)
+
+    def test_within_budget(self):
+        load_options = make_load_options(
+            filter=[["a", "=", 1], "and", ["b", "anyof", [1, 2, 3]]],
+            group=[{"selector": "a"}],
+            totalSummary=[{"selector": "a", "summaryType": "sum"}],
+            take="100",
+            skip=1000,
+        )
+
+        QueryBudget(LIMITS).check_load_options(load_options)
+
+    DATA_TEST_OVER_BUDGET = (
+        # load options, reason
+        [{"filter": [["a", "=", value] for value in range(5)]}, "filter_nodes"],
+        [{"filter": ["!", [["!", [["a", "=", 1], "and", ["b", "=", 1]]]]]}, "filter_depth"],
+        [{"filter": ["a", "noneof", [1, 2, 3, 4]]}, "in_values"],
+        [{"group": [{"selector": "a"}, {"selector": "b"}, {"selector": "c"}]}, "groups"],
+        [
+            {"groupSummary": [{"selector": "a"}, {"selector": "b"}], "totalSummary": [{"selector": "a"}]},
+            "summaries",
+        ],
+        [{"take": 101}, "take"],
+        [{"skip": "1001"}, "skip"],
+        [{}, "take"],
+    )
+
+    @pytest.mark.parametrize("params, reason", DATA_TEST_OVER_BUDGET)
+    def test_over_budget(self, params, reason):
+        with pytest.raises(QueryBudgetExceeded) as exc_info:
+            QueryBudget(LIMITS).check_load_options(make_load_options(**params))
+
+        assert exc_info.value.reason == reason
+        assert exc_info.value.status_code == 400
+
+    @patch("htec_drf_dx_datagrid.budget.connections")
+    def test_estimated_rows(self, m_connections):
+        m_connections.__getitem__.return_value.vendor = "postgresql"
+        queryset = MagicMock()
+        queryset.explain.return_value = json.dumps({"Plan": {"Node Type": "Seq Scan", "Plan Rows": 5000}})
+
+        QueryBudget({"MAX_ESTIMATED_ROWS": 5000}).check_queryset(queryset)
+        with pytest.raises(QueryBudgetExceeded) as exc_info:
+            QueryBudget({"MAX_ESTIMATED_ROWS": 4999}).check_queryset(queryset)
+
+        assert exc_info.value.reason == "estimated_rows"
+        queryset.explain.assert_called_with(format="json")
+
+    @patch("htec_drf_dx_datagrid.budget.connections")
+    def test_estimated_rows_unsupported(self, m_connections):
+        m_connections.__getitem__.return_value.vendor = "sqlite"
+        queryset = MagicMock()
+
+        QueryBudget({"MAX_ESTIMATED_ROWS": 1}).check_queryset(queryset)
+        queryset.explain.assert_not_called()
+
+
+class NameSerializer(serializers.Serializer):
+    name = serializers.CharField()
+
+
+class ItemViewSet(DxReadOnlyModelViewSet):
+    queryset = Item.objects.order_by("pk")
+    serializer_class = NameSerializer
+
+
+@pytest.mark.django_db
+class TestQueryBudgetLoads:
+    @pytest.fixture(autouse=True)
+    def items(self, settings):
+        settings.REST_FRAMEWORK = {"DRF_DX_DATAGRID": {"QUERY_BUDGET": {"MAX_TAKE": 2, "MAX_EXPORT_ROWS": 2}}}
+        for name in "abc":
+            Item.objects.create(name=name, amount=1, created=datetime.date(2020, 1, 1))
+
+    def get(self, **params):
+        request = APIRequestFactory().get("/items/", params)
+        return ItemViewSet.as_view({"get": "list"})(request)
+
+    def test_missing_take_is_rejected(self):
+        with patch("htec_drf_dx_datagrid.viewsets.query_rejected") as m_query_rejected:
+            response = self.get(requireTotalCount="true")
+
+        assert response.status_code == 400
+        assert m_query_rejected.send.call_args[1]["reason"] == "take"
+        response = self.get(requireTotalCount="true", take=2)
+        assert [row["name"] for row in response.data["data"]] == ["a", "b"]
+        assert response.data["totalCount"] == 3
+        assert self.get(isCountQuery="true").data["totalCount"] == 3
+
+    def test_export_rows(self):
+        assert self.get(export="ndjson").status_code == 400
+
+        Item.objects.filter(name="c").delete()
+        response = self.get(export="ndjson")
+        assert response.status_code == 200
+        assert len(b"".join(response.streaming_content).splitlines()) == 2
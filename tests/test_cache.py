@@ -0,0 +1,185 @@
+import datetime
+import json
+from types import SimpleNamespace
+
+import pytest
+from django.http import QueryDict
+from mock.mock import MagicMock
+from rest_framework.response import Response
+
+from htec_drf_dx_datagrid.cache import CountCache, DeltaCache, ModelVersion, ResponseCache
+from .models import Category, Item, Tag
+
+
+def make_queryset(label="app.model", sql="SELECT 1"):
+    queryset = MagicMock()
+    queryset.model._meta.label_lower = label
+    queryset.order_by.return_value.query.sql_with_params.return_value = (sql, ())
+    queryset.count.return_value = 10
+    return queryset
+
+
+def make_request(**params):
+    return SimpleNamespace(GET={}, data=params)
+
+
+class TestCountCache:
+    def test_get_count_is_cached(self):
+        count_cache = CountCache(timeout=30)
+        queryset = make_queryset(label="test.cached")
+        request = make_request(filter=["qty", ">", 1])
+
+        assert count_cache.get_count(queryset, request) == 10
+        assert count_cache.get_count(queryset, request) == 10
+        queryset.count.assert_called_once()
+
+    def test_get_count_keyed_on_filter_and_sql(self):
+        count_cache = CountCache(timeout=30)
+        queryset = make_queryset(label="test.keyed")
+
+        count_cache.get_count(queryset, make_request(filter=["qty", ">", 1]))
+        count_cache.get_count(queryset, make_request(filter=["qty", ">", 2]))
+        count_cache.get_count(make_queryset(label="test.keyed", sql="SELECT 2"), make_request())
+        assert queryset.count.call_count == 2
+
+    def test_model_version_invalidates(self):
+        count_cache = CountCache(timeout=30)
+        queryset = make_queryset(label="test.invalidated")
+        request = make_request()
+
+        count_cache.get_count(queryset, request)
+        ModelVersion().increment(queryset.model)
+        count_cache.get_count(queryset, request)
+        assert queryset.count.call_count == 2
+
+
+def make_view(label, scope=None):
+    model = MagicMock()
+    model._meta.label_lower = label
+    return SimpleNamespace(
+        get_response_cache_models=lambda: [model],
+        get_response_cache_scope=lambda: scope,
+        model=model,
+    )
+
+
+def make_get_request(query_string, etag=None):
+    meta = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+    return SimpleNamespace(GET=QueryDict(query_string), data={}, path="/items/", META=meta)
+
+
+class TestResponseCache:
+    def get_response(self, response_cache, view, request):
+        build = MagicMock(return_value=Response({"data": [1, 2]}))
+        return response_cache.get_response(view, request, build), build
+
+    def test_canonical_load_options(self):
+        response_cache = ResponseCache(timeout=30)
+        view = make_view("test.canonical")
+        sort = {"selector": "qty", "desc": True}
+
+        self.get_response(
+            response_cache,
+            view,
+            make_get_request("take=10&sort=%s&requireTotalCount=true" % json.dumps([sort])),
+        )
+        response, build = self.get_response(
+            response_cache,
+            view,
+            make_get_request(
+                "requireTotalCount=True&sort[]=%s&take=10"
+                % json.dumps({"desc": True, "selector": "qty"})
+            ),
+        )
+
+        build.assert_not_called()
+        assert response.data == {"data": [1, 2]}
+
+    def test_keyed_on_scope_and_params(self):
+        response_cache = ResponseCache(timeout=30)
+
+        self.get_response(response_cache, make_view("test.scope", 1), make_get_request("take=10"))
+        _, build = self.get_response(response_cache, make_view("test.scope", 2), make_get_request("take=10"))
+        build.assert_called_once()
+        _, build = self.get_response(
+            response_cache, make_view("test.scope", 1), make_get_request("take=10&search=a")
+        )
+        build.assert_called_once()
+
+    def test_keyed_on_body_params(self):
+        response_cache = ResponseCache(timeout=30)
+        view = make_view("test.body")
+
+        def make_post_request(data):
+            return SimpleNamespace(GET=QueryDict(), data=data, path="/items/", META={})
+
+        self.get_response(response_cache, view, make_post_request({"take": 10, "since": "a"}))
+        _, build = self.get_response(response_cache, view, make_post_request({"take": 10, "since": "b"}))
+        build.assert_called_once()
+        _, build = self.get_response(response_cache, view, make_post_request({"since": "a", "take": 10}))
+        build.assert_not_called()
+
+    def test_model_version_invalidates(self):
+        response_cache = ResponseCache(timeout=30)
+        view = make_view("test.response_invalidated")
+
+        self.get_response(response_cache, view, make_get_request("take=10"))
+        ModelVersion().increment(view.model)
+        _, build = self.get_response(response_cache, view, make_get_request("take=10"))
+        build.assert_called_once()
+
+    def test_if_none_match(self):
+        response_cache = ResponseCache(timeout=30)
+        view = make_view("test.etag")
+        response, _ = self.get_response(response_cache, view, make_get_request("take=10"))
+
+        not_modified, build = self.get_response(
+            response_cache, view, make_get_request("take=10", etag=response["ETag"])
+        )
+
+        build.assert_not_called()
+        assert not_modified.status_code == 304
+        assert not_modified["ETag"] == response["ETag"]
+
+
+class TestDeltaCache:
+    def test_window(self):
+        delta_cache = DeltaCache(timeout=30)
+        window = [(1, "v1"), (2, "v2")]
+
+        token = delta_cache.save_window("digest", window)
+
+        assert delta_cache.get_window(token, "digest") == window
+        # Returned for other rows
+        assert delta_cache.get_window(token, "other digest") is None
+        assert delta_cache.get_window("unknown", "digest") is None
+        assert delta_cache.get_window("dx:count:*", "digest") is None
+        assert delta_cache.get_window(None, "digest") is None
+
+
+@pytest.mark.django_db
+class TestCountCacheRelations:
+    def test_many_to_many_change_invalidates(self):
+        count_cache = CountCache(timeout=30)
+        tag = Tag.objects.create(label="red")
+        items = [Item.objects.create(name=str(i), amount=1, created=datetime.date(2020, 1, 1)) for i in range(3)]
+        queryset = Item.objects.filter(tags__label="red")
+        request = make_request(filter=["tags", "=", "red"])
+
+        assert count_cache.get_count(queryset, request) == 0
+        items[0].tags.add(tag)
+        assert count_cache.get_count(queryset, request) == 1
+        tag.item_set.add(items[1])
+        assert count_cache.get_count(queryset, request) == 2
+
+    def test_related_change_invalidates(self):
+        count_cache = CountCache(timeout=30)
+        category = Category.objects.create(name="a")
+        Item.objects.create(name="i", amount=1, created=datetime.date(2020, 1, 1), category=category)
+        queryset = Item.objects.filter(category__name="b")
+        request = make_request(filter=["category_name", "=", "b"])
+
+        assert count_cache.get_count(queryset, request) == 0
+        category.name = "b"
+        category.save()
+        assert count_cache.get_count(queryset, request) == 1
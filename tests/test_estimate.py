@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import pytest
+from django.db.models import AutoField
+from mock.mock import MagicMock, patch
+
+from htec_drf_dx_datagrid.estimate import CountEstimator, SampledCountEstimator
+
+
+def make_queryset(low, high, sampled):
+    manager = MagicMock()
+    pks = manager.using.return_value.order_by.return_value.values_list.return_value
+    pks.first.return_value = low
+    pks.last.return_value = high
+    queryset = MagicMock()
+    queryset.model = SimpleNamespace(_meta=SimpleNamespace(pk=AutoField()), _base_manager=manager)
+    queryset.query.group_by = None
+    queryset.query.combinator = None
+    queryset.query.is_sliced = False
+    queryset.filter.return_value.order_by.return_value.count.return_value = sampled
+    return queryset
+
+
+@patch.object(SampledCountEstimator, "get_setting", staticmethod(lambda name, default=None: 1000))
+class TestSampledCountEstimator:
+    def test_estimate(self):
+        queryset = make_queryset(1, 100000, 500)
+
+        estimate = SampledCountEstimator("default").estimate(queryset)
+
+        # Half of the sampled keys match
+        assert estimate == 50000
+        sample_q = queryset.filter.call_args[0][0]
+        assert len(sample_q.children) == 4
+        assert sample_q.children[1].children == [("pk__gte", 25001), ("pk__lt", 25251)]
+
+    def test_small_table(self):
+        queryset = make_queryset(1, 1500, 100)
+
+        assert SampledCountEstimator("default").estimate(queryset) is None
+        queryset.filter.assert_not_called()
+
+    def test_group_queryset(self):
+        queryset = make_queryset(1, 100000, 500)
+        queryset.query.group_by = True
+
+        assert SampledCountEstimator("default").estimate(queryset) is None
+        queryset.filter.assert_not_called()
+
+
+class TestCountEstimator:
+    def test_get_estimate_is_abstract(self):
+        with pytest.raises(TypeError):
+            CountEstimator("default")
@@ -0,0 +1,67 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from django.test import override_settings
+from mock.mock import MagicMock, patch
+
+from htec_drf_dx_datagrid.executor import ThreadExecutor
+from htec_drf_dx_datagrid.viewsets import DxListModelMixin
+
+
+class TestThreadExecutor:
+    def test_run_keeps_the_order(self):
+        executor = ThreadExecutor(max_concurrency=2)
+        tasks = [lambda index=index: index * 10 for index in range(5)]
+
+        assert executor.run(tasks) == [0, 10, 20, 30, 40]
+
+    def test_run_concurrently(self):
+        executor = ThreadExecutor(max_concurrency=3)
+        barrier = threading.Barrier(3, timeout=5)
+
+        def task():
+            # Only returns when the three tasks are running at the same time
+            barrier.wait()
+            return threading.current_thread().name
+
+        names = executor.run([task, task, task])
+
+        assert names[0] == threading.current_thread().name
+        assert len(set(names)) == 3
+
+    def test_run_waits_for_the_other_tasks(self):
+        executor = ThreadExecutor(max_concurrency=2)
+        other = MagicMock(return_value=1)
+
+        def fail():
+            raise ValueError("query failed")
+
+        with pytest.raises(ValueError):
+            executor.run([fail, other])
+        other.assert_called_once()
+
+
+class TestGetQueryExecutor:
+    def get_executor(self, **connection_attrs):
+        connection = MagicMock(in_atomic_block=False, vendor="postgresql")
+        for name, value in connection_attrs.items():
+            setattr(connection, name, value)
+        view = DxListModelMixin()
+        view.paginator = None
+        with patch("htec_drf_dx_datagrid.viewsets.connections", {"default": connection}):
+            return view.get_query_executor(SimpleNamespace(db="default"))
+
+    def test_disabled_by_default(self):
+        assert self.get_executor() is None
+
+    @override_settings(REST_FRAMEWORK={"DRF_DX_DATAGRID": {"CONCURRENT_QUERIES": 3}})
+    def test_enabled(self):
+        executor = self.get_executor()
+
+        assert isinstance(executor, ThreadExecutor)
+        assert executor.max_concurrency == 3
+
+    @override_settings(REST_FRAMEWORK={"DRF_DX_DATAGRID": {"CONCURRENT_QUERIES": 3}})
+    def test_serial_in_transactions(self):
+        assert self.get_executor(in_atomic_block=True) is None
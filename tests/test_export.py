@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+from htec_drf_dx_datagrid.export import iter_csv, iter_ndjson
+
+
+class TestExport:
+    batches = [
+        [{"id": 1, "name": "a", "tags": [1, 2]}, {"id": 2, "name": None, "tags": []}],
+        [{"id": 3, "name": "c,d", "tags": [3]}],
+    ]
+
+    def test_iter_ndjson(self):
+        result = "".join(iter_ndjson(self.batches, lambda: [Decimal("1.5")]))
+
+        assert result == (
+            '{"id":1,"name":"a","tags":[1,2]}\n'
+            '{"id":2,"name":null,"tags":[]}\n'
+            '{"id":3,"name":"c,d","tags":[3]}\n'
+            '{"summary":[1.5]}\n'
+        )
+
+    def test_iter_ndjson_without_summary(self):
+        result = list(iter_ndjson(iter([])))
+
+        assert result == []
+
+    def test_iter_csv(self):
+        summary_items = [
+            {"selector": "id", "summaryType": "count"},
+            {"selector": "name", "summaryType": "min"},
+        ]
+
+        result = "".join(
+            iter_csv(["id", "name", "tags"], self.batches, summary_items, lambda: [3, "a"])
+        )
+
+        assert result == (
+            "id,name,tags\r\n"
+            '1,a,"[1,2]"\r\n'
+            "2,,[]\r\n"
+            '3,"c,d",[3]\r\n'
+            "\r\n"
+            "3,,\r\n"
+            ",a,\r\n"
+        )
@@ -1,6 +1,26 @@
+import gc
+import weakref
+from datetime import date
+
 import pytest
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import Q
+from django.http import HttpRequest
 from mock.mock import patch
-from htec_drf_dx_datagrid.filters import DxFilterBackend
+from rest_framework import serializers
+
+from htec_drf_dx_datagrid.filters import DxFilterBackend, get_filter_plan_cache
+from .models import Item
+
+
+class ItemSerializer(serializers.Serializer):
+    status = serializers.CharField()
+    qty = serializers.IntegerField(source="quantity")
+    created = serializers.DateField()
+
+
+class NameSerializer(serializers.Serializer):
+    name = serializers.CharField()
 
 
 class TestDxFilterBackend:
@@ -51,3 +71,170 @@ class TestDxFilterBackend:
     def test_check_value(self, value, expeted):
         result = DxFilterBackend._check_value(value)
         assert result == expeted
+
+    def test_get_filter_shape(self):
+        dx_filter = [["status", "=", "a"], "or", ["status", "=", None], "and", ["qty", ">", 3]]
+        backend = DxFilterBackend()
+        values = []
+
+        shape = backend._get_filter_shape(backend._parse_filter(dx_filter), values)
+
+        assert shape == (
+            "and",
+            (
+                ("or", (("node", "status", "=", False), ("node", "status", "=", True))),
+                ("node", "qty", ">", False),
+            ),
+        )
+        assert values == ["a", None, 3]
+
+    def test_filter_plan_cache(self):
+        serializer = ItemSerializer()
+        get_filter_plan_cache().clear()
+
+        for status in ["a", "b", "c"]:
+            backend = DxFilterBackend()
+            backend.serializer = serializer
+            dx_filter = [["status", "=", status], "and", ["qty", ">", 3]]
+            result = backend._DxFilterBackend__generate_q_expr(dx_filter)
+            assert result == Q(Q(status__exact=status), Q(quantity__gt=3))
+
+        cache_info = get_filter_plan_cache().cache_info()
+        assert (cache_info.hits, cache_info.misses, cache_info.currsize) == (2, 1, 1)
+
+    def test_filter_plan_keeps_no_request(self):
+        get_filter_plan_cache().clear()
+        request = HttpRequest()
+        backend = DxFilterBackend()
+        backend.serializer = ItemSerializer(context={"request": request})
+        dx_filter = [["status", "=", "a"], "and", ["created", "<", "2020-01-01"]]
+        backend._DxFilterBackend__generate_q_expr(dx_filter)
+        request_ref = weakref.ref(request)
+        del backend, request
+        gc.collect()  # The serializer and its fields reference each other
+
+        assert request_ref() is None
+
+    def test_filter_plan_binds_current_fields(self):
+        get_filter_plan_cache().clear()
+        dx_filter = ["status", "=", "true"]
+        backend = DxFilterBackend()
+        backend.serializer = ItemSerializer()
+        assert backend._DxFilterBackend__generate_q_expr(dx_filter) == Q(status__exact="true")
+
+        # Fields changed per request are read from the serializer of the request
+        serializer = ItemSerializer()
+        serializer.fields["status"] = serializers.BooleanField()
+        backend.serializer = serializer
+        assert backend._DxFilterBackend__generate_q_expr(dx_filter) == Q(status__exact=True)
+
+    def test_parse_filter_flattens_groups(self):
+        dx_filter = [[["a", "=", 1], "or", ["b", "=", 2]], "or", [["c", "=", 3]], ["d", "=", 4]]
+
+        result = DxFilterBackend()._parse_filter(dx_filter)
+
+        assert result == (
+            "and",
+            [
+                ("or", [("node", "a", "=", 1), ("node", "b", "=", 2), ("node", "c", "=", 3)]),
+                ("node", "d", "=", 4),
+            ],
+        )
+
+    DATA_TEST_OPTIMIZE_FILTER = (
+        # dx_filter, expected
+        [
+            [["status", "=", "a"], "or", ["qty", "=", 1], "or", ["status", "=", "b"]],
+            ("or", [("node", "status", "anyof", ["a", "b"]), ("node", "qty", "=", 1)]),
+        ],
+        [
+            [["status", "<>", "a"], "and", ["status", "<>", "b"]],
+            ("node", "status", "noneof", ["a", "b"]),
+        ],
+        [
+            ["!", [["status", "=", "a"], "or", ["status", "=", None], "or", ["status", "=", "b"]]],
+            ("!", ("or", [("node", "status", "anyof", ["a", "b"]), ("node", "status", "=", None)])),
+        ],
+        [
+            [["status", "=", "a"], "and", ["status", "=", "b"]],
+            ("and", [("node", "status", "=", "a"), ("node", "status", "=", "b")]),
+        ],
+    )
+
+    @pytest.mark.parametrize("dx_filter, expected", DATA_TEST_OPTIMIZE_FILTER)
+    def test_optimize_filter(self, dx_filter, expected):
+        backend = DxFilterBackend()
+
+        assert backend._optimize_filter(backend._parse_filter(dx_filter)) == expected
+
+    @pytest.mark.django_db
+    def test_case_insensitive_not_equal(self, settings):
+        settings.REST_FRAMEWORK = {"DRF_DX_DATAGRID": {"FILTER_CASE_SENSITIVE": False}}
+        for name in "abc":
+            Item.objects.create(name=name, amount=1, created=date(2020, 1, 1))
+        backend = DxFilterBackend()
+        backend.serializer = NameSerializer()
+        dx_filter = [["name", "<>", "A"], "and", ["name", "<>", "B"]]
+
+        q_expr = backend._DxFilterBackend__generate_q_expr(dx_filter)
+
+        assert sorted(Item.objects.filter(q_expr).values_list("name", flat=True)) == ["a", "b", "c"]
+
+    DATA_TEST_SET_OPERATORS = (
+        # dx_filter, expected
+        [["status", "anyof", ["a", "b"]], Q(Q(status__in=["a", "b"]), _connector=Q.OR)],
+        [
+            ["status", "anyof", ["a", None]],
+            Q(Q(status__in=["a"]), Q(status__isnull=True), _connector=Q.OR),
+        ],
+        [["status", "noneof", ["a"]], ~Q(Q(status__in=["a"]), _connector=Q.OR)],
+        [["qty", "between", [1, 5]], Q(quantity__range=(1, 5))],
+        [["qty", "between", [None, 5]], Q(quantity__lte=5)],
+    )
+
+    @pytest.mark.parametrize("dx_filter, expected", DATA_TEST_SET_OPERATORS)
+    def test_set_operators(self, dx_filter, expected):
+        backend = DxFilterBackend()
+        backend.serializer = ItemSerializer()
+
+        assert backend._DxFilterBackend__generate_q_expr(dx_filter) == expected
+
+    DATA_TEST_DATE_PARTS = (
+        # dx_filter, expected params of the range
+        [["created.year", "=", 2020], (date(2020, 1, 1), date(2021, 1, 1))],
+        [
+            [["created.year", "=", 2020], "and", ["created.month", "=", "12"]],
+            (date(2020, 12, 1), date(2021, 1, 1)),
+        ],
+        [
+            [["created.month", "=", 2], "and", ["created.year", "=", 2020], "and", ["created.day", "=", 29]],
+            (date(2020, 2, 29), date(2020, 3, 1)),
+        ],
+        [
+            [["created.year", "=", 2020], "and", ["created.quarter", "=", 4]],
+            (date(2020, 10, 1), date(2021, 1, 1)),
+        ],
+    )
+
+    @pytest.mark.parametrize("dx_filter, expected", DATA_TEST_DATE_PARTS)
+    def test_date_parts_to_range(self, dx_filter, expected):
+        backend = DxFilterBackend()
+        backend.serializer = ItemSerializer()
+
+        q_expr = backend._DxFilterBackend__generate_q_expr(dx_filter)
+        compiler = Item.objects.filter(q_expr).query.get_compiler(
+            connection=DatabaseWrapper({"TIME_ZONE": None})
+        )
+        sql, params = compiler.as_sql()
+
+        assert sql.endswith('WHERE ("tests_item"."created" >= %s AND "tests_item"."created" < %s)')
+        assert params == tuple(value.isoformat() for value in expected)
+
+    def test_date_part_without_year(self):
+        backend = DxFilterBackend()
+        backend.serializer = ItemSerializer()
+        dx_filter = [["created.month", "=", 3], "and", ["status", "=", "a"]]
+
+        result = backend._DxFilterBackend__generate_q_expr(dx_filter)
+
+        assert result == Q(Q(created__month=3), Q(status__exact="a"))
@@ -0,0 +1,122 @@
+from datetime import date
+
+from django.db.models.functions import TruncMonth
+
+from htec_drf_dx_datagrid.grouping import GroupTreeBuilder, get_date_truncs, iter_date_part_rows
+
+
+def build(groups, rows):
+    builder = GroupTreeBuilder(groups, [group["selector"] for group in groups])
+    return builder.build(iter(rows)), builder
+
+
+class TestGroupTreeBuilder:
+    def test_collapsed_level(self):
+        groups = [{"selector": "status", "isExpanded": False}]
+        rows = [{"status": "new", "count": 2}, {"status": "paid", "count": 3}]
+
+        items, builder = build(groups, rows)
+
+        assert items == [
+            {"key": "new", "count": 2, "items": None},
+            {"key": "paid", "count": 3, "items": None},
+        ]
+        assert builder.row_count == 2
+        assert builder.total_count == 5
+
+    def test_nested_levels(self):
+        groups = [
+            {"selector": "year", "isExpanded": True},
+            {"selector": "month", "isExpanded": False},
+        ]
+        rows = [
+            {"year": 2020, "month": 1, "count": 1},
+            {"year": 2020, "month": 2, "count": 2},
+            {"year": 2021, "month": 1, "count": 3},
+        ]
+
+        items, _ = build(groups, rows)
+
+        assert items == [
+            {
+                "key": 2020,
+                "items": [
+                    {"key": 1, "count": 1, "items": None},
+                    {"key": 2, "count": 2, "items": None},
+                ],
+            },
+            {"key": 2021, "items": [{"key": 1, "count": 3, "items": None}]},
+        ]
+
+    def test_summary_in_load_option_order(self):
+        groups = [{"selector": "status", "isExpanded": False}]
+        row = {"status": "new", "count": 1}
+        row.update({"gs__%d" % index: index for index in range(12)})
+
+        items, _ = build(groups, [row])
+
+        assert items[0]["summary"] == list(range(12))
+
+    def test_list_keys(self):
+        groups = [{"selector": "tags", "isExpanded": False}]
+        rows = [
+            {"tags": ["a", "b"], "count": 1},
+            {"tags": [], "count": 2},
+            {"tags": ["a"], "count": 4},
+        ]
+
+        items, _ = build(groups, rows)
+
+        assert [(item["key"], item["count"]) for item in items] == [("a", 5), ("b", 1), ("", 2)]
+
+    def test_interval_level_is_indexed(self):
+        # Sorted by the date, so the months of different years are interleaved
+        groups = [{"selector": "created__month", "groupInterval": "month", "isExpanded": False}]
+        rows = [
+            {"created__month": 1, "count": 1},
+            {"created__month": 2, "count": 1},
+            {"created__month": 1, "count": 1},
+        ]
+
+        items, _ = build(groups, rows)
+
+        assert [(item["key"], item["count"]) for item in items] == [(1, 2), (2, 1)]
+
+
+class TestDateTruncs:
+    def test_finest_interval_from_the_year(self):
+        groups = [
+            {"selector": "created", "groupInterval": "year"},
+            {"selector": "created", "groupInterval": "month"},
+            {"selector": "status"},
+        ]
+
+        truncs = get_date_truncs(groups, ["created", "created", "status"])
+
+        assert list(truncs) == ["created"]
+        alias, trunc = truncs["created"]
+        assert alias == "_dx_trunc_created"
+        assert isinstance(trunc, TruncMonth)
+
+    def test_without_year(self):
+        groups = [
+            {"selector": "created", "groupInterval": "month"},
+            {"selector": "updated", "groupInterval": "year"},
+            {"selector": "updated", "groupInterval": "dayOfWeek"},
+        ]
+
+        assert get_date_truncs(groups, ["created", "updated", "updated"]) == {}
+
+    def test_date_part_rows(self):
+        rows = [{"_dx_trunc_created": date(2020, 11, 1)}, {"_dx_trunc_created": None}]
+        date_parts = [
+            ("created__year", "_dx_trunc_created", "year"),
+            ("created__quarter", "_dx_trunc_created", "quarter"),
+            ("created__month", "_dx_trunc_created", "month"),
+        ]
+
+        rows = list(iter_date_part_rows(rows, date_parts))
+
+        assert [
+            (row["created__year"], row["created__quarter"], row["created__month"]) for row in rows
+        ] == [(2020, 4, 11), (None, None, None)]
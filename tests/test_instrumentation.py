@@ -0,0 +1,48 @@
+from mock.mock import MagicMock, patch
+
+from htec_drf_dx_datagrid.instrumentation import NULL_PHASE, Instrumentation
+from htec_drf_dx_datagrid.viewsets import DxListModelMixin
+
+
+class TestInstrumentation:
+    @patch("htec_drf_dx_datagrid.instrumentation.time.perf_counter")
+    def test_nested_phases_are_exclusive(self, perf_counter):
+        perf_counter.side_effect = [0.0, 1.0, 3.0, 4.0, 7.0, 10.0]
+        instrumentation = Instrumentation()
+        execute = MagicMock()
+
+        with instrumentation:
+            with instrumentation.phase("paginate") as paginate:
+                instrumentation._execute_wrapper(execute, "SELECT 1", None, False, {})
+                with instrumentation.phase("count") as count:
+                    instrumentation._execute_wrapper(execute, "SELECT 2", None, False, {})
+                    count.rows = 50
+                paginate.rows = 10
+
+        assert instrumentation.as_dict() == {
+            "duration_ms": 10000.0,
+            "queries": 2,
+            "phases": {
+                "paginate": {"duration_ms": 5000.0, "queries": 1, "rows": 10},
+                "count": {"duration_ms": 1000.0, "queries": 1, "rows": 50},
+            },
+        }
+        assert execute.call_count == 2
+
+    def test_get_server_timing(self):
+        instrumentation = Instrumentation()
+        with instrumentation.phase("count") as phase:
+            phase.rows = 5
+        instrumentation.phases["count"].duration = 0.0015
+        instrumentation.duration = 0.002
+
+        assert instrumentation.get_server_timing() == (
+            'count;desc="0 queries, 5 rows";dur=1.500, total;desc="0 queries";dur=2.000'
+        )
+
+    def test_disabled(self):
+        view = DxListModelMixin()
+
+        assert view.get_instrumentation() is None
+        with view.instrument("count") as phase:
+            assert phase is NULL_PHASE
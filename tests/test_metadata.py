@@ -0,0 +1,125 @@
+import pytest
+from django.db.models import Index, Q
+from django.http import QueryDict
+from mock.mock import MagicMock, patch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from htec_drf_dx_datagrid.filters import DxFilterBackend
+from htec_drf_dx_datagrid.metadata import COMPARISON_OPERATORS, GridMetadata, get_grid_metadata, is_indexed
+from htec_drf_dx_datagrid.viewsets import DxReadOnlyModelViewSet
+from .models import Item, Tag
+
+
+class ItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    created = serializers.DateField()
+    category = serializers.PrimaryKeyRelatedField(read_only=True)
+    category_name = serializers.CharField(source="category.name")
+
+
+class ItemViewSet(DxReadOnlyModelViewSet):
+    queryset = Item.objects.all()
+    serializer_class = ItemSerializer
+
+
+def make_view(if_none_match=None):
+    request = MagicMock()
+    request.query_params = QueryDict("list_types=true")
+    request.META = {} if if_none_match is None else {"HTTP_IF_NONE_MATCH": if_none_match}
+    return ItemViewSet(request=request, format_kwarg=None, args=(), kwargs={})
+
+
+class TestGridMetadata:
+    def test_fields(self):
+        metadata = get_grid_metadata(make_view())
+
+        assert metadata.types == {
+            "id": "number",
+            "name": "string",
+            "amount": "number",
+            "created": "date",
+            "category": "string",
+            "category_name": "string",
+        }
+        assert metadata.fields["category_name"].path == "category__name"
+        assert metadata.fields["amount"].operators == COMPARISON_OPERATORS
+        assert metadata.fields["name"].operators is None
+        assert [name for name, field in metadata.fields.items() if field.indexed] == ["id", "category"]
+
+    def test_is_indexed(self):
+        assert is_indexed(Item, "category__id")
+        assert not is_indexed(Item, "category__name")
+        assert not is_indexed(Tag, "unknown")
+
+    def test_is_indexed_by_meta(self):
+        indexes = [Index(fields=["-created", "name"], name="item_created")]
+        with patch.object(Item._meta, "indexes", indexes), patch.object(Item._meta, "unique_together", [("amount",)]):
+            assert is_indexed(Item, "created")
+            assert is_indexed(Item, "amount")
+            assert not is_indexed(Item, "name")
+
+    def test_built_once(self):
+        with patch("htec_drf_dx_datagrid.metadata.GridMetadata") as metadata_class:
+            view_class = type("OtherItemViewSet", (ItemViewSet,), {})
+            view = view_class(request=None, format_kwarg=None, args=(), kwargs={})
+
+            assert get_grid_metadata(view) is get_grid_metadata(view)
+            metadata_class.assert_called_once_with(view)
+
+
+class TestListTypes:
+    def test_etag(self):
+        response = make_view().list(None)
+
+        assert response.status_code == 200
+        assert response.data["amount"] == "number"
+        assert response["ETag"] == get_grid_metadata(make_view()).etag
+
+    def test_not_modified(self):
+        etag = get_grid_metadata(make_view()).etag
+
+        response = make_view(if_none_match=etag).list(None)
+
+        assert response.status_code == 304
+        assert response["ETag"] == etag
+
+
+class TestOperatorCheck:
+    @pytest.mark.parametrize("dx_filter", [["amount", "contains", "1"], ["created", "startswith", "2020"]])
+    def test_rejected(self, dx_filter):
+        backend = DxFilterBackend()
+        backend.serializer = ItemSerializer()
+
+        with pytest.raises(ValidationError):
+            backend._DxFilterBackend__generate_q_expr(dx_filter)
+
+    def test_rejected_by_metadata(self):
+        backend = DxFilterBackend()
+        backend.serializer = ItemSerializer()
+        backend.metadata = GridMetadata(make_view())
+        # The operators of the grid take precedence over the field of the serializer
+        backend.metadata.fields["name"] = backend.metadata.fields["name"]._replace(operators=COMPARISON_OPERATORS)
+
+        with pytest.raises(ValidationError):
+            backend._DxFilterBackend__generate_q_expr(["name", "contains", "a"])
+
+    def test_path_from_metadata(self):
+        backend = DxFilterBackend()
+        backend.serializer = ItemSerializer()
+        backend.metadata = GridMetadata(make_view())
+
+        with patch.object(backend, "get_field_name_from_source") as get_field_name_from_source:
+            q_expr = backend._DxFilterBackend__generate_q_expr(["category_name", "=", "a"])
+
+        assert q_expr == Q(category__name__exact="a")
+        get_field_name_from_source.assert_not_called()
+
+    def test_allowed(self):
+        backend = DxFilterBackend()
+        backend.serializer = ItemSerializer()
+        dx_filter = [["amount", ">=", 1], "and", ["name", "contains", "a"]]
+
+        assert backend._DxFilterBackend__generate_q_expr(dx_filter) is not None
@@ -0,0 +1,56 @@
+import json
+
+from django.http import QueryDict
+from rest_framework import serializers
+from types import SimpleNamespace
+
+from htec_drf_dx_datagrid.mixins import DxMixin, LoadOptions
+
+
+class ItemSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    category = serializers.CharField(source="category.name")
+
+
+class TestLoadOptions:
+    @staticmethod
+    def make_request(query_string):
+        return SimpleNamespace(GET=QueryDict(query_string), data={})
+
+    def test_load_options_shared_by_request(self):
+        request = self.make_request("take=10")
+
+        load_options = DxMixin.get_load_options(request)
+
+        assert DxMixin.get_load_options(request) is load_options
+        assert load_options.get("take") == 10
+
+    def test_load_options_lists(self):
+        group = {"selector": "name", "isExpanded": False}
+        request = self.make_request(
+            "group=" + json.dumps(group) + "&totalSummary[]=" + json.dumps({"selector": "name"})
+        )
+
+        load_options = DxMixin.get_load_options(request)
+
+        assert load_options.group == [group]
+        assert load_options.total_summary == [{"selector": "name"}]
+        assert load_options.sort == []
+        assert load_options.filter is None
+
+    def test_get_field_name_from_source(self):
+        serializer = ItemSerializer()
+
+        assert DxMixin().get_field_name_from_source(serializer, "category") == "category__name"
+        assert DxMixin().get_field_name_from_source(serializer, serializer.fields["name"]) == "name"
+
+    def test_load_options_from_params(self):
+        request = self.make_request("take=10")
+        group = {"selector": "name", "isExpanded": False}
+
+        load_options = LoadOptions(request, {"skip": 20, "group": json.dumps(group), "sort[]": [group]})
+
+        assert load_options.get("take") is None
+        assert load_options.get("skip") == 20
+        assert load_options.group == [group]
+        assert load_options.sort == [group]
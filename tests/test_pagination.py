@@ -0,0 +1,148 @@
+import datetime
+from types import SimpleNamespace
+
+from django.db.models import Q
+from mock.mock import MagicMock
+
+from htec_drf_dx_datagrid.pagination import TakeSkipPagination
+
+
+class TestTakeSkipPagination:
+    def test_get_seek_q(self):
+        ordering = [("created", True), ("pk", False)]
+
+        result = TakeSkipPagination.get_seek_q(ordering, ["2024-01-01", 7])
+
+        assert result == Q(created__lte="2024-01-01") & Q(
+            Q(created__lt="2024-01-01"),
+            Q(created="2024-01-01", pk__gt=7),
+            _connector=Q.OR,
+        )
+
+    def test_get_seek_q_only_pk(self):
+        assert TakeSkipPagination.get_seek_q([("pk", False)], [7]) == Q(pk__gt=7)
+
+    def test_cursor_round_trip(self):
+        paginator = TakeSkipPagination()
+        ordering = [("created_at", False), ("pk", False)]
+        created_at = datetime.datetime(2024, 1, 1, 10, 30, 15, 123456)
+        row = {"created_at": created_at, "pk": 7}
+        cursor = paginator.encode_cursor("digest", 40, ordering, row)
+
+        paginator.offset = 40
+        assert paginator.decode_cursor(cursor, "digest") == [created_at.isoformat(), 7]
+        assert paginator.decode_cursor(cursor, "other filter") is None
+        paginator.offset = 80
+        assert paginator.decode_cursor(cursor, "digest") is None
+        assert paginator.decode_cursor("not a cursor", "digest") is None
+
+    @staticmethod
+    def make_request(**params):
+        return SimpleNamespace(GET={}, query_params={}, data=params)
+
+    def test_paginate_queryset_count_from_last_page(self):
+        paginator = TakeSkipPagination()
+        queryset = MagicMock()
+        queryset.__getitem__.side_effect = list(range(25)).__getitem__
+
+        page = paginator.paginate_queryset(queryset, self.make_request(skip=20, take=10))
+
+        assert page == [20, 21, 22, 23, 24]
+        assert paginator.count == 25
+        queryset.count.assert_not_called()
+
+    def test_paginate_queryset_counts_when_required(self):
+        paginator = TakeSkipPagination()
+        queryset = MagicMock()
+        queryset.__getitem__.side_effect = list(range(25)).__getitem__
+        queryset.count.return_value = 25
+
+        page = paginator.paginate_queryset(queryset, self.make_request(skip=0, take=10))
+
+        assert page == list(range(10))
+        assert paginator.count == 25
+
+    def test_paginate_queryset_skips_count(self):
+        paginator = TakeSkipPagination()
+        queryset = MagicMock()
+        queryset.__getitem__.side_effect = list(range(25)).__getitem__
+
+        request = self.make_request(skip=0, take=10, requireTotalCount=False)
+        page = paginator.paginate_queryset(queryset, request)
+
+        assert page == list(range(10))
+        assert paginator.count is None
+        queryset.count.assert_not_called()
+
+    @staticmethod
+    def make_window_paginator():
+        paginator = TakeSkipPagination()
+        paginator.use_window_count = True
+        paginator.can_use_window_count = lambda queryset: True
+        return paginator
+
+    def test_paginate_queryset_window_count(self):
+        paginator = self.make_window_paginator()
+        rows = [{"id": index, "_dx_total_count": 25} for index in range(25)]
+        queryset = MagicMock()
+        queryset.annotate.return_value.__getitem__.side_effect = rows.__getitem__
+
+        page = paginator.paginate_queryset(queryset, self.make_request(skip=0, take=10))
+
+        assert page == [{"id": index} for index in range(10)]
+        assert paginator.count == 25
+        queryset.count.assert_not_called()
+
+    def test_paginate_queryset_window_count_empty_page(self):
+        paginator = self.make_window_paginator()
+        queryset = MagicMock()
+        queryset.annotate.return_value.__getitem__.return_value = []
+        queryset.count.return_value = 25
+
+        page = paginator.paginate_queryset(queryset, self.make_request(skip=40, take=10))
+
+        assert page == []
+        assert paginator.count == 25
+
+    @staticmethod
+    def make_estimated_paginator(estimated):
+        paginator = TakeSkipPagination()
+        paginator.use_estimated_count = True
+        paginator.view = None
+        paginator.get_estimated_count = lambda queryset: estimated
+        return paginator
+
+    def test_paginate_queryset_estimated_count(self):
+        paginator = self.make_estimated_paginator((1000, True))
+        queryset = MagicMock()
+        queryset.__getitem__.side_effect = list(range(25)).__getitem__
+
+        page = paginator.paginate_queryset(queryset, self.make_request(skip=0, take=10))
+
+        assert page == list(range(10))
+        assert paginator.count == 1000
+        assert paginator.count_is_estimate
+        assert paginator.get_paginated_response(page).data["totalCountApproximate"] is True
+        queryset.count.assert_not_called()
+
+    def test_paginate_queryset_estimated_count_below_page(self):
+        paginator = self.make_estimated_paginator((5, True))
+        queryset = MagicMock()
+        queryset.__getitem__.side_effect = list(range(25)).__getitem__
+
+        paginator.paginate_queryset(queryset, self.make_request(skip=10, take=10))
+
+        # There is at least a row after the page
+        assert paginator.count == 21
+
+    def test_paginate_queryset_not_estimated(self):
+        paginator = self.make_estimated_paginator(None)
+        queryset = MagicMock()
+        queryset.__getitem__.side_effect = list(range(25)).__getitem__
+        queryset.count.return_value = 25
+
+        paginator.paginate_queryset(queryset, self.make_request(skip=0, take=10))
+
+        assert paginator.count == 25
+        assert not paginator.count_is_estimate
+        assert "totalCountApproximate" not in paginator.get_paginated_response([]).data
@@ -0,0 +1,90 @@
+from rest_framework import serializers
+
+from htec_drf_dx_datagrid.projection import (
+    get_null_relation_path,
+    get_only_fields,
+    get_related_lookups,
+    is_values_field,
+)
+from tests.models import Category, Item, Tag
+
+
+class CategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ["id", "name"]
+
+
+class TagSerializer(serializers.ModelSerializer):
+    category = CategorySerializer()
+
+    class Meta:
+        model = Tag
+        fields = ["id", "label", "category"]
+
+
+class ItemSerializer(serializers.ModelSerializer):
+    category_name = serializers.CharField(source="category.name")
+    tag_list = TagSerializer(source="tags", many=True)
+    label = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Item
+        fields = ["id", "name", "category", "category_name", "tags", "tag_list", "label"]
+
+
+class TestProjection:
+    def test_get_related_lookups(self):
+        fields = ItemSerializer().fields.values()
+
+        result = get_related_lookups(Item, fields)
+
+        assert result == ({"category"}, {"tags", "tags__category"})
+
+    def test_get_related_lookups_primary_keys(self):
+        fields = ItemSerializer().fields
+        fields = [fields["category"], fields["tags"]]
+
+        assert get_related_lookups(Item, fields) == (set(), {"tags"})
+
+    def test_get_only_fields(self):
+        fields = ItemSerializer().fields
+        fields = [fields["name"], fields["category_name"], fields["tags"]]
+
+        result = get_only_fields(Item, fields, ["created"])
+
+        assert result == (["category__name", "created", "id", "name"], {"category"})
+
+    def test_get_only_fields_method_field(self):
+        fields = ItemSerializer().fields
+
+        assert get_only_fields(Item, [fields["name"], fields["label"]]) == (None, None)
+
+    def test_is_values_field(self):
+        fields = ItemSerializer().fields
+
+        result = {
+            name: is_values_field(Item, field, {"total"}) for name, field in fields.items()
+        }
+
+        assert result == {
+            "id": True,
+            "name": True,
+            "category": True,
+            "category_name": True,
+            "tags": False,
+            "tag_list": False,
+            "label": False,
+        }
+
+    def test_is_values_field_annotation(self):
+        field = serializers.DecimalField(max_digits=10, decimal_places=2)
+        field.bind("total", ItemSerializer())
+
+        assert is_values_field(Item, field, {"total"})
+        assert not is_values_field(Item, field)
+
+    def test_get_null_relation_path(self):
+        assert get_null_relation_path(Item, ["category", "name"]) == "category"
+        assert get_null_relation_path(Item, ["category"]) is None
+        assert get_null_relation_path(Item, ["name"]) is None
@@ -0,0 +1,74 @@
+import datetime
+import json
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from htec_drf_dx_datagrid.renderers import DxCompactJSONRenderer, orjson, to_group_arrays, to_row_arrays
+
+
+def render_context(group=()):
+    view = SimpleNamespace(get_load_options=lambda request: SimpleNamespace(group=list(group)))
+    return {"view": view, "request": SimpleNamespace()}
+
+
+class TestCompactRenderer:
+    def test_row_arrays(self):
+        rows = [{"id": 1, "name": "a"}, {"id": 2, "category": 3}, {"name": "c", "id": 3}]
+
+        columns, data = to_row_arrays(rows)
+
+        assert columns == ["id", "name", "category"]
+        assert data == [[1, "a", None], [2, None, 3], [3, "c", None]]
+
+    def test_group_arrays(self):
+        items = [
+            {"key": "a", "count": 2, "summary": [5], "items": [{"key": 1, "items": None, "count": 2}]},
+            {"key": "b", "items": None},
+        ]
+
+        assert to_group_arrays(items) == [["a", 2, [5], [[1, 2, None, None]]], ["b", None, None, None]]
+
+    def test_render_flat(self):
+        data = {"data": [{"id": 1, "amount": "1.50"}], "totalCount": 1}
+
+        content = DxCompactJSONRenderer().render(data, "application/json", render_context())
+
+        assert json.loads(content) == {"data": [[1, "1.50"]], "columns": ["id", "amount"], "totalCount": 1}
+        # The response data can be cached
+        assert data["data"] == [{"id": 1, "amount": "1.50"}]
+
+    def test_render_groups(self):
+        data = {"data": [{"key": "a", "count": 1, "items": None}], "groupCount": 1}
+
+        content = DxCompactJSONRenderer().render(data, "application/json", render_context([{"selector": "a"}]))
+
+        assert json.loads(content) == {"data": [["a", 1, None, None]], "groupCount": 1}
+
+    def test_render_other_responses(self):
+        renderer = DxCompactJSONRenderer()
+
+        assert json.loads(renderer.render({"data": [{"id": 1}]}, "application/json", {})) == {"data": [{"id": 1}]}
+        assert json.loads(renderer.render([{"a": 1}], "application/json", render_context())) == [{"a": 1}]
+
+    @pytest.mark.skipif(orjson is None, reason="orjson is not installed")
+    def test_orjson_like_json(self):
+        data = {
+            "data": [
+                {
+                    "created": datetime.date(2020, 1, 2),
+                    "modified": datetime.datetime(2020, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+                    "amount": Decimal("1.50"),
+                    "name": "a\u2028b č",
+                }
+            ],
+            "totalCount": 1,
+        }
+        json_renderer = DxCompactJSONRenderer()
+        json_renderer.use_orjson = False
+
+        content = DxCompactJSONRenderer().render(data, "application/json", render_context())
+
+        assert json.loads(content) == json.loads(json_renderer.render(data, "application/json", render_context()))
+        assert b"\\u2028" in content
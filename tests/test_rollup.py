@@ -0,0 +1,88 @@
+import json
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models.base import ModelBase
+from django.http import QueryDict
+from mock.mock import MagicMock, PropertyMock, patch
+
+from htec_drf_dx_datagrid.rollup import Rollup, get_filter_selectors
+from .models import ItemRollup
+
+
+def make_rollup():
+    return Rollup(ItemRollup, group=["name"], summary=[("amount", "sum")])
+
+
+def make_request(**params):
+    query = QueryDict(mutable=True)
+    for name, value in params.items():
+        query[name] = json.dumps(value) if isinstance(value, (list, dict)) else value
+    return SimpleNamespace(GET=query, data={})
+
+
+class TestRollup:
+    def test_get_filter_selectors(self):
+        dx_filter = [["name", "anyof", ["a", "b"]], "and", ["!", ["amount", ">", 1]]]
+
+        assert get_filter_selectors(dx_filter) == {"name", "amount"}
+        assert get_filter_selectors(None) == set()
+
+    def test_can_answer(self):
+        rollup = make_rollup()
+        group = [{"selector": "name", "isExpanded": False}]
+        summary = [{"selector": "amount", "summaryType": "sum"}]
+
+        assert rollup.can_answer(
+            make_request(group=group, groupSummary=summary, filter=["name", "=", "a"], take=10)
+        )
+        # Summaries, filters and intervals outside of the rollup
+        assert not rollup.can_answer(
+            make_request(group=group, groupSummary=[{"selector": "amount", "summaryType": "avg"}])
+        )
+        assert not rollup.can_answer(make_request(group=group, filter=["amount", ">", 1]))
+        assert not rollup.can_answer(
+            make_request(group=[{"selector": "name", "groupInterval": 10, "isExpanded": False}])
+        )
+        # Parameters of other filter backends
+        assert not rollup.can_answer(make_request(group=group, search="a"))
+
+    def test_get_group_queryset(self):
+        rollup = make_rollup()
+        groups = [{"selector": "name", "desc": True}]
+        summary = [{"selector": "amount", "summaryType": "sum"}]
+
+        group_queryset = rollup.get_group_queryset(rollup.get_queryset(), groups, summary)
+        compiler = group_queryset.query.get_compiler(connection=DatabaseWrapper({"TIME_ZONE": None}))
+        sql, _ = compiler.as_sql()
+
+        assert sql.startswith('SELECT "tests_itemrollup"."name" AS "name", SUM("tests_itemrollup"."row_count") AS "count"')
+        assert 'SUM("tests_itemrollup"."amount_sum")' in sql
+        assert sql.endswith('FROM "tests_itemrollup" GROUP BY 1 ORDER BY 1 DESC')
+
+    @patch("htec_drf_dx_datagrid.rollup.transaction")
+    def test_refresh_writes_the_differences(self, m_transaction):
+        rollup = make_rollup()
+        unchanged = ItemRollup(pk=1, name="a", row_count=2, amount_sum=Decimal("3.50"))
+        changed = ItemRollup(pk=2, name="b", row_count=1, amount_sum=Decimal("1"))
+        empty = ItemRollup(pk=3, name="c", row_count=4, amount_sum=Decimal("8"))
+        manager = MagicMock()
+        manager.all.return_value = [unchanged, changed, empty]
+        source_rows = [
+            {"name": "a", "row_count": 2, "amount_sum": Decimal("3.5")},
+            {"name": "b", "row_count": 2, "amount_sum": Decimal("4")},
+            {"name": "d", "row_count": 1, "amount_sum": None},
+        ]
+
+        with patch.object(ModelBase, "_default_manager", new_callable=PropertyMock) as m_manager, patch.object(
+            Rollup, "get_source_rows", return_value=iter(source_rows)
+        ):
+            m_manager.return_value = manager
+            assert rollup.refresh() == (1, 1, 1)
+
+        created = manager.bulk_create.call_args[0][0]
+        assert [(instance.name, instance.row_count) for instance in created] == [("d", 1)]
+        manager.bulk_update.assert_called_once_with([changed], ["row_count", "amount_sum"], batch_size=500)
+        assert changed.row_count == 2
+        manager.filter.assert_called_once_with(pk__in=[3])
@@ -0,0 +1,164 @@
+from datetime import date
+
+import pytest
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import Q
+from mock.mock import MagicMock, patch
+from rest_framework import serializers
+
+from htec_drf_dx_datagrid.filters import DxFilterBackend
+from htec_drf_dx_datagrid.projection import get_model_field
+from htec_drf_dx_datagrid.search import Fts5SearchBackend, SearchBackend, clear_index_columns
+from .models import Category, Item, Tag
+
+SEARCH_FILTER = [["name", "contains", "abc"], "or", ["category_name", "contains", "abc"], "or", ["qty", "=", 3]]
+
+
+class ItemSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    category_name = serializers.CharField(source="category.name")
+    qty = serializers.IntegerField(source="amount")
+
+
+def make_backend(search_index=True):
+    backend = DxFilterBackend()
+    backend.search_index = search_index
+    backend.serializer = ItemSerializer()
+    return backend
+
+
+class TestSearch:
+    def test_merge_search_nodes(self):
+        backend = make_backend()
+
+        tree = backend._optimize_filter(backend._parse_filter(SEARCH_FILTER))
+
+        assert tree == (
+            "or",
+            [("node", ("name", "category_name"), "search", "abc"), ("node", "qty", "=", 3)],
+        )
+
+    def test_single_column_not_merged(self):
+        backend = make_backend()
+        dx_filter = [["name", "contains", "abc"], "or", ["qty", "=", 3]]
+
+        assert backend._optimize_filter(backend._parse_filter(dx_filter)) == (
+            "or",
+            [("node", "name", "contains", "abc"), ("node", "qty", "=", 3)],
+        )
+
+    def test_disabled(self):
+        backend = make_backend(search_index=False)
+
+        tree = backend._optimize_filter(backend._parse_filter(SEARCH_FILTER))
+
+        assert tree[1][0] == ("node", "name", "contains", "abc")
+
+    def test_like_fallback(self):
+        backend = make_backend()
+
+        q_expr = backend._DxFilterBackend__generate_q_expr(SEARCH_FILTER)
+
+        assert q_expr == Q(
+            Q(Q(name__contains="abc"), Q(category__name__contains="abc"), _connector=Q.OR),
+            Q(amount=3),
+            _connector=Q.OR,
+        )
+
+    def test_search_backend(self):
+        backend = make_backend()
+        backend.model = Item
+        backend.using = "default"
+        search_backend = MagicMock()
+        search_backend.get_search_q.return_value = Q(pk__in=[1])
+
+        with patch("htec_drf_dx_datagrid.filters.get_search_backend", return_value=search_backend):
+            q_expr = backend._DxFilterBackend__generate_q_expr(SEARCH_FILTER)
+
+        assert q_expr == Q(Q(pk__in=[1]), Q(amount=3), _connector=Q.OR)
+        model, field_names, value, _ = search_backend.get_search_q.call_args[0]
+        assert (model, field_names, value) == (Item, ("name", "category__name"), "abc")
+
+    def test_fts5_query(self):
+        search_backend = Fts5SearchBackend("default")
+        search_backend.connection = DatabaseWrapper({"TIME_ZONE": None})
+        like_q = Q(name__icontains='a"bc')
+
+        with patch.object(search_backend, "get_index_columns", return_value=["name", "category__name"]):
+            q_expr = search_backend.get_search_q(Item, ("name", "category__name"), 'a"bc', like_q)
+            assert search_backend.get_search_q(Item, ("name",), "ab", like_q) is None
+            assert search_backend.get_search_q(Item, ("name", "tags__label"), "abc", like_q) is None
+
+        sql, params = Item.objects.filter(q_expr).query.get_compiler(connection=search_backend.connection).as_sql()
+        assert (
+            'SELECT rowid FROM "dx_search_tests_item" WHERE "dx_search_tests_item" MATCH %s '
+            'UNION ALL SELECT pk FROM "dx_search_tests_item_queue"'
+        ) in sql
+        assert params[0] == '{name category__name} : "a""bc"'
+
+    def test_build_index_is_abstract(self):
+        with pytest.raises(TypeError):
+            SearchBackend("default")
+
+    def test_get_model_field(self):
+        assert get_model_field(Item, "category__name") == (Category, Category._meta.get_field("name"))
+        assert get_model_field(Item, "category") is None
+        assert get_model_field(Item, "name__foo") is None
+
+
+@pytest.mark.django_db
+class TestFts5Index:
+    PATHS = ["name", "category__name", "tags__label"]
+
+    def search(self, search_backend, value):
+        like_q = Q(name__contains=value) | Q(category__name__contains=value) | Q(tags__label__contains=value)
+        q_expr = search_backend.get_search_q(Item, tuple(self.PATHS), value, like_q)
+        assert q_expr is not None
+        return sorted(set(Item.objects.filter(q_expr).values_list("name", flat=True)))
+
+    def test_kept_in_sync(self):
+        red = Category.objects.create(name="red")
+        item = Item.objects.create(name="apple", amount=1, created=date(2020, 1, 1), category=red)
+        Item.objects.create(name="grape", amount=1, created=date(2020, 1, 1))
+        search_backend = Fts5SearchBackend("default")
+        search_backend.build_index(Item, self.PATHS)
+        assert self.search(search_backend, "red") == ["apple"]
+
+        Item.objects.create(name="cherry", amount=1, created=date(2020, 1, 1), category=red)
+        red.name = "crimson"
+        red.save()
+        item.tags.add(Tag.objects.create(label="fresh"))
+        Item.objects.filter(name="grape").update(name="grapefruit")
+
+        assert self.search(search_backend, "red") == []
+        assert self.search(search_backend, "crimson") == ["apple", "cherry"]
+        assert self.search(search_backend, "fresh") == ["apple"]
+        assert self.search(search_backend, "fruit") == ["grapefruit"]
+
+        item.tags.clear()
+        Item.objects.filter(name="cherry").delete()
+
+        assert self.search(search_backend, "fresh") == []
+        assert self.search(search_backend, "crimson") == ["apple"]
+        # The searches don't write, the queued rows are indexed by refresh_index
+        assert self.count_queued() == 3  # apple, cherry and grape
+        assert search_backend.refresh_index(Item) == "dx_search_tests_item: 3 rows"
+        assert self.count_queued() == 0
+        assert self.search(search_backend, "crimson") == ["apple"]
+        assert self.search(search_backend, "fruit") == ["grapefruit"]
+
+    @staticmethod
+    def count_queued():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM "dx_search_tests_item_queue"')
+            return cursor.fetchone()[0]
+
+    def test_index_without_queue(self):
+        search_backend = Fts5SearchBackend("default")
+        search_backend.build_index(Item, self.PATHS)
+        with search_backend.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE "dx_search_tests_item_queue"')
+        clear_index_columns()
+
+        assert search_backend.get_index_columns(Item) == []
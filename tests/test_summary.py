@@ -0,0 +1,77 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+from mock.mock import MagicMock
+from rest_framework import serializers
+
+from htec_drf_dx_datagrid.summary import SummaryMixin
+from .models import Item, Tag
+
+
+class ItemSerializer(serializers.Serializer):
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    qty = serializers.IntegerField(source="quantity")
+
+
+class SummaryView(SummaryMixin):
+    def get_serializer(self, *args, **kwargs):
+        return ItemSerializer()
+
+
+class TestSummaryMixin:
+    def test_calc_total_summary_single_aggregate(self):
+        queryset = MagicMock()
+        queryset.model = Item
+        queryset.aggregate.return_value = {"ts__count": 3, "ts__0": 10, "ts__1": 7}
+        summary_list = [
+            {"selector": "amount", "summaryType": "sum"},
+            {"selector": "qty", "summaryType": "max"},
+            {"selector": "amount", "summaryType": "sum"},
+        ]
+
+        result = SummaryView().calc_total_summary(queryset, summary_list)
+
+        assert result == [10, 7, 10]
+        queryset.exists.assert_not_called()
+        queryset.aggregate.assert_called_once()
+        assert sorted(queryset.aggregate.call_args.kwargs) == ["ts__0", "ts__1", "ts__count"]
+
+    def test_calc_total_summary_empty_queryset(self):
+        queryset = MagicMock()
+        queryset.model = Item
+        queryset.aggregate.return_value = {"ts__count": 0, "ts__0": None}
+        summary_list = [
+            {"selector": "qty", "summaryType": "avg"},
+            {"selector": "qty", "summaryType": "avg"},
+        ]
+
+        assert SummaryView().calc_total_summary(queryset, summary_list) == [0, 0]
+
+
+class TagsSerializer(serializers.Serializer):
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    tags = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+
+class TagsSummaryView(SummaryMixin):
+    def get_serializer(self, *args, **kwargs):
+        return TagsSerializer()
+
+
+@pytest.mark.django_db
+class TestTotalSummaryQueries:
+    def test_to_many_summary(self):
+        tags = [Tag.objects.create(label=label) for label in "abc"]
+        for amount, item_tags in [(10, tags), (30, tags[:1])]:
+            item = Item.objects.create(name="i", amount=Decimal(amount), created=datetime.date(2020, 1, 1))
+            item.tags.set(item_tags)
+        summary_list = [
+            {"selector": "amount", "summaryType": "sum"},
+            {"selector": "tags", "summaryType": "count"},
+            {"selector": "amount", "summaryType": "max"},
+        ]
+
+        result = TagsSummaryView().calc_total_summary(Item.objects.all(), summary_list)
+
+        assert result == [Decimal(40), 4, Decimal(30)]
@@ -0,0 +1,250 @@
+import datetime
+import json
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from django.http import QueryDict
+from mock.mock import MagicMock
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from htec_drf_dx_datagrid.cache import DeltaCache
+from htec_drf_dx_datagrid.pagination import TakeSkipPagination
+from htec_drf_dx_datagrid.projection import ValuesColumn
+from htec_drf_dx_datagrid.viewsets import DxListModelMixin, DxReadOnlyModelViewSet
+from .models import Category, Item, Tag
+
+
+class ItemSerializer(serializers.Serializer):
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    created = serializers.DateField()
+    category = serializers.PrimaryKeyRelatedField(read_only=True)
+    category_name = serializers.CharField(source="category.name", read_only=True)
+    category_code = serializers.CharField(source="category.code", default="-")
+
+
+class TestValuesToRepresentation:
+    def get_columns(self):
+        fields = ItemSerializer().fields
+        return [
+            ValuesColumn("amount", "amount", fields["amount"], None),
+            ValuesColumn("created", "created", fields["created"], None),
+            ValuesColumn("category", "category", fields["category"], None),
+            ValuesColumn("category_name", "category__name", fields["category_name"], "category"),
+            ValuesColumn("category_code", "category__code", fields["category_code"], "category"),
+        ]
+
+    def test_values_to_representation(self):
+        rows = [
+            {
+                "amount": Decimal("1.5"),
+                "created": datetime.date(2020, 1, 2),
+                "category": 3,
+                "category__name": "c3",
+                "category__code": None,
+            },
+            {
+                "amount": None,
+                "created": datetime.date(2020, 1, 3),
+                "category": None,
+                "category__name": None,
+                "category__code": None,
+            },
+        ]
+
+        result = DxListModelMixin.values_to_representation(rows, self.get_columns())
+
+        assert result == [
+            {
+                "amount": "1.50",
+                "created": "2020-01-02",
+                "category": 3,
+                "category_name": "c3",
+                "category_code": None,
+            },
+            {"amount": None, "created": "2020-01-03", "category": None, "category_code": "-"},
+        ]
+
+
+class LabelSerializer(serializers.Serializer):
+    label = serializers.CharField()
+
+
+class MixedItemSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    category_name = serializers.CharField(source="category.name", default=None)
+    upper_name = serializers.SerializerMethodField()
+    tags = LabelSerializer(many=True, read_only=True)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+    def get_upper_name(self, obj):
+        return obj.name.upper()
+
+
+class MixedItemViewSet(DxReadOnlyModelViewSet):
+    queryset = Item.objects.order_by("pk")
+    serializer_class = MixedItemSerializer
+    use_values = True
+
+
+@pytest.mark.django_db
+class TestValuesList:
+    def test_mixed_serializer(self):
+        category = Category.objects.create(name="c")
+        tag = Tag.objects.create(label="t")
+        Item.objects.create(name="a", amount=1, created=datetime.date(2020, 1, 1), category=category).tags.add(tag)
+        Item.objects.create(name="b", amount=2, created=datetime.date(2020, 1, 1))
+        request = APIRequestFactory().get("/items/", {"take": 10, "skip": 0})
+        view = MixedItemViewSet(request=Request(request), format_kwarg=None, args=(), kwargs={})
+        queryset = view.get_queryset()
+
+        columns = view.get_values_columns(queryset)
+
+        assert [column.field_name for column in columns] == ["name", "category_name", "amount"]
+        assert view.get_instance_field_names(columns) == ["upper_name", "tags"]
+        response = MixedItemViewSet.as_view({"get": "list"})(request)
+        assert response.data["data"] == [
+            {"name": "a", "category_name": "c", "upper_name": "A", "tags": [{"label": "t"}], "amount": "1.00"},
+            {"name": "b", "category_name": None, "upper_name": "B", "tags": [], "amount": "2.00"},
+        ]
+        assert [list(row) for row in response.data["data"]] == [list(MixedItemSerializer().fields)] * 2
+
+
+class TestBatch:
+    def make_view(self):
+        view = DxListModelMixin()
+        view.get_queryset = MagicMock(return_value="queryset")
+        view.loads = []
+
+        def _list(group, export_format, request, queryset):
+            load_options = view.get_load_options(request)
+            view.loads.append((group, load_options.get("take"), queryset))
+            return Response({"take": load_options.get("take")})
+
+        view._list = _list
+        return view
+
+    def test_batch(self):
+        view = self.make_view()
+        group = [{"selector": "status", "isExpanded": False}]
+        request = SimpleNamespace(GET=QueryDict("take=1"), data=[{"take": 10}, {"group": group, "take": "5"}])
+
+        response = view.batch(request)
+
+        assert response.data == [{"take": 10}, {"take": 5}]
+        assert view.loads == [([], 10, "queryset"), (group, 5, "queryset")]
+        view.get_queryset.assert_called_once()
+
+    def test_batch_validation(self):
+        view = self.make_view()
+
+        with pytest.raises(ValidationError):
+            view.batch(SimpleNamespace(GET=QueryDict(), data={"loads": "take=10"}))
+        with pytest.raises(ValidationError):
+            view.batch(SimpleNamespace(GET=QueryDict(), data=[{}] * 21))
+
+
+class TestDeltaList:
+    def make_view(self, rows):
+        view = DxListModelMixin()
+        view.delta_field = "updated"
+        view.paginator = None
+        view.rows = rows
+        view.get_values_queryset = lambda queryset, columns, extra_paths: list(view.rows)
+        view.paginate_queryset = lambda rows: None
+        view.get_rows_data = MagicMock(side_effect=lambda queryset, pks: [{"id": pk} for pk in pks])
+        delta_cache = DeltaCache(timeout=30)
+        delta_cache.get_digest = lambda view, request: "digest"
+        view.get_delta_cache = lambda: delta_cache
+        return view
+
+    @staticmethod
+    def load(view, **params):
+        view.request = SimpleNamespace(GET=QueryDict(), data=params)
+        return view._delta_list("queryset", view.request).data
+
+    def test_delta(self):
+        view = self.make_view([{"pk": 1, "updated": 1}, {"pk": 2, "updated": 1}, {"pk": 3, "updated": 1}])
+
+        full = self.load(view)
+        assert full["data"] == [{"id": 1}, {"id": 2}, {"id": 3}]
+        assert "delta" not in full
+
+        idle = self.load(view, since=full["version"])
+        assert idle["data"] == []
+        assert idle["removed"] == []
+        assert "keys" not in idle
+        assert idle["version"] == full["version"]
+
+        view.rows = [{"pk": 1, "updated": 1}, {"pk": 3, "updated": 2}, {"pk": 4, "updated": 1}]
+        delta = self.load(view, since=idle["version"])
+        assert delta["delta"] is True
+        assert delta["data"] == [{"id": 3}, {"id": 4}]
+        assert delta["removed"] == [2]
+        assert delta["keys"] == [1, 3, 4]
+        assert delta["version"] != full["version"]
+
+    def test_unknown_version(self):
+        view = self.make_view([{"pk": 1, "updated": 1}])
+
+        result = self.load(view, since="unknown")
+
+        assert result["data"] == [{"id": 1}]
+        assert "delta" not in result
+
+
+class TagItemSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    tags = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+
+class TagItemViewSet(DxReadOnlyModelViewSet):
+    queryset = Item.objects.all()
+    serializer_class = TagItemSerializer
+
+
+@pytest.mark.django_db
+class TestGroupedList:
+    def test_total_count_of_to_many_groups(self):
+        tags = [Tag.objects.create(label=label) for label in "abc"]
+        for item_tags in [tags, tags[:2], tags[:1], []]:
+            item = Item.objects.create(name="i", amount=1, created=datetime.date(2020, 1, 1))
+            item.tags.set(item_tags)
+        group = json.dumps([{"selector": "tags", "isExpanded": False}])
+        request = APIRequestFactory().get("/items/", {"group": group, "requireTotalCount": "true"})
+
+        response = TagItemViewSet.as_view({"get": "list"})(request)
+
+        assert [item["count"] for item in response.data["data"]] == [1, 3, 2, 1]
+        assert response.data["totalCount"] == 4
+
+
+class TestLoadGroups:
+    def make_view(self, query_string):
+        view = DxListModelMixin()
+        view.paginator = TakeSkipPagination()
+        view.request = SimpleNamespace(GET=QueryDict(query_string), data={})
+        return view
+
+    def test_all_groups_are_iterated(self):
+        group_queryset = MagicMock()
+
+        page, rows = self.make_view("skip=0")._load_groups(group_queryset, require_count=True)
+
+        assert page is None
+        assert rows is group_queryset.iterator.return_value
+        group_queryset.__getitem__.assert_not_called()
+
+    def test_groups_page(self):
+        group_queryset = MagicMock()
+        group_queryset.__getitem__.return_value = [{"count": 1}]
+
+        page, rows = self.make_view("skip=0&take=10")._load_groups(group_queryset, require_count=False)
+
+        assert page == rows == [{"count": 1}]
+        group_queryset.__getitem__.assert_called_once_with(slice(0, 11))
+        group_queryset.iterator.assert_not_called()